@@ -0,0 +1,416 @@
+"""
+Copyright 2022 bitrate16
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Benchmarks for yatplt.
+
+Usage:
+```
+# Parse time over growing template sizes
+python benchmark.py parse
+
+# Full suite, results are written as JSON
+python benchmark.py run --output before.json
+python benchmark.py run --output after.json
+
+# Flag metrics that became worse by more than 10%
+python benchmark.py compare before.json after.json --threshold 0.1
+```
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import yatplt
+
+
+def generate_template(fragments: int, comment_every: int=4, static_ratio: int=1, nesting: int=0, awaiting: bool=False, one_time_every: int=0) -> str:
+	"""
+	Generate template source with given amount of expression fragments. Each
+	`comment_every` fragment is followed by comment block.
+	
+	`static_ratio` defines amount of static text lines per fragment.
+	
+	`nesting` defines depth of nested indented statements inside code blocks.
+	
+	`awaiting` makes expressions await `value_async()` coroutine.
+	
+	`one_time_every` adds one-time init block before each `one_time_every`
+	fragment.
+	"""
+	
+	parts = []
+	for i in range(fragments):
+		for j in range(static_ratio):
+			parts.append(f'<div class="row-{i}-{j}">static text of row {i}</div>\n')
+		
+		if one_time_every and i % one_time_every == 0:
+			parts.append(f'{{1{{!\n\tinit_{i} = [ x * x for x in range({i % 64}) ]\n!}}1}}\n')
+		
+		if i % 2:
+			if awaiting:
+				parts.append(f'{{{{% await value_async({i % 16}) %}}}}\n')
+			else:
+				parts.append(f'{{{{% value_{i % 16} %}}}}\n')
+		elif nesting:
+			lines = [ '{{!' ]
+			for depth in range(nesting):
+				lines.append('\t' * (depth + 1) + f'if counter_{i % 16} is not None:')
+			lines.append('\t' * (nesting + 1) + f'counter_{i % 16} = {i}')
+			lines.append('!}}\n')
+			parts.append('\n'.join(lines))
+		else:
+			parts.append(f'{{{{!\n\tcounter_{i % 16} = {i}\n!}}}}\n')
+		
+		if comment_every and i % comment_every == 0:
+			parts.append(f'{{{{# comment for row {i} #}}}}\n')
+	
+	return ''.join(parts)
+
+
+def generate_scope() -> dict:
+	"""
+	Returns render scope matching names used by `generate_template()`
+	"""
+	
+	async def value_async(value):
+		return value
+	
+	scope = { 'value_async': value_async }
+	for i in range(16):
+		scope[f'value_{i}'] = i
+		scope[f'counter_{i}'] = 0
+	
+	return scope
+
+
+def measure(func, repeat: int) -> float:
+	"""
+	Returns best wall time of `repeat` calls to `func`
+	"""
+	
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	
+	return best
+
+
+async def measure_async(func, repeat: int, setup=None) -> float:
+	"""
+	Returns best wall time of `repeat` awaits of `func(state)`, where state is
+	result of `setup()` called before each measurement
+	"""
+	
+	best = None
+	for _ in range(repeat):
+		state = setup() if setup is not None else None
+		start = time.perf_counter()
+		await func(state)
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	
+	return best
+
+
+async def measure_throughput(func, duration: float) -> float:
+	"""
+	Returns amount of awaits of `func()` per second during at least
+	`duration` seconds. First call is not measured, so lazy initialization
+	does not affect result.
+	"""
+	
+	await func()
+	
+	calls = 0
+	start = time.perf_counter()
+	deadline = start + duration
+	while True:
+		await func()
+		calls += 1
+		now = time.perf_counter()
+		if now >= deadline:
+			return calls / (now - start)
+
+
+def measure_memory(factory, count: int=10) -> float:
+	"""
+	Returns average memory in bytes retained by object created with
+	`factory()`
+	"""
+	
+	gc.collect()
+	tracemalloc.start()
+	try:
+		objects = [ factory() for _ in range(count) ]
+		gc.collect()
+		size = tracemalloc.get_traced_memory()[0]
+	finally:
+		tracemalloc.stop()
+	
+	del objects
+	return size / count
+
+
+def bench_parse(sizes: list, repeat: int):
+	"""
+	Measure TemplateParser.parse time over growing template sizes. Time per
+	kilobyte of source should stay constant for linear parser.
+	"""
+	
+	parser = yatplt.TemplateParser()
+	
+	print(f'{"fragments":>10} {"size KB":>10} {"time ms":>10} {"us/KB":>10}')
+	for size in sizes:
+		source = generate_template(size)
+		elapsed = measure(lambda: parser.parse(source), repeat)
+		kilobytes = len(source) / 1024
+		print(f'{size:>10} {kilobytes:>10.1f} {elapsed * 1000:>10.2f} {elapsed * 1e6 / kilobytes:>10.2f}')
+
+
+# Time metrics below this value in milliseconds are not compared
+NOISE_FLOOR_MS = 0.1
+
+# Benchmark cases: name -> arguments of generate_template()
+CASES = {
+	'small':        dict(fragments=100),
+	'base':         dict(fragments=1000),
+	'large':        dict(fragments=5000),
+	'static_heavy': dict(fragments=1000, static_ratio=8),
+	'comments':     dict(fragments=1000, comment_every=1),
+	'nested':       dict(fragments=1000, nesting=4),
+	'awaiting':     dict(fragments=1000, awaiting=True),
+	'one_time':     dict(fragments=1000, one_time_every=4),
+}
+
+
+async def bench_case(arguments: dict, repeat: int, duration: float) -> dict:
+	"""
+	Run all measurements for single template case. Returns dict of metrics,
+	metrics ending with `_per_sec` are better when higher, others are better
+	when lower.
+	"""
+	
+	source = generate_template(**arguments)
+	parser = yatplt.TemplateParser()
+	
+	results = {
+		'size_kb': len(source) / 1024,
+		'parse_ms': measure(lambda: parser.parse(source), repeat) * 1000
+	}
+	
+	# Parse compiling each fragment, without process-wide code interning
+	no_intern_parser = yatplt.TemplateParser(intern_code=False)
+	results['parse_no_intern_ms'] = measure(lambda: no_intern_parser.parse(source), repeat) * 1000
+	
+	fragments = parser.parse(source)
+	code_sources = [ fragment.source_string for fragment in fragments if isinstance(fragment, (yatplt.ExpressionTemplateFragment, yatplt.BlockTemplateFragment)) ]
+	
+	def autotablete_all():
+		for code in code_sources:
+			yatplt.autotablete(code)
+	
+	results['autotablete_ms'] = measure(autotablete_all, repeat) * 1000
+	
+	results['init_ms'] = await measure_async(
+		lambda template: template.init(init_ok=True),
+		repeat,
+		setup=lambda: yatplt.Template.from_fragments(fragments)
+	) * 1000
+	
+	scope = generate_scope()
+	template = await yatplt.Template.from_fragments(fragments).init(init_ok=True)
+	
+	async def render_generator():
+		async for _ in template.render_generator(scope=scope):
+			pass
+	
+	results['render_generator_per_sec'] = await measure_throughput(render_generator, duration)
+	results['render_string_per_sec'] = await measure_throughput(lambda: template.render_string(scope=scope), duration)
+	results['render_wrap_scope_per_sec'] = await measure_throughput(lambda: template.render_string(scope=scope, wrap_scope=True), duration)
+	
+	compiled = await yatplt.Template.from_fragments(fragments).init(init_ok=True)
+	compiled.compile()
+	
+	results['compile_ms'] = measure(lambda: yatplt.compile_render_function(compiled.fragments, False), repeat) * 1000
+	results['render_compiled_per_sec'] = await measure_throughput(lambda: compiled.render_string(scope=scope), duration)
+	
+	fast = await yatplt.Template.from_fragments(fragments).init(init_ok=True)
+	fast.compile(fast_locals=True)
+	results['render_fast_locals_per_sec'] = await measure_throughput(lambda: fast.render_string(scope=scope), duration)
+	
+	# Render with all expression results escaped
+	escaped = await yatplt.Template(source, yatplt.TemplateParser(autoescape=True)).init(init_ok=True)
+	results['render_autoescape_per_sec'] = await measure_throughput(lambda: escaped.render_string(scope=scope), duration)
+	
+	# Memory retained by parsed template in default and compact mode
+	compact_parser = yatplt.TemplateParser(compact=True)
+	results['template_memory_kb'] = measure_memory(lambda: yatplt.Template(source, parser)) / 1024
+	results['compact_template_memory_kb'] = measure_memory(lambda: yatplt.Template(source, compact_parser)) / 1024
+	
+	# Peak memory of loading from file, read into string and memory mapped
+	with tempfile.TemporaryDirectory() as directory:
+		filename = os.path.join(directory, 'template.thtml')
+		with open(filename, 'w', encoding='utf-8') as file:
+			file.write(source)
+		
+		for name, memory_map in (('load_peak_memory_kb', False), ('load_mapped_peak_memory_kb', True)):
+			gc.collect()
+			tracemalloc.start()
+			try:
+				loaded = yatplt.Template.from_file(filename, parser, memory_map=memory_map)
+				results[name] = tracemalloc.get_traced_memory()[1] / 1024
+			finally:
+				tracemalloc.stop()
+			del loaded
+	
+	# Peak memory of parse, init and single render
+	tracemalloc.start()
+	try:
+		peak_template = await yatplt.Template(source, parser).init(init_ok=True)
+		await peak_template.render_string(scope=scope)
+		results['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+	finally:
+		tracemalloc.stop()
+	
+	return results
+
+
+async def bench_run(cases: list, repeat: int, duration: float) -> dict:
+	"""
+	Run benchmark suite for the given case names. Returns report dict with
+	environment description and metrics of each case.
+	"""
+	
+	report = {
+		'meta': {
+			'python': sys.version,
+			'implementation': sys.implementation.name,
+			'platform': platform.platform(),
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'repeat': repeat,
+			'duration': duration
+		},
+		'results': {}
+	}
+	
+	for name in cases:
+		results = await bench_case(CASES[name], repeat, duration)
+		report['results'][name] = results
+		print(f'{name:<14} ' + ' '.join(f'{metric}={value:.2f}' for metric, value in results.items()), file=sys.stderr)
+	
+	return report
+
+
+def compare_reports(before: dict, after: dict, threshold: float) -> list:
+	"""
+	Compare metrics of two reports produced by `bench_run()`. Returns list of
+	(case, metric, before, after, change, regression) tuples, where change is
+	relative change towards better result, negative if result is worse.
+	"""
+	
+	rows = []
+	for case, metrics in after['results'].items():
+		if case not in before['results']:
+			continue
+		
+		for metric, value in metrics.items():
+			old = before['results'][case].get(metric)
+			if old is None or metric == 'size_kb' or old == 0:
+				continue
+			
+			if metric.endswith('_ms') and old < NOISE_FLOOR_MS and value < NOISE_FLOOR_MS:
+				continue
+			
+			if metric.endswith('_per_sec'):
+				change = (value - old) / old
+			else:
+				change = (old - value) / old
+			
+			rows.append((case, metric, old, value, change, change < -threshold))
+	
+	return rows
+
+
+def main(argv: list=None) -> int:
+	argparser = argparse.ArgumentParser(description='yatplt benchmarks')
+	subparsers = argparser.add_subparsers(dest='benchmark', required=True)
+	
+	parse_parser = subparsers.add_parser('parse', help='parse time over growing template sizes')
+	parse_parser.add_argument('--sizes', type=int, nargs='+', default=[ 1000, 2000, 4000, 8000, 16000, 32000 ])
+	parse_parser.add_argument('--repeat', type=int, default=3)
+	
+	run_parser = subparsers.add_parser('run', help='run benchmark suite')
+	run_parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+	run_parser.add_argument('--repeat', type=int, default=5)
+	run_parser.add_argument('--duration', type=float, default=0.5, help='seconds per render throughput measurement')
+	run_parser.add_argument('--output', help='JSON file to write results, stdout if not set')
+	
+	compare_parser = subparsers.add_parser('compare', help='compare two benchmark results')
+	compare_parser.add_argument('before')
+	compare_parser.add_argument('after')
+	compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative change treated as regression')
+	
+	args = argparser.parse_args(argv)
+	
+	if args.benchmark == 'parse':
+		bench_parse(args.sizes, args.repeat)
+
+	elif args.benchmark == 'run':
+		report = asyncio.run(bench_run(args.cases, args.repeat, args.duration))
+		
+		if args.output:
+			with open(args.output, 'w') as file:
+				json.dump(report, file, indent=4)
+		else:
+			json.dump(report, sys.stdout, indent=4)
+			print()
+	
+	elif args.benchmark == 'compare':
+		with open(args.before) as file:
+			before = json.load(file)
+		with open(args.after) as file:
+			after = json.load(file)
+		
+		rows = compare_reports(before, after, args.threshold)
+		
+		print(f'{"case":<14} {"metric":<26} {"before":>12} {"after":>12} {"change":>8}')
+		for case, metric, old, value, change, regression in rows:
+			print(f'{case:<14} {metric:<26} {old:>12.2f} {value:>12.2f} {change * 100:>7.1f}%{"  REGRESSION" if regression else ""}')
+		
+		regressions = sum(1 for row in rows if row[5])
+		if regressions:
+			print(f'{regressions} regressions over {args.threshold * 100:.0f}%')
+			return 1
+	
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import yatplt from the repository root without installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+def test_autoescape():
+	template_parser = yatplt.TemplateParser(autoescape=True)
+	template = yatplt.Template('<b>{{% value %}}|{{%! value %}}|{{% safe %}}</b>', template_parser)
+	result = asyncio.run(template.render_string({ 'value': '<i>"&\'', 'safe': yatplt.SafeString('<u>') }))
+	assert result == '<b>&lt;i&gt;&#34;&amp;&#39;|<i>"&\'|<u></b>'
+
+
+class Markup:
+	
+	def __html__(self):
+		return '<em>markup</em>'
+
+
+@pytest.mark.parametrize('value, expected', [
+	('plain', 'plain'),
+	('a & b < c > d " e \' f', 'a &amp; b &lt; c &gt; d &#34; e &#39; f'),
+	(42, '42'),
+	(yatplt.SafeString('<b>'), '<b>'),
+	(Markup(), '<em>markup</em>'),
+])
+def test_escape_html(value, expected):
+	assert yatplt.escape_html(value) == expected
+
+
+def test_unchanged_string_not_copied():
+	value = 'x' * 100
+	assert yatplt.escape_html(value) is value
+
+
+@pytest.mark.parametrize('mode', [ 'eval', 'compiled', 'concurrent', 'sync', 'stream' ])
+def test_render_modes(mode):
+	template_parser = yatplt.TemplateParser(autoescape=True)
+	template = yatplt.Template('{{% value %}}|{{%! value %}}|{{% markup %}}', template_parser)
+	scope = { 'value': '<i>', 'markup': Markup() }
+	
+	if mode == 'compiled':
+		template.compile()
+	elif mode == 'concurrent':
+		template.set_concurrent()
+	
+	if mode == 'sync':
+		result = template.render_string_sync(scope)
+	elif mode == 'stream':
+		chunks = []
+		
+		class Writer:
+			
+			def write(self, data: bytes):
+				chunks.append(data)
+		
+		asyncio.run(template.render_stream(Writer(), scope=scope))
+		result = b''.join(chunks).decode('utf-8')
+	else:
+		result = asyncio.run(template.render_string(scope))
+	
+	assert result == '&lt;i&gt;|<i>|<em>markup</em>'
+
+
+def test_disabled_by_default():
+	template = yatplt.Template('{{% value %}}')
+	assert asyncio.run(template.render_string({ 'value': '<i>' })) == '<i>'
+
+
+def test_constant_folding_escaped():
+	template = yatplt.Template('{{% "<" + ">" %}}', yatplt.TemplateParser(autoescape=True))
+	template.fragments, _ = yatplt.optimize_fragments(template.fragments)
+	assert asyncio.run(template.render_string({})) == '&lt;&gt;'
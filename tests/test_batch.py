@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+async def delayed(value, delay: float):
+	await asyncio.sleep(delay)
+	return value
+
+
+async def collect(generator) -> list:
+	return [ value async for value in generator ]
+
+
+async def iterate_async(scopes):
+	for scope in scopes:
+		yield scope
+
+
+@pytest.mark.parametrize('concurrency', [ 1, 3 ])
+@pytest.mark.parametrize('asynchronous', [ False, True ])
+def test_order(concurrency, asynchronous):
+	template = yatplt.Template('{{% await delayed(i, (5 - i) / 100) %}}')
+	scopes = [ { 'i': i, 'delayed': delayed } for i in range(5) ]
+	
+	results = asyncio.run(collect(template.render_many(iterate_async(scopes) if asynchronous else scopes, concurrency=concurrency)))
+	assert results == [ str(i) for i in range(5) ]
+
+
+@pytest.mark.parametrize('mode', [ 'eval', 'compiled', 'concurrent' ])
+def test_matches_render_string(mode):
+	template = yatplt.Template('{{! total = 0 !}}<{{% name %}}>{{!\nfor i in range(n):\n\ttotal += i !}}{{% total %}}')
+	if mode == 'compiled':
+		template.compile()
+	elif mode == 'concurrent':
+		template.set_concurrent()
+	
+	scopes = [ { 'name': name, 'n': n } for name, n in (('a', 1), ('b', 3), ('c', 5)) ]
+	expected = [ asyncio.run(template.render_string(dict(scope))) for scope in scopes ]
+	
+	assert asyncio.run(collect(template.render_many([ dict(scope) for scope in scopes ]))) == expected
+	assert list(template.render_many_sync([ dict(scope) for scope in scopes ])) == expected
+
+
+@pytest.mark.parametrize('concurrency', [ 1, 3 ])
+def test_exception(concurrency):
+	cancelled = []
+	
+	async def value(i):
+		try:
+			await asyncio.sleep(0.01 if i != 2 else 0.2)
+		except asyncio.CancelledError:
+			cancelled.append(i)
+			raise
+		
+		if i == 1:
+			raise ValueError(i)
+		
+		return i
+	
+	template = yatplt.Template('{{% await value(i) %}}')
+	results = []
+	
+	async def main():
+		with pytest.raises(ValueError):
+			async for result in template.render_many(({ 'i': i, 'value': value } for i in range(5)), concurrency=concurrency):
+				results.append(result)
+		
+		# Pending renders are cancelled
+		await asyncio.sleep(0)
+	
+	asyncio.run(main())
+	assert results == [ '0' ]
+	assert cancelled == ([ 2 ] if concurrency > 1 else [])
+
+
+def test_sync_exception():
+	template = yatplt.Template('{{% 10 // i %}}')
+	results = template.render_many_sync({ 'i': i } for i in (5, 2, 0, 1))
+	
+	assert next(results) == '2'
+	assert next(results) == '5'
+	with pytest.raises(ZeroDivisionError):
+		next(results)
+
+
+def test_sync_requires_synchronous():
+	template = yatplt.Template('{{% await delayed(1, 0) %}}')
+	
+	with pytest.raises(RuntimeError):
+		list(template.render_many_sync([ { 'delayed': delayed } ]))
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+PARSER = yatplt.TemplateParser(cache_block_start=yatplt.CACHE_BLOCK_START)
+
+
+def test_cached_region_enabled():
+	template_parser = yatplt.TemplateParser(cache_block_start=yatplt.CACHE_BLOCK_START)
+	source = '{{@ ttl=60, key=n @}}{{% calls.append(n) or n %}}{{@ end @}}'
+	
+	async def main():
+		template = yatplt.Template(source, template_parser)
+		calls = []
+		results = [ await template.render_string({ 'n': n, 'calls': calls }) for n in (1, 1, 2) ]
+		return results, calls
+	
+	assert asyncio.run(main()) == ([ '1', '1', '2' ], [ 1, 2 ])
+
+
+@pytest.mark.parametrize('value', [ None, '' ])
+def test_disabled(value):
+	source = '{{@ ttl=1 @}}{{% 1 %}}{{@ end @}}'
+	template_parser = yatplt.TemplateParser(cache_block_start=value)
+	assert asyncio.run(yatplt.Template(source, template_parser).render_string({})) == '{{@ ttl=1 @}}1{{@ end @}}'
+
+
+def test_ttl_expiry():
+	calls = []
+	source = '{{@ ttl=0.05 @}}{{% calls.append(1) or len(calls) %}}{{@ end @}}'
+	
+	async def main():
+		template = yatplt.Template(source, PARSER)
+		results = [ await template.render_string({ 'calls': calls }) for _ in range(2) ]
+		await asyncio.sleep(0.06)
+		results.append(await template.render_string({ 'calls': calls }))
+		return results
+	
+	assert asyncio.run(main()) == [ '1', '1', '2' ]
+
+
+@pytest.mark.parametrize('mode', [ 'eval', 'compiled', 'sync' ])
+def test_region_output_inserted(mode):
+	source = 'a {{@ ttl=60, key=n, none_ok=True @}}<{{% n %}}> {{% None %}}{{@ end @}} b'
+	template = yatplt.Template(source, PARSER)
+	if mode == 'compiled':
+		template.compile()
+	
+	for n in (1, 2, 1):
+		if mode == 'sync':
+			result = template.render_string_sync({ 'n': n })
+		else:
+			result = asyncio.run(template.render_string({ 'n': n }))
+		
+		assert result == f'a<{n}>b'
+
+
+def test_one_time_block_rejected():
+	with pytest.raises(RuntimeError):
+		PARSER.parse('{{@ ttl=1 @}}{1{! x = 1 !}1}{{@ end @}}')
+
+
+def test_unclosed_region():
+	with pytest.raises(RuntimeError):
+		PARSER.parse('{{@ ttl=1 @}}{{% x %}}')
@@ -0,0 +1,25 @@
+import yatplt
+
+
+def test_compact_sources():
+	source = 'a{{% x %}}b{{! y = 1 !}}'
+	fragments = yatplt.TemplateParser(compact=True).parse(source)
+	assert [ fragment.get_source() for fragment in fragments if not isinstance(fragment, yatplt.StringTemplateFragment) ] == [ ' x ', ' y = 1 ' ]
+
+
+def test_instrumentation_allocated_lazily():
+	template = yatplt.Template.from_string('{{% x %}}{{% y %}}')
+	fragments = [ fragment for fragment in template.fragments if isinstance(fragment, yatplt.ExpressionTemplateFragment) ]
+	assert all(fragment.instrumentation is None for fragment in fragments)
+	assert fragments[0].executor is None and fragments[0].profile is None
+	
+	template.set_profiling(True)
+	assert all(fragment.instrumentation is not None for fragment in fragments)
+
+
+def test_name_from_tag_index():
+	fragments = yatplt.TemplateParser().parse('a{{% 1 %}}')
+	assert fragments[-1].name == '<ExpressionTemplateFragment_1>'
+	
+	fragments[-1].name = '<custom>'
+	assert fragments[-1].name == '<custom>'
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+from test_parser import BASELINE_CASES, render
+
+
+@pytest.mark.parametrize('name, source, scope, expected', BASELINE_CASES, ids=[ case[0] for case in BASELINE_CASES ])
+def test_compiled_parity(name, source, scope, expected):
+	assert asyncio.run(render(source, scope, compiled=True)) == expected
+
+
+@pytest.mark.parametrize('options', [ {}, { 'strip_string': False }, { 'none_ok': True }, { 'wrap_scope': True } ])
+def test_render_options_parity(options):
+	source = ' a {{% None if x > 1 else x %}} b {{!\ny = x + 1 !}}{{% y %}} '
+	
+	async def main(compiled: bool):
+		template = yatplt.Template(source)
+		if compiled:
+			template.compile()
+		
+		results = []
+		for x in (0, 1, 2):
+			try:
+				results.append(await template.render_string({ 'x': x }, **options))
+				results.append([ value async for value in template.render_generator({ 'x': x }, **options) ])
+			except (RuntimeError, NameError) as error:
+				results.append(type(error))
+		
+		return results
+	
+	assert asyncio.run(main(True)) == asyncio.run(main(False))
+
+
+def test_function_reused_per_options():
+	template = yatplt.Template('{{% x %}}').compile()
+	
+	assert template.get_compiled(False) is template.get_compiled(False)
+	assert template.get_compiled(False) is not template.get_compiled(True)
+	assert template.get_compiled(False, none_ok=True) is not template.get_compiled(False)
@@ -0,0 +1,89 @@
+import asyncio
+import gc
+import warnings
+
+import pytest
+
+import yatplt
+
+
+def render(source: str, scope: dict) -> str:
+	template = yatplt.Template(source).set_concurrent()
+	return asyncio.run(asyncio.wait_for(template.render_string(scope), 5))
+
+
+def test_output_order():
+	finished = []
+	
+	async def value(name: str, delay: float):
+		await asyncio.sleep(delay)
+		finished.append(name)
+		return name
+	
+	result = render('{{% await value("a", 0.05) %}}-{{% await value("b", 0.0) %}}-{{% await value("c", 0.02) %}}', { 'value': value })
+	
+	assert result == 'a-b-c'
+	assert finished == [ 'b', 'c', 'a' ]
+
+
+def test_awaited_together():
+	async def main():
+		event = asyncio.Event()
+		
+		async def wait():
+			await event.wait()
+			return 'waited'
+		
+		async def release():
+			event.set()
+			return 'released'
+		
+		# Sequential render would never complete
+		template = yatplt.Template('{{% await wait() %}}-{{% await release() %}}').set_concurrent()
+		return await asyncio.wait_for(template.render_string({ 'wait': wait, 'release': release }), 5)
+	
+	assert asyncio.run(main()) == 'waited-released'
+
+
+def test_dependent_fragments_split():
+	template = yatplt.Template('{{% (x := 1) %}}{{% x + 1 %}}{{% y %}}{{!\nz = 1 !}}{{% z %}}')
+	plan = template.get_concurrent_plan()
+	
+	assert [ len(fragments) for fragments, _ in plan ] == [ 1, 2, 1, 1 ]
+	assert [ concurrent for _, concurrent in plan ] == [ True, True, False, True ]
+	assert asyncio.run(template.set_concurrent().render_string({ 'y': 'y' })) == '12y1'
+
+
+def test_error_cancels_group():
+	cancelled = []
+	
+	async def slow():
+		try:
+			await asyncio.sleep(5)
+		except asyncio.CancelledError:
+			cancelled.append(True)
+			raise
+	
+	async def fail():
+		await asyncio.sleep(0)
+		raise ValueError('fail')
+	
+	with pytest.raises(ValueError):
+		render('{{% await slow() %}}{{% await fail() %}}', { 'slow': slow, 'fail': fail })
+	
+	assert cancelled == [ True ]
+
+
+def test_evaluation_error_closes_coroutines():
+	async def value():
+		return 1
+	
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter('always')
+		
+		with pytest.raises(ZeroDivisionError):
+			render('{{% await value() %}}{{% 1 / zero %}}', { 'value': value, 'zero': 0 })
+		
+		gc.collect()
+	
+	assert not [ warning for warning in caught if issubclass(warning.category, RuntimeWarning) ]
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+SOURCES = [
+	'{{% x + 1 %}}',
+	'{{% len(str(x)) %}}',
+	'{{% "x" in dir() %}}',
+	'{{! x = 2 !}}{{% "x" in dir() %}}{{% x %}}',
+	'{{! del x !}}{{% "x" in dir() %}}',
+	'{{% sorted(vars()) %}}',
+	'{{% sorted(locals()) %}}',
+	'{{% eval("x") %}}',
+]
+
+
+def render(source, mode, wrap_scope):
+	template = yatplt.Template(source)
+	if mode == 'fast_locals':
+		template.compile(fast_locals=True)
+	elif mode == 'scope_keys':
+		template.compile(scope_keys=[ 'x' ])
+	
+	return asyncio.run(template.render_string({ 'x': 1 }, none_ok=True, wrap_scope=wrap_scope))
+
+
+@pytest.mark.parametrize('mode', [ 'fast_locals', 'scope_keys' ])
+@pytest.mark.parametrize('wrap_scope', [ False, True ])
+@pytest.mark.parametrize('source', SOURCES)
+def test_matches_eval(source, mode, wrap_scope):
+	assert render(source, mode, wrap_scope) == render(source, 'eval', wrap_scope)
+
+
+def test_scope_access_not_compiled():
+	template = yatplt.Template('{{% dir() %}}{{% x %}}')
+	fragments = [ fragment for fragment in template.fragments if isinstance(fragment, yatplt.ExpressionTemplateFragment) ]
+	
+	assert yatplt.compile_fragment_function(fragments[0], template.context) is None
+	assert yatplt.compile_fragment_function(fragments[1], template.context) is not None
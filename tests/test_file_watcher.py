@@ -0,0 +1,140 @@
+import asyncio
+import gc
+import os
+import time
+
+import pytest
+
+import yatplt
+
+
+def wait_for(condition, timeout: float=5.0) -> bool:
+	deadline = time.monotonic() + timeout
+	while not condition():
+		if time.monotonic() > deadline:
+			return False
+		time.sleep(0.01)
+	
+	return True
+
+
+def touch(filename, source: str):
+	filename.write_text(source)
+	
+	# Modification time resolution may hide quick consecutive writes
+	timestamp = time.time() + 10
+	os.utime(filename, (timestamp, timestamp))
+
+
+class Listener:
+	
+	def __init__(self):
+		self.calls = []
+	
+	def changed(self, filename: str):
+		self.calls.append(filename)
+
+
+@pytest.fixture(params=[ False, True ], ids=[ 'poll', 'inotify' ])
+def watcher(request):
+	watcher = yatplt.FileWatcher(interval=0.02, debounce=0.05, use_inotify=request.param)
+	yield watcher
+	watcher.stop()
+
+
+def test_default_is_shared():
+	assert yatplt.default_file_watcher() is yatplt.default_file_watcher()
+
+
+def test_callback_debounced(watcher, tmp_path):
+	filename = tmp_path / 'a.txt'
+	filename.write_text('a')
+	calls = []
+	
+	watcher.add(str(filename), calls.append)
+	for source in ('b', 'c', 'd'):
+		touch(filename, source)
+	
+	assert wait_for(lambda: len(calls) > 0)
+	time.sleep(0.2)
+	assert calls == [ str(filename) ]
+
+
+def test_remove(watcher, tmp_path):
+	filename = tmp_path / 'a.txt'
+	filename.write_text('a')
+	first = []
+	second = []
+	
+	watcher.add(str(filename), first.append)
+	watcher.add(str(filename), second.append)
+	watcher.remove(str(filename), first.append)
+	
+	touch(filename, 'b')
+	assert wait_for(lambda: len(second) > 0)
+	assert first == []
+	
+	watcher.remove(str(filename))
+	assert str(filename) not in watcher.callbacks
+	assert str(filename) not in watcher.stats
+
+
+def test_stop(watcher, tmp_path):
+	filename = tmp_path / 'a.txt'
+	filename.write_text('a')
+	
+	watcher.add(str(filename), lambda filename: None)
+	thread = watcher.thread
+	assert thread.is_alive()
+	
+	watcher.stop()
+	assert not thread.is_alive()
+	assert watcher.thread is None and watcher.inotify is None
+	
+	# Restarted on next registration and falls back to polling stopped files
+	calls = []
+	watcher.add(str(filename), calls.append)
+	touch(filename, 'b')
+	assert wait_for(lambda: len(calls) > 0)
+
+
+def test_weak_method_dropped(watcher, tmp_path):
+	filename = tmp_path / 'a.txt'
+	filename.write_text('a')
+	
+	listener = Listener()
+	watcher.add(str(filename), listener.changed)
+	del listener
+	gc.collect()
+	
+	touch(filename, 'b')
+	assert wait_for(lambda: str(filename) not in watcher.callbacks)
+
+
+def test_template_shares_watcher(watcher, tmp_path):
+	first = tmp_path / 'first.txt'
+	second = tmp_path / 'second.txt'
+	part = tmp_path / 'part.txt'
+	first.write_text('first {{> part.txt <}}')
+	second.write_text('second')
+	part.write_text('a')
+	
+	template_parser = yatplt.TemplateParser(include_block_start=yatplt.INCLUDE_BLOCK_START)
+	templates = [ yatplt.FileWatcherTemplate(str(filename), template_parser, watcher=watcher) for filename in (first, second) ]
+	
+	async def render():
+		return [ await template.render_string({}) for template in templates ]
+	
+	assert asyncio.run(render()) == [ 'firsta', 'second' ]
+	assert templates[0].is_up_to_date() and templates[1].is_up_to_date()
+	
+	touch(part, 'b')
+	assert wait_for(lambda: not templates[0].is_up_to_date())
+	assert templates[1].is_up_to_date()
+	assert asyncio.run(render()) == [ 'firstb', 'second' ]
+	
+	# Collected template stops receiving notifications
+	del templates[1]
+	gc.collect()
+	touch(second, 'changed')
+	assert wait_for(lambda: str(second) not in watcher.callbacks)
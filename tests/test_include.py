@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+PARSER = yatplt.TemplateParser(include_block_start=yatplt.INCLUDE_BLOCK_START)
+
+
+def render_file(filename, scope: dict=None, template_parser: yatplt.TemplateParser=PARSER) -> str:
+	return asyncio.run(yatplt.Template.from_file(str(filename), template_parser).render_string(scope or {}))
+
+
+def test_inlined(tmp_path):
+	(tmp_path / 'partials').mkdir()
+	(tmp_path / 'partials' / 'row.thtml').write_text('<td>{{% value %}}</td>{{> cell.thtml <}}')
+	(tmp_path / 'partials' / 'cell.thtml').write_text('<td>cell</td>')
+	(tmp_path / 'page.thtml').write_text('<tr>{{> partials/row.thtml <}}</tr>')
+	
+	template = yatplt.Template.from_file(str(tmp_path / 'page.thtml'), PARSER)
+	
+	# Fragments are spliced, no include fragment is kept
+	assert all(type(fragment) in (yatplt.StringTemplateFragment, yatplt.ExpressionTemplateFragment) for fragment in template.fragments)
+	assert asyncio.run(template.render_string({ 'value': 1 })) == '<tr><td>1</td><td>cell</td></tr>'
+
+
+def test_include_path(tmp_path):
+	(tmp_path / 'shared').mkdir()
+	(tmp_path / 'shared' / 'footer.thtml').write_text('footer')
+	(tmp_path / 'page.thtml').write_text('page {{> footer.thtml <}}')
+	
+	template_parser = yatplt.TemplateParser(include_block_start=yatplt.INCLUDE_BLOCK_START, include_path=[ str(tmp_path / 'shared') ])
+	assert render_file(tmp_path / 'page.thtml', template_parser=template_parser) == 'pagefooter'
+
+
+def test_missing_file(tmp_path):
+	(tmp_path / 'page.thtml').write_text('{{> missing.thtml <}}')
+	
+	with pytest.raises((RuntimeError, FileNotFoundError)):
+		render_file(tmp_path / 'page.thtml')
+
+
+def test_fragment_names(tmp_path):
+	(tmp_path / 'part.thtml').write_text('{{% 1 / zero %}}')
+	(tmp_path / 'page.thtml').write_text('{{> part.thtml <}}')
+	
+	template = yatplt.Template.from_file(str(tmp_path / 'page.thtml'), PARSER)
+	assert 'part.thtml' in yatplt.get_fragment_name(template.fragments[0])
+
+
+def test_dependencies(tmp_path):
+	(tmp_path / 'a.thtml').write_text('{{> b.thtml <}}')
+	(tmp_path / 'b.thtml').write_text('b')
+	(tmp_path / 'page.thtml').write_text('{{> a.thtml <}}')
+	
+	dependencies = {}
+	PARSER.parse((tmp_path / 'page.thtml').read_text(), filename=str(tmp_path / 'page.thtml'), dependencies=dependencies)
+	assert set(dependencies) == { str(tmp_path / 'a.thtml'), str(tmp_path / 'b.thtml') }
+
+
+def test_include_cycle(tmp_path):
+	(tmp_path / 'a.thtml').write_text('{{> b.thtml <}}')
+	(tmp_path / 'b.thtml').write_text('{{> a.thtml <}}')
+	
+	template_parser = yatplt.TemplateParser(include_block_start=yatplt.INCLUDE_BLOCK_START)
+	with pytest.raises(RuntimeError):
+		yatplt.Template.from_file(str(tmp_path / 'a.thtml'), template_parser)
+
+
+@pytest.mark.parametrize('value', [ None, '' ])
+def test_disabled(value):
+	source = '{{> userCard}} {{> partial.thtml <}}'
+	template_parser = yatplt.TemplateParser(include_block_start=value)
+	assert asyncio.run(yatplt.Template(source, template_parser).render_string({})) == source
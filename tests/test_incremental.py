@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+
+import yatplt
+
+
+def write(filename, source: str, offset: int):
+	filename.write_text(source)
+	
+	# Modification time is compared with the time template was loaded
+	timestamp = time.time() + offset
+	os.utime(filename, (timestamp, timestamp))
+
+
+def test_init_state_reuses_prefix():
+	init_state = yatplt.InitState()
+	template_parser = yatplt.TemplateParser()
+	calls = []
+	
+	async def init(source: str) -> yatplt.Template:
+		template = yatplt.Template.from_fragments(template_parser.parse(source), { 'calls': calls })
+		await template.init(init_state=init_state)
+		return template
+	
+	async def main():
+		await init('{1{!\ncalls.append("a")\nglobal a\na = 1 !}1}{1{!\nglobal b\nb = a + 1 !}1}{1{% b %}1}')
+		template = await init('{1{!\ncalls.append("a")\nglobal a\na = 1 !}1}{1{!\nglobal c\nc = a + 2 !}1}{1{% c %}1}')
+		return template, await template.render_string({})
+	
+	template, result = asyncio.run(main())
+	
+	assert result == '3'
+	assert calls == [ 'a' ]
+	assert template.context['a'] == 1 and template.context['c'] == 3
+	assert 'b' not in template.context
+
+
+def test_reload_uses_fresh_context(tmp_path):
+	filename = tmp_path / 'page.thtml'
+	calls = []
+	prefix = '{1{!\nglobal get, base\ncalls.append(1)\ndef get():\n\treturn base\nbase = 1 !}1}'
+	
+	async def main():
+		write(filename, prefix + '{1{!\nglobal x\nx = 2 !}1}{{!\nglobal leak\nleak = 1 !}}{{% get() + x %}}|{{% "leak" in globals() %}}', 1)
+		template = yatplt.FileWatcherTemplate(str(filename), init_scope={ 'calls': calls })
+		first = await template.render_string({})
+		previous_context = template.get_template().context
+		
+		write(filename, prefix + '{1{!\nglobal x\nx = 5 !}1}{{% get() + x %}}|{{% "leak" in globals() %}}', 2)
+		second = await template.render_string({})
+		context = template.get_template().context
+		
+		return first, second, previous_context, context
+	
+	first, second, previous_context, context = asyncio.run(main())
+	
+	assert first == '3|True'
+	assert second == '6|False'
+	
+	# First one-time block is reused, function it defined reads new context
+	assert calls == [ 1 ]
+	assert context is not previous_context
+	assert context['get'].__globals__ is context
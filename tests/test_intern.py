@@ -0,0 +1,54 @@
+import asyncio
+import sys
+
+import pytest
+
+import yatplt
+
+
+async def fail():
+	raise ValueError('failed')
+
+
+def test_shared_between_positions():
+	table = yatplt.default_code_intern_table()
+	source = '{{% user.name + "#intern" %}}'
+	
+	first = yatplt.TemplateParser().parse(source)
+	second = yatplt.TemplateParser().parse('a{{% x %}}b' + source)
+	
+	assert first[0].evaluable is second[-1].evaluable
+	assert table.intern(' user.name + "#intern" ', 'eval', compile('0', '<test>', 'eval')) is first[0].evaluable
+
+
+def test_not_interned():
+	template_parser = yatplt.TemplateParser(intern_code=False)
+	first = template_parser.parse('{{% user.name + "#separate" %}}')
+	second = template_parser.parse('{{% user.name + "#separate" %}}')
+	
+	assert first[0].evaluable is not second[0].evaluable
+
+
+@pytest.mark.parametrize('mode', [ 'eval', 'compiled', 'fast_locals', 'sync' ])
+@pytest.mark.parametrize('source', [ 'a{{% x %}}b{{% 1 / zero %}}', 'a{{% x %}}b{{! y = 1 / zero !}}', 'a{{% x %}}b{{% await fail() %}}' ])
+@pytest.mark.skipif(sys.version_info < (3, 11), reason='Exception notes require python 3.11')
+def test_error_note(mode, source):
+	# Same source at other position is interned first
+	yatplt.Template(source.split('b', 1)[1])
+	template = yatplt.Template(source)
+	if mode in ('compiled', 'fast_locals'):
+		template.compile(fast_locals=(mode == 'fast_locals'))
+	
+	scope = { 'x': 1, 'zero': 0, 'fail': fail }
+	
+	if mode == 'sync':
+		if not template.is_synchronous():
+			pytest.skip('Template requires async render')
+		with pytest.raises(ZeroDivisionError) as info:
+			template.render_string_sync(scope)
+	else:
+		with pytest.raises((ZeroDivisionError, ValueError)) as info:
+			asyncio.run(template.render_string(scope))
+	
+	name = yatplt.get_fragment_name(template.fragments[-1])
+	assert info.value.__notes__ == [ yatplt.FRAGMENT_NOTE_PREFIX + name ]
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+PARSER = yatplt.TemplateParser(
+	include_block_start=yatplt.INCLUDE_BLOCK_START,
+	section_block_start=yatplt.SECTION_BLOCK_START,
+	layout_block_start=yatplt.LAYOUT_BLOCK_START
+)
+
+
+def render_file(filename, scope: dict=None) -> str:
+	return asyncio.run(yatplt.Template.from_file(str(filename), PARSER).render_string(scope or {}))
+
+
+def test_include_and_layout(tmp_path):
+	(tmp_path / 'header.thtml').write_text('<h1>{{% title %}}</h1>')
+	(tmp_path / 'base.thtml').write_text('<html>{{$ content $}}default{{$ end $}}{{> header.thtml <}}</html>')
+	(tmp_path / 'page.thtml').write_text('{{^ base.thtml ^}}{{$ content $}}<p>{{% body %}}</p>{{$ end $}}')
+	
+	assert render_file(tmp_path / 'page.thtml', { 'title': 'T', 'body': 'B' }) == '<html><p>B</p><h1>T</h1></html>'
+
+
+def test_default_sections(tmp_path):
+	(tmp_path / 'base.thtml').write_text('<title>{{$ title $}}Default{{$ end $}}</title>{{$ body $}}empty{{$ end $}}')
+	(tmp_path / 'page.thtml').write_text('{{^ base.thtml ^}}{{$ body $}}content{{$ end $}}')
+	
+	assert render_file(tmp_path / 'page.thtml') == '<title>Default</title>content'
+
+
+def test_multilevel(tmp_path):
+	(tmp_path / 'base.thtml').write_text('<html>{{$ body $}}{{$ main $}}base{{$ end $}}{{$ end $}}</html>')
+	(tmp_path / 'two_column.thtml').write_text('{{^ base.thtml ^}}{{$ body $}}<nav/>{{$ main $}}column{{$ end $}}{{$ end $}}')
+	(tmp_path / 'page.thtml').write_text('{{^ two_column.thtml ^}}{{$ main $}}page{{$ end $}}')
+	
+	assert render_file(tmp_path / 'page.thtml') == '<html><nav/>page</html>'
+
+
+def test_page_blocks_before_layout(tmp_path):
+	(tmp_path / 'base.thtml').write_text('<p>{{$ body $}}{{$ end $}}</p>')
+	(tmp_path / 'page.thtml').write_text('{{^ base.thtml ^}}{{!\ntitle = "T" !}}ignored{{$ body $}}{{% title %}}{{$ end $}}')
+	
+	assert render_file(tmp_path / 'page.thtml') == '<p>T</p>'
+
+
+def test_flattened(tmp_path):
+	(tmp_path / 'base.thtml').write_text('a{{$ body $}}{{$ end $}}b')
+	(tmp_path / 'page.thtml').write_text('{{^ base.thtml ^}}{{$ body $}}{{% x %}}{{$ end $}}')
+	
+	template = yatplt.Template.from_file(str(tmp_path / 'page.thtml'), PARSER)
+	assert not any(isinstance(fragment, yatplt.SectionTemplateFragment) for fragment in yatplt.iterate_fragments(template.fragments))
+
+
+def test_duplicate_section(tmp_path):
+	(tmp_path / 'base.thtml').write_text('{{$ a $}}{{$ end $}}')
+	(tmp_path / 'page.thtml').write_text('{{^ base.thtml ^}}{{$ a $}}{{$ end $}}{{$ a $}}{{$ end $}}')
+	
+	with pytest.raises(RuntimeError):
+		render_file(tmp_path / 'page.thtml')
+
+
+def test_section_in_cached_region():
+	template_parser = yatplt.TemplateParser(cache_block_start=yatplt.CACHE_BLOCK_START, section_block_start=yatplt.SECTION_BLOCK_START)
+	
+	with pytest.raises(RuntimeError):
+		template_parser.parse('{{@ ttl=1 @}}{{$ a $}}{{$ end $}}{{@ end @}}')
+
+
+
+@pytest.mark.parametrize('argument', [ 'section_block_start', 'layout_block_start' ])
+@pytest.mark.parametrize('value', [ None, '' ])
+def test_disabled(argument, value):
+	source = '{{^items}}none{{/items}} {{$title}} {{^ base.thtml ^}}'
+	template_parser = yatplt.TemplateParser(**{ argument: value })
+	assert asyncio.run(yatplt.Template(source, template_parser).render_string({})) == source
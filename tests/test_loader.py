@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import yatplt
+
+
+def touch(filename, source: str):
+	filename.write_text(source)
+	
+	# Modification time resolution may hide quick consecutive writes
+	timestamp = time.time() + 10
+	os.utime(filename, (timestamp, timestamp))
+
+
+def test_loader_cancelled_owner(tmp_path):
+	(tmp_path / 'index.thtml').write_text('<p>{{% name %}}</p>')
+	
+	class SlowLoader(yatplt.TemplateLoader):
+		
+		async def load(self, name):
+			await asyncio.sleep(0.01)
+			return await super().load(name)
+	
+	loader = SlowLoader([ str(tmp_path) ])
+	
+	async def main():
+		tasks = [ asyncio.create_task(loader.get_template('index.thtml')) for _ in range(4) ]
+		await asyncio.sleep(0)
+		tasks[0].cancel()
+		return await asyncio.gather(*tasks, return_exceptions=True)
+	
+	results = asyncio.run(main())
+	
+	assert isinstance(results[0], asyncio.CancelledError)
+	assert all(isinstance(result, yatplt.Template) for result in results[1:])
+	assert asyncio.run(loader.render_string('index.thtml', { 'name': 'Ann' })) == '<p>Ann</p>'
+
+
+@pytest.mark.parametrize('watched', [ False, True ])
+def test_reload_on_dependency_change(tmp_path, watched):
+	(tmp_path / 'index.thtml').write_text('{{^ base.thtml ^}}{{$ body $}}{{> part.thtml <}}{{$ end $}}')
+	(tmp_path / 'base.thtml').write_text('<main>{{$ body $}}{{$ end $}}</main>')
+	(tmp_path / 'part.thtml').write_text('a')
+	
+	template_parser = yatplt.TemplateParser(
+		include_block_start=yatplt.INCLUDE_BLOCK_START,
+		section_block_start=yatplt.SECTION_BLOCK_START,
+		layout_block_start=yatplt.LAYOUT_BLOCK_START
+	)
+	watcher = yatplt.FileWatcher(interval=0.02, debounce=0.02, use_inotify=False) if watched else None
+	loader = yatplt.TemplateLoader([ str(tmp_path) ], template_parser, auto_reload=True, watcher=watcher)
+	
+	def render(expected: str):
+		deadline = time.monotonic() + 5
+		while True:
+			result = asyncio.run(loader.render_string('index.thtml'))
+			if result == expected or time.monotonic() > deadline:
+				return result
+			time.sleep(0.01)
+	
+	try:
+		assert render('<main>a</main>') == '<main>a</main>'
+		
+		touch(tmp_path / 'part.thtml', 'b')
+		assert render('<main>b</main>') == '<main>b</main>'
+		
+		touch(tmp_path / 'base.thtml', '<div>{{$ body $}}{{$ end $}}</div>')
+		assert render('<div>b</div>') == '<div>b</div>'
+		
+		assert loader.get_stats()['entries'] == 1
+	finally:
+		if watcher is not None:
+			watcher.stop()
+
+
+def test_not_reloaded_without_changes(tmp_path):
+	(tmp_path / 'index.thtml').write_text('{{% 1 %}}')
+	loader = yatplt.TemplateLoader([ str(tmp_path) ], auto_reload=True)
+	
+	async def main():
+		return await loader.get_template('index.thtml'), await loader.get_template('index.thtml')
+	
+	first, second = asyncio.run(main())
+	assert first is second
+	assert loader.get_stats()['hits'] == 1
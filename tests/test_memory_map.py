@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+from test_parser import BASELINE_CASES, render
+
+
+@pytest.mark.parametrize('name, source, scope, expected', BASELINE_CASES, ids=[ case[0] for case in BASELINE_CASES ])
+def test_memory_map_parity(tmp_path, name, source, scope, expected):
+	filename = tmp_path / 'template.thtml'
+	filename.write_text(source + ' тест', encoding='utf-8')
+	
+	async def main():
+		template = yatplt.Template.from_file(str(filename), memory_map=True)
+		await template.init(init_ok=True)
+		return await template.render_string(dict(scope))
+	
+	assert asyncio.run(main()) == asyncio.run(render(source + ' тест', scope))
+
+
+def test_truncated_file(tmp_path):
+	filename = tmp_path / 'template.thtml'
+	static = 'static text ' * yatplt.MAPPED_STRING_MIN_SIZE
+	filename.write_text(f'{static}{{{{% name %}}}}{static}', encoding='utf-8')
+	
+	template = yatplt.Template.from_file(str(filename), memory_map=True)
+	assert any(isinstance(fragment, yatplt.MappedStringTemplateFragment) for fragment in template.fragments)
+	
+	# Fragments do not reference the mapping
+	filename.write_text('')
+	filename.unlink()
+	
+	result = asyncio.run(template.render_string({ 'name': 'Ann' }))
+	assert result == f'{static.strip()}Ann{static.strip()}'
@@ -0,0 +1,62 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import warnings
+
+import pytest
+
+import yatplt
+
+
+CONTEXT = { 'threading': threading, 'time': time, 'asyncio': asyncio }
+
+
+def render(template: yatplt.Template, scope: dict=None) -> str:
+	return asyncio.run(template.render_string(scope if scope is not None else {}, none_ok=True))
+
+
+@pytest.mark.parametrize('compiled', [ False, True ])
+def test_offloaded_to_executor(compiled):
+	template = yatplt.Template('{{%& threading.current_thread().name %}}|{{% threading.current_thread().name %}}', context=CONTEXT)
+	if compiled:
+		template.compile()
+	
+	with concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='offload') as executor:
+		template.set_offload_executor(executor)
+		offloaded, regular = render(template).split('|')
+	
+	assert offloaded.startswith('offload')
+	assert regular == threading.current_thread().name
+
+
+def test_offloaded_block_writes_scope():
+	template = yatplt.Template('{{!&\nvalue = threading.get_ident() !}}{{% value != threading.get_ident() %}}', context=CONTEXT)
+	assert render(template) == 'True'
+
+
+def test_await_not_allowed():
+	with pytest.raises(RuntimeError):
+		yatplt.Template('{{%& await asyncio.sleep(0) %}}', context=CONTEXT)
+
+
+def test_prefix_disabled():
+	template_parser = yatplt.TemplateParser(offload_prefix=None)
+	fragments = template_parser.parse('{{% "&" %}}')
+	assert not fragments[0].offload
+
+
+def test_slow_fragment_warning():
+	template = yatplt.Template('{{% time.sleep(0.05) %}}', context=CONTEXT).set_slow_fragment_threshold(0.01)
+	
+	with pytest.warns(yatplt.SlowFragmentWarning):
+		render(template)
+
+
+@pytest.mark.parametrize('source', [ '{{% await asyncio.sleep(0.05) %}}', '{{%& time.sleep(0.05) %}}', '{{% 1 %}}' ])
+def test_slow_fragment_not_warned(source):
+	template = yatplt.Template(source, context=CONTEXT).set_slow_fragment_threshold(0.01)
+	
+	with warnings.catch_warnings():
+		warnings.simplefilter('error', yatplt.SlowFragmentWarning)
+		render(template)
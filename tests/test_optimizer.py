@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+def test_optimize_fragments():
+	fragments, removed = yatplt.optimize_fragments(yatplt.TemplateParser().parse('a{{% 1 + 2 %}}b{{% x %}}'))
+	assert removed == 2
+	assert str(fragments[0]) == 'a3b'
+
+
+def test_whitespace_boundaries_not_merged():
+	fragments, removed = yatplt.optimize_fragments(yatplt.TemplateParser(strip_string=False).parse('a {{% "b" %}}c'))
+	assert removed == 1
+	assert [ str(fragment) for fragment in fragments ] == [ 'a ', 'bc' ]
+
+
+def test_none_constant_kept():
+	fragments, removed = yatplt.optimize_fragments(yatplt.TemplateParser().parse('a{{% None %}}'))
+	assert removed == 0
+	assert isinstance(fragments[-1], yatplt.ExpressionTemplateFragment)
+
+
+@pytest.mark.parametrize('source', [
+	'a{{% 1 + 2 %}}b{{% x %}}',
+	' a {{% "  b  " %}} c {{% 2 * 3 %}}',
+	'{1{! base = 10 !}1}{{% base %}}{{% (1, 2) %}}',
+	'{{% "<" %}}{{%! "<" %}}',
+])
+@pytest.mark.parametrize('options', [ {}, { 'strip_string': False } ])
+def test_render_unchanged(source, options):
+	template_parser = yatplt.TemplateParser(autoescape=True)
+	scope = { 'x': 'x' }
+	
+	async def main():
+		template = yatplt.Template(source, template_parser)
+		await template.init(init_ok=True)
+		expected = await template.render_string(dict(scope), **options)
+		
+		template.fragments, _ = yatplt.optimize_fragments(template.fragments)
+		return expected, await template.render_string(dict(scope), **options)
+	
+	expected, result = asyncio.run(main())
+	assert result == expected
@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+import pytest
+
+import yatplt
+
+from test_parser import BASELINE_CASES, render
+
+
+def test_parse_cache(tmp_path):
+	cache_dir = str(tmp_path / 'cache')
+	source = '{{! x = 2 !}}<p>{{% x * n %}}</p>{{% name %}}'
+	scope = { 'n': 3, 'name': 'Ann' }
+	
+	first = asyncio.run(render(source, scope, yatplt.TemplateParser(cache_dir=cache_dir)))
+	assert len(os.listdir(cache_dir)) > 0
+	second = asyncio.run(render(source, scope, yatplt.TemplateParser(cache_dir=cache_dir)))
+	assert first == second == '<p>6</p>Ann'
+
+
+@pytest.mark.parametrize('name, source, scope, expected', BASELINE_CASES, ids=[ case[0] for case in BASELINE_CASES ])
+def test_cached_parity(tmp_path, name, source, scope, expected):
+	cache_dir = str(tmp_path / 'cache')
+	
+	for _ in range(2):
+		assert asyncio.run(render(source, scope, yatplt.TemplateParser(cache_dir=cache_dir))) == expected
+
+
+def test_key_depends_on_configuration(tmp_path):
+	source = '{{% x %}}'
+	assert yatplt.TemplateParser().get_cache_key(source) == yatplt.TemplateParser().get_cache_key(source)
+	assert yatplt.TemplateParser().get_cache_key(source) != yatplt.TemplateParser(autoescape=True).get_cache_key(source)
+	assert yatplt.TemplateParser().get_cache_key(source) != yatplt.TemplateParser().get_cache_key(source + ' ')
+
+
+def test_corrupted_file_ignored(tmp_path):
+	cache_dir = tmp_path / 'cache'
+	source = '<p>{{% x %}}</p>'
+	asyncio.run(render(source, { 'x': 1 }, yatplt.TemplateParser(cache_dir=str(cache_dir))))
+	
+	for filename in cache_dir.iterdir():
+		filename.write_bytes(b'broken')
+	
+	assert asyncio.run(render(source, { 'x': 1 }, yatplt.TemplateParser(cache_dir=str(cache_dir)))) == '<p>1</p>'
+
+
+def test_included_file_change(tmp_path):
+	(tmp_path / 'part.thtml').write_text('a')
+	(tmp_path / 'page.thtml').write_text('{{> part.thtml <}}')
+	template_parser = yatplt.TemplateParser(cache_dir=str(tmp_path / 'cache'), include_block_start=yatplt.INCLUDE_BLOCK_START)
+	
+	def load():
+		return asyncio.run(yatplt.Template.from_file(str(tmp_path / 'page.thtml'), template_parser).render_string({}))
+	
+	assert load() == 'a'
+	(tmp_path / 'part.thtml').write_text('b')
+	assert load() == 'b'
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+async def awaited_value():
+	return 'awaited'
+
+
+# (name, source, scope, output of the baseline parser and render loop)
+BASELINE_CASES = [
+	('plain', 'Hello, world', {}, 'Hello, world'),
+	('expression', '<p>{{% name %}}</p>', { 'name': 'Ann' }, '<p>Ann</p>'),
+	('block', '{{! items = [ i * i for i in range(4) ] !}}<ul>{{% "".join(f"<li>{i}</li>" for i in items) %}}</ul>', {}, '<ul><li>0</li><li>1</li><li>4</li><li>9</li></ul>'),
+	('comment', 'a {{# hidden {{% x %}} #}} b {{# another #}}c', {}, 'a  b c'),
+	('one_time', '{1{! base = 10 !}1}{1{% base * 2 %}1} {{% base + n %}}', { 'n': 1 }, '2011'),
+	('multiline', '''<div>
+	{{!
+		def row(value):
+			return f'<td>{value}</td>'
+	!}}
+	{{!
+		cells = ''
+		for value in values:
+			cells += row(value)
+	!}}
+	{{% cells %}}
+</div>''', { 'values': [ 1, 2, 3 ] }, '<div><td>1</td><td>2</td><td>3</td></div>'),
+	('strip', '   a   {{% "  b  " %}}   c   ', {}, 'abc'),
+	('mustache', '{{@index}} {{> userCard}} {{^items}}none{{/items}} {{$title}}', {}, '{{@index}} {{> userCard}} {{^items}}none{{/items}} {{$title}}'),
+	('await', '{{% await value() %}}', { 'value': awaited_value }, 'awaited'),
+	('context', '{{! counter = counter + 1 if "counter" in globals() else 1 !}}{{% counter %}}', {}, '1'),
+]
+
+
+async def render(source: str, scope: dict, template_parser: yatplt.TemplateParser=None, compiled: bool=False) -> str:
+	template = yatplt.Template(source, template_parser)
+	await template.init(init_ok=True)
+	if compiled:
+		template.compile()
+	return await template.render_string(dict(scope))
+
+
+@pytest.mark.parametrize('name, source, scope, expected', BASELINE_CASES, ids=[ case[0] for case in BASELINE_CASES ])
+def test_baseline_parity(name, source, scope, expected):
+	assert asyncio.run(render(source, scope)) == expected
+
+
+def reconstruct(fragments) -> str:
+	parts = []
+	for fragment in fragments:
+		if isinstance(fragment, yatplt.StringTemplateFragment):
+			parts.append(fragment.value)
+		elif isinstance(fragment, yatplt.ExpressionTemplateFragment):
+			parts.append(fragment.expression_start_tag + fragment.get_source() + fragment.expression_end_tag)
+		elif isinstance(fragment, yatplt.BlockTemplateFragment):
+			parts.append(fragment.block_start_tag + fragment.get_source() + fragment.block_end_tag)
+		else:
+			raise AssertionError(f'Unexpected fragment {type(fragment)}')
+	return ''.join(parts)
+
+
+@pytest.mark.parametrize('source', [
+	'',
+	'text only',
+	'{{% a %}}',
+	'<{{% a %}} b {{! c = 1 !}}>',
+	'{1{! x = 1 !}1}{1{% x %}1}{{% x %}}',
+	'{{% "%}" %}}\n-{{! s = "!}" !}}',
+	'\n'.join(f'<tr>{{{{% row[{i}] %}}}}</tr>' for i in range(100)),
+	'{{> partial <}} {{@ ttl=1 @}} {{$ title $}} {{^ base ^}}',
+])
+def test_tokenizer_round_trip(source):
+	template_parser = yatplt.TemplateParser(strip_string=False)
+	assert reconstruct(template_parser.parse(source)) == source
+
+
+def test_comments_removed():
+	template_parser = yatplt.TemplateParser(strip_string=False)
+	fragments = template_parser.parse('a{{# one #}}b{{# two {{% x %}} #}}c' * 3)
+	assert reconstruct(fragments) == 'abc' * 3
+
+
+def test_unclosed_tag():
+	with pytest.raises(RuntimeError):
+		yatplt.TemplateParser().parse('a {{% b')
+
+
+def test_custom_tags():
+	template_parser = yatplt.TemplateParser(expression_start='<%', expression_end='%>', comment_block_start='<<<', comment_block_end='>>>')
+	assert asyncio.run(render('<<< note >>><% 1 + 1 %>', {}, template_parser)) == '2'
@@ -0,0 +1,65 @@
+import asyncio
+import concurrent.futures
+
+import yatplt
+
+
+class CountingExecutor(concurrent.futures.Executor):
+	"""
+	Executor recording whether each render was sent with template 
+	specification
+	"""
+	
+	def __init__(self, executor: concurrent.futures.Executor):
+		self.executor = executor
+		self.specs = []
+	
+	def submit(self, function, *args, **kwargs):
+		self.specs.append(args[1] is not None)
+		return self.executor.submit(function, *args, **kwargs)
+	
+	def shutdown(self, wait: bool=True, **kwargs):
+		self.executor.shutdown(wait=wait)
+
+
+def test_render():
+	async def main():
+		with yatplt.ProcessPoolRenderer(max_workers=2) as renderer:
+			renderer.add_template('row', source='<td>{{% value %}}</td>')
+			results = await asyncio.gather(*[ renderer.render_string('row', scope={ 'value': i }) for i in range(8) ])
+			
+			renderer.add_template('row', source='<b>{{% value %}}</b>')
+			results.append(await renderer.render_string('row', scope={ 'value': 'x' }))
+			return results
+	
+	assert asyncio.run(main()) == [ f'<td>{i}</td>' for i in range(8) ] + [ '<b>x</b>' ]
+
+
+def test_specification_sent_once_per_worker():
+	async def main():
+		with yatplt.ProcessPoolRenderer(max_workers=1) as renderer:
+			renderer.executor = CountingExecutor(renderer.executor)
+			renderer.add_template('row', source='<td>{{% value %}}</td>')
+			
+			results = [ await renderer.render_string('row', scope={ 'value': i }) for i in range(5) ]
+			return results, renderer.executor.specs
+	
+	results, specs = asyncio.run(main())
+	
+	assert results == [ f'<td>{i}</td>' for i in range(5) ]
+	
+	# Unknown worker reports missing template once, then only scope is sent
+	assert specs == [ False, True, False, False, False, False ]
+
+
+def test_unknown_template():
+	async def main():
+		with yatplt.ProcessPoolRenderer(max_workers=1) as renderer:
+			await renderer.render_string('missing')
+	
+	try:
+		asyncio.run(main())
+	except RuntimeError as error:
+		assert 'missing' in str(error)
+	else:
+		raise AssertionError('RuntimeError expected')
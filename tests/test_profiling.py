@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+
+import yatplt
+
+
+SOURCE = 'a\n{{% time.sleep(0.02) or "slow" %}}\n{{% await fast() %}}\n{{!\nx = 1 !}}'
+
+
+async def fast():
+	return 'fast'
+
+
+def create(mode: str, callback=None) -> yatplt.Template:
+	template = yatplt.Template(SOURCE, context={ 'time': time, 'fast': fast }).set_profiling(callback=callback)
+	if mode == 'compiled':
+		template.compile()
+	elif mode == 'concurrent':
+		template.set_concurrent()
+	
+	return template
+
+
+@pytest.mark.parametrize('mode', [ 'eval', 'compiled', 'concurrent' ])
+def test_report(mode):
+	template = create(mode)
+	for _ in range(3):
+		assert asyncio.run(template.render_string({})) == 'aslowfast'
+	
+	report = template.get_profile_report()
+	assert report[0]['fragment'] == yatplt.get_fragment_name(template.fragments[1])
+	assert sorted(entry['lines'] for entry in report) == [ (2, 2), (3, 3), (4, 5) ]
+	assert all(entry['calls'] == 3 for entry in report)
+	
+	slow, = [ entry for entry in report if entry['lines'] == (2, 2) ]
+	assert slow['total_time'] >= 0.06
+	assert slow['max_time'] >= 0.02
+	assert slow['mean_time'] == pytest.approx(slow['total_time'] / 3)
+	assert slow['output_size'] == 3 * len('slow')
+	
+	fast_entry, = [ entry for entry in report if entry['lines'] == (3, 3) ]
+	assert fast_entry['output_size'] == 3 * len('fast')
+	assert fast_entry['total_time'] < slow['total_time']
+
+
+def test_callback():
+	calls = []
+	template = create('eval', lambda profile, elapsed, size: calls.append((profile.name, size)))
+	asyncio.run(template.render_string({}))
+	
+	names = [ yatplt.get_fragment_name(fragment) for fragment in template.fragments[1:] ]
+	assert calls == [ (names[0], 4), (names[1], 4), (names[2], 0) ]
+
+
+def test_reset_and_disable():
+	template = create('eval')
+	asyncio.run(template.render_string({}))
+	
+	template.reset_profile()
+	assert all(entry['calls'] == 0 and entry['mean_time'] == 0.0 for entry in template.get_profile_report())
+	
+	template.set_profiling(False)
+	asyncio.run(template.render_string({}))
+	assert template.get_profile_report() == []
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+def test_render_cache():
+	calls = []
+	template = yatplt.Template('{{% calls.append(locale) or locale %}}')
+	template.set_render_cache(yatplt.RenderCache(scope_keys=[ 'locale' ]))
+	
+	async def main():
+		return [ await template.render_string({ 'locale': locale, 'calls': calls }) for locale in ('en', 'en', 'de') ]
+	
+	assert asyncio.run(main()) == [ 'en', 'en', 'de' ]
+	assert calls == [ 'en', 'de' ]
+
+
+def test_render_cache_cancelled_owner():
+	cache = yatplt.RenderCache()
+	renders = []
+	
+	async def render():
+		renders.append(None)
+		await asyncio.sleep(0.01)
+		return 'result'
+	
+	async def main():
+		tasks = [ asyncio.create_task(cache.get('key', render)) for _ in range(4) ]
+		await asyncio.sleep(0)
+		tasks[0].cancel()
+		return await asyncio.gather(*tasks, return_exceptions=True)
+	
+	results = asyncio.run(main())
+	
+	assert isinstance(results[0], asyncio.CancelledError)
+	assert results[1:] == [ 'result' ] * 3
+	assert len(renders) == 2
+
+
+def test_explicit_key_and_options():
+	calls = []
+	template = yatplt.Template('{{% calls.append(n) or n %}}')
+	template.set_render_cache(yatplt.RenderCache())
+	
+	async def main():
+		return [
+			await template.render_string({ 'n': 1, 'calls': calls }),
+			await template.render_string({ 'n': 2, 'calls': calls }, cache_key='a'),
+			await template.render_string({ 'n': 3, 'calls': calls }, cache_key='a'),
+			await template.render_string({ 'n': 4, 'calls': calls }, cache_key='a', none_ok=True),
+		]
+	
+	# Without scope keys only renders with explicit key are cached, options are part of the key
+	assert asyncio.run(main()) == [ '1', '2', '2', '4' ]
+	assert calls == [ 1, 2, 4 ]
+
+
+def test_eviction_and_ttl():
+	cache = yatplt.RenderCache(max_entries=2, ttl=0.05)
+	
+	def render(value):
+		return lambda: asyncio.sleep(0, value)
+	
+	async def main():
+		for key in ('a', 'b', 'c'):
+			await cache.get(key, render(key))
+		
+		evicted = await cache.get('a', render('new a'))
+		await asyncio.sleep(0.06)
+		expired = await cache.get('a', render('expired a'))
+		return evicted, expired
+	
+	assert asyncio.run(main()) == ('new a', 'expired a')
+	assert cache.get_stats()['evictions'] >= 2
+
+
+def test_failed_render_not_cached():
+	cache = yatplt.RenderCache()
+	
+	async def fail():
+		raise ValueError()
+	
+	async def main():
+		with pytest.raises(ValueError):
+			await cache.get('key', fail)
+		return await cache.get('key', lambda: asyncio.sleep(0, 'result'))
+	
+	assert asyncio.run(main()) == 'result'
+
+
+def test_clear_during_render():
+	cache = yatplt.RenderCache()
+	
+	async def render():
+		cache.clear()
+		return 'stale'
+	
+	async def main():
+		await cache.get('key', render)
+		return await cache.get('key', lambda: asyncio.sleep(0, 'fresh'))
+	
+	assert asyncio.run(main()) == 'fresh'
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+def test_wrap_scope():
+	template = yatplt.Template('{{! x = 2 !}}{{% x %}}')
+	scope = { 'x': 1 }
+	
+	# Each fragment receives it's own copy of scope
+	assert asyncio.run(template.render_string(scope, wrap_scope=True)) == '1'
+	assert scope == { 'x': 1 }
+	
+	assert asyncio.run(template.render_string(scope)) == '2'
+	assert scope == { 'x': 2 }
+
+
+def test_overlay():
+	base = { 'a': 1, 'b': 2 }
+	overlay = yatplt.ScopeOverlay(base)
+	
+	overlay['a'] = 10
+	overlay['c'] = 3
+	del overlay['b']
+	
+	assert overlay['a'] == 10 and overlay['c'] == 3
+	assert 'b' not in overlay and overlay.get('b') is None
+	with pytest.raises(KeyError):
+		overlay['b']
+	with pytest.raises(KeyError):
+		del overlay['b']
+	
+	# Base is never modified, it's later changes are visible
+	assert base == { 'a': 1, 'b': 2 }
+	base['d'] = 4
+	assert overlay['d'] == 4
+
+
+def test_overlay_none_base():
+	overlay = yatplt.ScopeOverlay(None)
+	overlay['a'] = 1
+	assert overlay['a'] == 1 and 'b' not in overlay
+
+
+def test_read_only_fragment_not_wrapped():
+	fragments = yatplt.TemplateParser().parse('{{% x %}}{{!\ny = 1 !}}{{% vars() %}}')
+	scope = { 'x': 1 }
+	
+	assert yatplt.wrap_fragment_scope(fragments[0], scope) is scope
+	assert isinstance(yatplt.wrap_fragment_scope(fragments[1], scope), yatplt.ScopeOverlay)
+	
+	# Fragments accessing scope as a whole receive plain copy
+	wrapped = yatplt.wrap_fragment_scope(fragments[2], scope)
+	assert type(wrapped) is dict and wrapped == scope and wrapped is not scope
+
+
+@pytest.mark.parametrize('mode', [ 'eval', 'compiled', 'concurrent', 'sync' ])
+@pytest.mark.parametrize('source', [
+	'{{! x = 2 !}}{{% x %}}',
+	'{{!\ndel x !}}{{% x %}}',
+	'{{!\nimport math\ny = math.floor(x) !}}{{% "y" in locals() %}}',
+	'{{!\nfor x in range(3):\n\tpass !}}{{% x %}}',
+	'{{% [ x for x in range(3) ] %}}{{% x %}}',
+])
+def test_matches_copied_scope(mode, source):
+	template = yatplt.Template(source)
+	if mode == 'compiled':
+		template.compile()
+	elif mode == 'concurrent':
+		template.set_concurrent()
+	
+	scope = { 'x': 1 }
+	if mode == 'sync':
+		result = template.render_string_sync(scope, wrap_scope=True)
+	else:
+		result = asyncio.run(template.render_string(scope, wrap_scope=True))
+	
+	# Each fragment sees unmodified scope, as with dict(scope) per fragment
+	expected = ''.join(str(eval(fragment.evaluable, {}, dict(scope))) for fragment in template.fragments if isinstance(fragment, yatplt.ExpressionTemplateFragment))
+	assert result == expected
+	assert scope == { 'x': 1 }
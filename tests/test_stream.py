@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import yatplt
+
+
+class BytesWriter:
+	
+	def __init__(self):
+		self.chunks = []
+	
+	def write(self, data: bytes):
+		self.chunks.append(data)
+
+
+def test_stream_chunk_size_in_bytes():
+	template = yatplt.Template(''.join('{{% value %}}' for _ in range(40)))
+	scope = { 'value': 'жжжж' }
+	writer = BytesWriter()
+	
+	written = asyncio.run(template.render_stream(writer, scope=scope, chunk_size=64))
+	
+	assert written == 320
+	assert [ len(chunk) for chunk in writer.chunks ] == [ 64 ] * 5
+	assert b''.join(writer.chunks).decode('utf-8') == asyncio.run(template.render_string(scope))
+
+
+def test_stream_asgi():
+	messages = []
+	
+	async def send(message):
+		messages.append(message)
+	
+	template = yatplt.Template('a{{% x %}}b')
+	asyncio.run(template.render_stream(send, scope={ 'x': 1 }))
+	
+	assert b''.join(message['body'] for message in messages) == b'a1b'
+	assert messages[-1]['more_body'] is False
+
+
+class DrainingWriter(BytesWriter):
+	
+	def __init__(self):
+		super().__init__()
+		self.drained = 0
+	
+	async def drain(self):
+		self.drained += 1
+
+
+@pytest.mark.parametrize('mode', [ 'eval', 'compiled', 'concurrent' ])
+def test_matches_render_string(mode):
+	template = yatplt.Template(' a {{% x %}} b {{!\ny = x * 2 !}}{{% y %}}')
+	if mode == 'compiled':
+		template.compile()
+	elif mode == 'concurrent':
+		template.set_concurrent()
+	
+	writer = DrainingWriter()
+	written = asyncio.run(template.render_stream(writer, scope={ 'x': 'ж' }, chunk_size=1))
+	
+	result = asyncio.run(template.render_string({ 'x': 'ж' }))
+	assert b''.join(writer.chunks).decode('utf-8') == result
+	assert written == len(result.encode('utf-8'))
+	assert writer.drained == len(writer.chunks)
+
+
+def test_flush_interval():
+	async def slow():
+		await asyncio.sleep(0.1)
+		return 'slow'
+	
+	chunks = []
+	
+	class TimedWriter:
+		
+		def write(self, data: bytes):
+			chunks.append((data, asyncio.get_running_loop().time()))
+	
+	async def main():
+		template = yatplt.Template('fast{{% await slow() %}}')
+		start = asyncio.get_running_loop().time()
+		await template.render_stream(TimedWriter(), scope={ 'slow': slow }, flush_interval=0.02)
+		return start
+	
+	start = asyncio.run(main())
+	
+	# Buffered output is flushed while awaiting slow expression
+	assert [ data for data, _ in chunks ] == [ b'fast', b'slow' ]
+	assert chunks[0][1] - start < 0.09
+
+
+def test_error_propagated():
+	writer = BytesWriter()
+	template = yatplt.Template('a{{% 1 / 0 %}}')
+	
+	with pytest.raises(ZeroDivisionError):
+		asyncio.run(template.render_stream(writer))
@@ -0,0 +1,62 @@
+import asyncio
+import gc
+import warnings
+
+import pytest
+
+import yatplt
+
+
+def test_synchronous_render():
+	template = yatplt.Template('{{! y = x * 2 !}}{{% y %}}')
+	assert template.is_synchronous()
+	assert template.render_string_sync({ 'x': 21 }) == '42'
+
+
+async def value():
+	return 1
+
+
+async def collect(generator) -> list:
+	return [ item async for item in generator ]
+
+
+@pytest.mark.parametrize('compiled', [ False, True ])
+def test_parity(compiled):
+	source = ' a {{! y = x * 2 !}}{{% y %}} b {{% [ i for i in range(x) ] %}} '
+	template = yatplt.Template(source)
+	if compiled:
+		template.compile()
+	
+	for options in ({}, { 'strip_string': False }, { 'none_ok': True }):
+		assert template.render_string_sync({ 'x': 3 }, **options) == asyncio.run(template.render_string({ 'x': 3 }, **options))
+		assert list(template.render_generator_sync({ 'x': 3 }, **options)) == asyncio.run(collect(template.render_generator({ 'x': 3 }, **options)))
+
+
+@pytest.mark.parametrize('compiled', [ False, True ])
+def test_async_template_rejected(compiled):
+	template = yatplt.Template('{{% await value() %}}')
+	assert not template.is_synchronous()
+	if compiled:
+		template.compile()
+	
+	with pytest.raises(RuntimeError):
+		template.render_string_sync({ 'value': value })
+
+
+@pytest.mark.parametrize('compiled', [ False, True ])
+def test_returned_coroutine_closed(compiled):
+	template = yatplt.Template('{{% value() %}}')
+	assert template.is_synchronous()
+	if compiled:
+		template.compile()
+	
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter('always')
+		
+		with pytest.raises(RuntimeError):
+			template.render_string_sync({ 'value': value })
+		
+		gc.collect()
+	
+	assert not [ warning for warning in caught if issubclass(warning.category, RuntimeWarning) ]
@@ -42,6 +42,27 @@ import dis
 import typing
 import asyncio
 import os
+import re
+import sys
+import types
+import builtins
+import marshal
+import mmap
+import hashlib
+import inspect
+import tempfile
+import functools
+import collections
+import array
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+import weakref
+import threading
+import warnings
+import concurrent.futures
 
 
 # Default values for block syntax
@@ -209,24 +230,215 @@ useful_function('my shitcode')
 %}}
 """
 
+CACHE_BLOCK_START = '{{@'
+"""
+Cached region of the template. Rendered output of fragments between region 
+header and `{{@ end @}}` is memoized with optional TTL and key expression 
+evaluated against scope on each render.
 
-def findall(s: str, sub: str, ind: int=0):
-	"""
-	Find all ocurrencies for sub in s starting from ind
-	"""
-	
-	ind = s.find(sub, ind)
-	while ind != -1:
-		yield ind
-		ind = s.find(sub, ind + 1)
+Header accepts arguments `ttl` (constant lifetime in seconds or None), `key` 
+(expression), `max_entries`, `none_ok` and `wrap_scope` (constants).
+
+Defines block start
+
+Example:
+```
+{{@ ttl=60, key=user.locale @}}
+<aside>{{% render_expensive_sidebar(user.locale) %}}</aside>
+{{@ end @}}
+```
+"""
+CACHE_BLOCK_END   = '@}}'
+"""
+Cached region of the template. Rendered output of fragments between region 
+header and `{{@ end @}}` is memoized with optional TTL and key expression 
+evaluated against scope on each render.
+
+Defines block end
+
+Example:
+```
+{{@ ttl=60, key=user.locale @}}
+<aside>{{% render_expensive_sidebar(user.locale) %}}</aside>
+{{@ end @}}
+```
+"""
+
+# Content of cache block closing cached region
+CACHE_BLOCK_CLOSE = 'end'
+
+INCLUDE_BLOCK_START = '{{>'
+"""
+Include of another template file. Included file is parsed when template is 
+loaded and it's fragments are inserted instead of this block, so composed 
+template renders as single list of fragments.
+
+Path is resolved relative to directory of the including file, then in 
+`include_path` of the parser.
+
+Defines block start
+
+Example:
+```
+{{> partials/header.thtml <}}
+<main>{{% content %}}</main>
+{{> partials/footer.thtml <}}
+```
+"""
+INCLUDE_BLOCK_END   = '<}}'
+"""
+Include of another template file. Included file is parsed when template is 
+loaded and it's fragments are inserted instead of this block, so composed 
+template renders as single list of fragments.
+
+Defines block end
+
+Example:
+```
+{{> partials/header.thtml <}}
+<main>{{% content %}}</main>
+{{> partials/footer.thtml <}}
+```
+"""
+
+SECTION_BLOCK_START = '{{$'
+"""
+Named overridable section of the layout. Section content is closed with 
+`{{$ end $}}`. In layout, section defines default content. Template 
+extending the layout with `LAYOUT_BLOCK_START` replaces content of sections 
+with the same names.
+
+Defines block start
+
+Example:
+```
+<title>{{$ title $}}Default title{{$ end $}}</title>
+```
+"""
+SECTION_BLOCK_END   = '$}}'
+"""
+Named overridable section of the layout. Section content is closed with 
+`{{$ end $}}`.
+
+Defines block end
+
+Example:
+```
+<title>{{$ title $}}Default title{{$ end $}}</title>
+```
+"""
+
+# Content of section block closing section
+SECTION_BLOCK_CLOSE = 'end'
+
+LAYOUT_BLOCK_START = '{{^'
+"""
+Declares layout template extended by this template. Layout is parsed when 
+template is loaded and sections of this template replace sections of the 
+layout with the same names, so result is single list of fragments. Layout can 
+extend another layout.
+
+Code blocks of this template outside of sections are placed before the 
+layout, other content outside of sections is ignored.
+
+Path is resolved the same way as in `INCLUDE_BLOCK_START`.
+
+Defines block start
+
+Example:
+```
+{{^ layouts/base.thtml ^}}
+
+{{$ title $}}Profile of {{% user.name %}}{{$ end $}}
+{{$ content $}}
+<p>{{% user.bio %}}</p>
+{{$ end $}}
+```
+"""
+LAYOUT_BLOCK_END   = '^}}'
+"""
+Declares layout template extended by this template.
+
+Defines block end
+
+Example:
+```
+{{^ layouts/base.thtml ^}}
+```
+"""
+
+OFFLOAD_PREFIX = '&'
+"""
+Prefix of code block or expression that marks it for offloading into thread 
+pool during render. Code of the marked fragment is evaluated in executor with 
+`run_in_executor()`, so blocking calls do not freeze event loop. Marked code 
+can not contain `await`.
+
+Example:
+```
+{{!&
+time.sleep(1)
+!}}
+{{%& legacy_db.fetch_user(user_id).name %}}
+```
+"""
+
+RAW_PREFIX = '!'
+"""
+Prefix of expression that disables autoescaping of it's result, see 
+`TemplateParser` `autoescape` option. Can follow `OFFLOAD_PREFIX`.
+
+Example:
+```
+{{%! article.body_html %}}
+{{%&! legacy_renderer.render(article) %}}
+```
+"""
+
+
+# Tag ids of comment tags in tag tuple passed to compile_tag_pattern()
+COMMENT_START_ID = 8
+COMMENT_END_ID   = 9
+
+# Tag id of cached region tag in tag tuple passed to compile_tag_pattern()
+CACHE_START_ID   = 10
+
+# Tag id of include tag in tag tuple passed to compile_tag_pattern()
+INCLUDE_START_ID = 12
+
+# Tag ids of section and layout tags in tag tuple passed to compile_tag_pattern()
+SECTION_START_ID = 14
+LAYOUT_START_ID  = 16
 
 
-def classenum(l: list, clazz: int):
+@functools.lru_cache(maxsize=64)
+def compile_tag_pattern(tags: typing.Tuple[str, ...]) -> typing.Tuple[typing.Pattern, typing.Dict[str, typing.Tuple[int, ...]]]:
 	"""
-	zip(l, [clazz]*len(l))
+	Compile single alternation regex matching any of the given tags. Longer 
+	tags are matched first, so tag that is a prefix of another tag does not 
+	shadow it.
+	
+	Returns compiled pattern and dict mapping each tag literal to the tuple of 
+	it's ids in `tags`. Same literal may be used for multiple tags, for example 
+	when block start and block end are equal.
+	
+	Tags can be either str or bytes, bytes pattern scans bytes-like sources. 
+	Tags set to None are disabled and never matched.
 	"""
 	
-	return list(zip(l, [ clazz ] * len(l)))
+	roles = {}
+	for tag_id, tag in enumerate(tags):
+		if tag is None:
+			continue
+		
+		if not tag:
+			raise ValueError(f'Empty tag literal at index {tag_id}')
+		
+		roles[tag] = roles.get(tag, ()) + (tag_id,)
+	
+	separator = '|' if isinstance(next(iter(roles)), str) else b'|'
+	alternation = separator.join(re.escape(tag) for tag in sorted(roles, key=len, reverse=True))
+	return re.compile(alternation), roles
 
 
 def countsameleft(s: str, c: str):
@@ -290,385 +502,3176 @@ def autotablete(code: str):
 	return '\n'.join(lines)
 
 
-class TemplateFragment:
+class SlowFragmentWarning(RuntimeWarning):
 	"""
-	Represnts single fragment of the templste
+	Warning emitted when fragment runs on event loop longer than threshold set 
+	with `Template.set_slow_fragment_threshold()`
+	"""
+
+
+class LoopTimer:
+	"""
+	Awaitable wrapper of coroutine that measures time spent in coroutine steps. 
+	Time of awaiting futures is not counted, so result is the time coroutine 
+	occupied event loop.
 	"""
 	
-	def __init__(self):
-		pass
+	__slots__ = (
+		'coroutine',
+		'elapsed'
+	)
 	
-	def is_one_time(self) -> bool:
+	def __init__(self, coroutine: typing.Coroutine):
+		self.coroutine = coroutine
+		self.elapsed = 0.0
+	
+	def __await__(self):
+		send = self.coroutine.send
+		throw = self.coroutine.throw
+		
+		value = None
+		error = None
+		while True:
+			start = time.perf_counter()
+			try:
+				future = send(value) if error is None else throw(error)
+			except StopIteration as stop:
+				return stop.value
+			finally:
+				self.elapsed += time.perf_counter() - start
+			
+			try:
+				value = yield future
+				error = None
+			except GeneratorExit:
+				self.coroutine.close()
+				raise
+			except BaseException as exception:
+				value = None
+				error = exception
+
+
+def warn_slow_fragment(fragment: 'TemplateFragment', elapsed: float):
+	"""
+	Emit SlowFragmentWarning for the fragment if elapsed time exceeds it's 
+	threshold
+	"""
+	
+	if elapsed > fragment.slow_threshold:
+		warnings.warn(f'Fragment {get_fragment_name(fragment)} ran on event loop for {elapsed:.3f}s, consider marking it with {OFFLOAD_PREFIX!r} to offload into thread pool', SlowFragmentWarning, stacklevel=3)
+
+
+class FragmentProfile:
+	"""
+	Render statistics of single expression or block fragment collected in 
+	profiling mode, see `Template.set_profiling()`.
+	
+	Time is wall time from evaluation start to the result including awaiting. 
+	Output size is length of the string value of expression result.
+	"""
+	
+	__slots__ = (
+		'name',
+		'line_range',
+		'calls',
+		'total_time',
+		'max_time',
+		'output_size',
+		'callback'
+	)
+	
+	def __init__(self, name: str, line_range: typing.Tuple[int, int]=None, callback: typing.Callable[['FragmentProfile', float, int], None]=None):
 		"""
-		Returns True if this fragment is one-pass type and executed inside 
-		Template.init()
+		`name` defines name of the fragment, see `get_fragment_name()`.
+		
+		`line_range` defines tuple of first and last source lines of the 
+		fragment.
+		
+		`callback` is called with `(profile, elapsed, output_size)` after each 
+		evaluation of the fragment.
 		"""
 		
-		return False
+		self.name        = name
+		self.line_range  = line_range
+		self.callback    = callback
+		self.calls       = 0
+		self.total_time  = 0.0
+		self.max_time    = 0.0
+		self.output_size = 0
 	
-	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
+	def record(self, elapsed: float, value: typing.Any):
+		"""
+		Record single evaluation of the fragment
 		"""
-		Renders the given fragment inside given context with passed arguemnts.
 		
-		context is single for entire template and holds all values between 
-		.render() calls.
+		size = 0 if value is None else len(str(value))
 		
-		scope is unique dict per each call of .render().
+		self.calls += 1
+		self.total_time += elapsed
+		self.output_size += size
+		if elapsed > self.max_time:
+			self.max_time = elapsed
 		
-		Expected result of .render() call is string or coroutine returning 
-		string.
+		if self.callback is not None:
+			self.callback(self, elapsed, size)
+	
+	def reset(self):
+		"""
+		Reset collected statistics
 		"""
 		
-		return None
+		self.calls       = 0
+		self.total_time  = 0.0
+		self.max_time    = 0.0
+		self.output_size = 0
+	
+	def to_dict(self) -> typing.Dict[str, typing.Any]:
+		"""
+		Returns statistics as dict
+		"""
+		
+		return {
+			'fragment': self.name,
+			'lines': self.line_range,
+			'calls': self.calls,
+			'total_time': self.total_time,
+			'max_time': self.max_time,
+			'mean_time': self.total_time / self.calls if self.calls else 0.0,
+			'output_size': self.output_size
+		}
+	
+	def __repr__(self):
+		return f'FragmentProfile({self.to_dict()!r})'
 
 
-class StringTemplateFragment(TemplateFragment):
+class FragmentInstrumentation:
 	"""
-	Represents single template fragment containing plain string value
+	Offloading, event loop monitoring and profiling state of expression or 
+	block fragment. Created on first use, so fragments without 
+	instrumentation do not keep it's fields.
 	"""
 	
 	__slots__ = (
-		'value'
+		'executor',
+		'slow_threshold',
+		'profile'
 	)
 	
-	def __init__(self, value: str):
-		super().__init__()
-		self.value = value
-	
-	def is_one_time(self) -> bool:
-		return False
-	
-	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
-		return self.value
-	
-	def __str__(self):
-		return self.value
-	
-	def __repr__(self):
-		return self.value
+	def __init__(self):
+		# Executor of offloaded fragment, None means default executor of the loop
+		self.executor = None
+		
+		# Event loop time warning threshold, see Template.set_slow_fragment_threshold()
+		self.slow_threshold = None
+		
+		# Render statistics, see Template.set_profiling()
+		self.profile = None
 
 
-class ExpressionTemplateFragment(TemplateFragment):
+def get_instrumentation(fragment: 'TemplateFragment') -> FragmentInstrumentation:
 	"""
-	Represents single template fragment containing executable expression that 
-	supports eval(). Can contain both: one pass and multiple pass expressions
+	Returns instrumentation state of the fragment, creates it on first call
 	"""
 	
-	__slots__ = (
-		'evaluable',
-		'one_time',
-		'expression_start_tag',
-		'expression_end_tag',
-		'source_string'
-	)
+	if fragment.instrumentation is None:
+		fragment.instrumentation = FragmentInstrumentation()
 	
-	def __init__(self, source_string: str, one_time: bool = False,	expression_start_tag: str=None, 
-																	expression_end_tag: str=None,
-																	save_source: bool=True,
-																	_tag_index: int=None):
-		super().__init__()
-		file_name = '<ExpressionTemplateFragment>' if _tag_index is None else f'<ExpressionTemplateFragment_{_tag_index}>'
-		self.evaluable = compile(autotablete(source_string), file_name, 'eval', flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
-		self.one_time = one_time
-		self.expression_start_tag = expression_start_tag or (ONE_TIME_EXPRESSION_START if self.one_time else EXPRESSION_START)
-		self.expression_end_tag = expression_end_tag or (ONE_TIME_EXPRESSION_END if self.one_time else EXPRESSION_START)
-		self.source_string = source_string if save_source else None
+	return fragment.instrumentation
+
+
+async def await_instrumented(fragment: 'TemplateFragment', coroutine: typing.Coroutine, start: float, elapsed: float) -> typing.Any:
+	"""
+	Await coroutine returned by the instrumented fragment. Warns if total time 
+	it ran on event loop exceeds threshold of the fragment and records wall 
+	time into profile of the fragment.
+	"""
 	
-	def is_one_time(self) -> bool:
-		return self.one_time
+	if fragment.slow_threshold is None:
+		result = await coroutine
+	else:
+		timer = LoopTimer(coroutine)
+		try:
+			result = await timer
+		finally:
+			warn_slow_fragment(fragment, elapsed + timer.elapsed)
 	
-	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
-		result = eval(self.evaluable, context, scope)
-		
-		if asyncio.iscoroutine(result):
-			return await result
-		
-		return result
+	if fragment.profile is not None:
+		fragment.profile.record(time.perf_counter() - start, result)
 	
-	def __str__(self):
-		if self.source_string is None:
-			return f'{self.expression_start_tag}\n{dis.dis(self.evaluable)}\n{self.expression_end_tag}'
-		else:
-			return f'{self.expression_start_tag}\n{self.source_string}\n{self.expression_end_tag}'
+	return result
+
+
+async def evaluate_offloaded(fragment: 'TemplateFragment', code: types.CodeType, context: dict, scope: dict) -> typing.Any:
+	"""
+	Evaluate code of the fragment in it's executor
+	"""
 	
-	def __repr__(self):
-		if self.source_string is None:
-			return f'{self.expression_start_tag}\n{dis.dis(self.evaluable)}\n{self.expression_end_tag}'
-		else:
-			return f'{self.expression_start_tag}\n{self.source_string}\n{self.expression_end_tag}'
+	return await asyncio.get_running_loop().run_in_executor(fragment.executor, eval, code, context, scope)
 
 
-class BlockTemplateFragment(TemplateFragment):
+def evaluate_code(fragment: 'TemplateFragment', code: types.CodeType, context: dict, scope: dict) -> typing.Any:
 	"""
-	Represents single template fragment containing executable code block that 
-	supports exec()/eval(). Can contain both: one pass and multiple pass 
-	expressions
+	Evaluate code of the expression or block fragment with offloading into 
+	executor, event loop time monitoring or profiling enabled for this 
+	fragment
 	"""
 	
-	__slots__ = (
-		'executable',
-		'one_time',
-		'block_start_tag',
-		'block_end_tag',
-		'source_string'
-	)
+	start = time.perf_counter()
 	
-	def __init__(self, source_string: str, one_time: bool = False,	block_start_tag: str=None, 
-																	block_end_tag: str=None,
-																	save_source: bool=True,
-																	_tag_index: int=None):
-		super().__init__()
-		file_name = '<BlockTemplateFragment>' if _tag_index is None else f'<BlockTemplateFragment{_tag_index}>'
-		self.executable = compile(autotablete(source_string), file_name, 'exec', flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
-		self.one_time = one_time
-		self.block_start_tag = block_start_tag or (ONE_TIME_BLOCK_START if self.one_time else BLOCK_START)
-		self.block_end_tag = block_end_tag or (ONE_TIME_BLOCK_END if self.one_time else BLOCK_START)
-		self.source_string = source_string if save_source else None
+	if fragment.offload:
+		result = evaluate_offloaded(fragment, code, context, scope)
+	else:
+		result = eval(code, context, scope)
 	
-	def is_one_time(self) -> bool:
-		return self.one_time
+	elapsed = time.perf_counter() - start
 	
-	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
-		result = eval(self.executable, context, scope)
-		if asyncio.iscoroutine(result):
-			await result
-		return None
+	if asyncio.iscoroutine(result):
+		if fragment.offload and fragment.profile is None:
+			return result
 	
-	def __str__(self):
-		if self.source_string is None:
-			return f'{self.block_start_tag}\n{dis.dis(self.executable)}\n{self.block_end_tag}'
-		else:
-			return f'{self.block_start_tag}\n{self.source_string}\n{self.block_end_tag}'
+		return await_instrumented(fragment, result, start, elapsed)
 	
-	def __repr__(self):
-		if self.source_string is None:
-			return f'{self.block_start_tag}\n{dis.dis(self.executable)}\n{self.block_end_tag}'
-		else:
-			return f'{self.block_start_tag}\n{self.source_string}\n{self.block_end_tag}'
+	if fragment.slow_threshold is not None:
+		warn_slow_fragment(fragment, elapsed)
+	
+	if fragment.profile is not None:
+		fragment.profile.record(elapsed, result)
+	
+	return result
 
 
-class TemplateParser:
+def add_fragment_note(error: BaseException, fragment: 'TemplateFragment'):
+	"""
+	Add name of the fragment position to the exception raised by it's code, 
+	shown by traceback below the error. Interned code is shared between 
+	positions and has generic file name, see `CodeInternTable`. Only the 
+	innermost fragment is noted.
 	"""
-	Utility class that provides template parsing funtionality.
 	
-	Entire set of parameters for tag start and end literals match their 
-	description for defualt defined values.
+	add_note = getattr(error, 'add_note', None)
+	if add_note is None:
+		# Notes are available since python 3.11
+		return
 	
-	`strip_string` sets string trim() mode. If set to True, each part of string 
-	not in code blocks is stripped to remove excessive spaces.
+	for note in getattr(error, '__notes__', ()):
+		if note.startswith(FRAGMENT_NOTE_PREFIX):
+			return
 	
-	`save_source_string` enables parser to save source code inside TemplateFragment so 
-	it can be printed later.
+	add_note(FRAGMENT_NOTE_PREFIX + get_fragment_name(fragment))
+
+
+async def await_noted(fragment: 'TemplateFragment', coroutine: typing.Coroutine) -> typing.Any:
+	"""
+	Await coroutine returned by the fragment and note position of the 
+	fragment in exception raised by it, see `add_fragment_note()`.
+	"""
+	
+	try:
+		return await coroutine
+	except Exception as error:
+		add_fragment_note(error, fragment)
+		raise
+
+
+def close_coroutine(coroutine: typing.Coroutine):
+	"""
+	Close coroutine returned by the fragment that is never going to be 
+	awaited. Coroutines passed into not yet started wrapper, such as 
+	`await_noted()`, are closed too, otherwise they are reported as never 
+	awaited.
+	"""
+	
+	if isinstance(coroutine, types.CoroutineType) and inspect.getcoroutinestate(coroutine) == inspect.CORO_CREATED:
+		for value in coroutine.cr_frame.f_locals.values():
+			if asyncio.iscoroutine(value):
+				close_coroutine(value)
+	
+	coroutine.close()
+
+
+class CodeInternTable:
+	"""
+	Process-wide table of compiled code objects of expression and block
+	fragments, keyed by compile mode and source normalized with
+	`autotablete()`. Fragments with the same source share single code object
+	and source is compiled once.
+	
+	Code objects are referenced weakly, entry is dropped when no fragment
+	uses it. Interned code is compiled with generic file name, name of the
+	fragment position is kept by the fragment itself, see
+	`get_fragment_name()`, and is added as note to exceptions raised by it's 
+	code, see `add_fragment_note()`.
+	
+	Example:
+	```
+	yatplt.default_code_intern_table().get_stats()
+	```
+	"""
+	
+	__slots__ = (
+		'codes',
+		'lock',
+		'hits',
+		'misses'
+	)
+	
+	def __init__(self):
+		# (mode, normalized source) -> code object
+		self.codes = weakref.WeakValueDictionary()
+		
+		# Templates may be parsed from watcher or executor threads
+		self.lock = threading.Lock()
+		
+		self.hits   = 0
+		self.misses = 0
+	
+	def get_code(self, source_string: str, mode: str, file_name: str) -> types.CodeType:
+		"""
+		Returns interned code of the given source or compiles it with
+		`file_name` and interns the result.
+		
+		`mode` is `'eval'` for expressions and `'exec'` for blocks.
+		"""
+		
+		source_string = autotablete(source_string)
+		key = (mode, source_string)
+		
+		with self.lock:
+			code = self.codes.get(key)
+			if code is not None:
+				self.hits += 1
+				return code
+		
+		code = compile(source_string, file_name, mode, flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+		
+		with self.lock:
+			# Same source may be compiled concurrently, first stored wins
+			interned = self.codes.setdefault(key, code)
+			if interned is code:
+				self.misses += 1
+			else:
+				self.hits += 1
+		
+		return interned
+	
+	def intern(self, source_string: str, mode: str, code: types.CodeType) -> types.CodeType:
+		"""
+		Returns interned code of the given source or interns the given already
+		compiled code, for example loaded from parse cache.
+		"""
+		
+		key = (mode, autotablete(source_string))
+		
+		with self.lock:
+			interned = self.codes.setdefault(key, code)
+			if interned is code:
+				self.misses += 1
+			else:
+				self.hits += 1
+		
+		return interned
+	
+	def clear(self):
+		"""
+		Remove all entries and reset counters. Code objects already used by
+		fragments are not affected.
+		"""
+		
+		with self.lock:
+			self.codes.clear()
+			self.hits   = 0
+			self.misses = 0
+	
+	def get_stats(self) -> typing.Dict[str, int]:
+		"""
+		Returns dict with table statistics: amount of live interned code
+		objects and hit and miss counters. Miss means source was compiled or
+		registered for the first time.
+		"""
+		
+		with self.lock:
+			return {
+				'entries': len(self.codes),
+				'hits': self.hits,
+				'misses': self.misses
+			}
+	
+	def __len__(self):
+		return len(self.codes)
+
+
+# Shared instance returned by default_code_intern_table()
+_default_code_intern_table = CodeInternTable()
+
+
+def default_code_intern_table() -> CodeInternTable:
+	"""
+	Returns process-wide CodeInternTable used by fragments
+	"""
+	
+	return _default_code_intern_table
+
+
+# Prefix of exception note with name of the fragment raising it, see add_fragment_note()
+FRAGMENT_NOTE_PREFIX = 'In template fragment '
+
+# Opcodes of top-level code storing or deleting names in it's locals
+SCOPE_WRITE_OPCODES = bytes(dis.opmap[name] for name in ('STORE_NAME', 'DELETE_NAME', 'IMPORT_STAR', 'CALL_INTRINSIC_1') if name in dis.opmap)
+
+# Builtins giving code access to it's locals mapping or introspecting the 
+# calling frame, such code gives different result with fast locals
+SCOPE_ACCESS_NAMES = frozenset([ 'locals', 'vars', 'dir', 'exec', 'eval', 'breakpoint' ])
+
+
+def code_accesses_scope(code: types.CodeType) -> bool:
+	"""
+	Returns True if code may access it's locals mapping as a whole, for 
+	example with `locals()` or `dir()`. Result is conservative.
+	"""
+	
+	return not SCOPE_ACCESS_NAMES.isdisjoint(code.co_names)
+
+
+def code_writes_scope(code: types.CodeType) -> bool:
+	"""
+	Returns True if code evaluated with scope as locals may modify scope. 
+	Nested code objects are not checked, their names are not stored in 
+	locals of the outer code. Result is conservative.
+	"""
+	
+	if code_accesses_scope(code):
+		return True
+	
+	opcodes = code.co_code[::2]
+	for opcode in SCOPE_WRITE_OPCODES:
+		if opcode in opcodes:
+			return True
+	
+	return False
+
+
+class ScopeOverlay(dict):
+	"""
+	Copy-on-write view of scope used as locals of single fragment with 
+	`wrap_scope` enabled. Names written by fragment are stored in overlay 
+	itself, missing names are read from shared base scope, so base is never 
+	copied or modified. Cost of the overlay is proportional to amount of names 
+	written by fragment.
+	
+	Changes of base are visible through overlay. Iteration and `len()` cover 
+	only written names, fragments accessing scope as a whole receive copy 
+	instead, see `wrap_fragment_scope()`.
+	"""
+	
+	__slots__ = (
+		'base',
+		'deleted'
+	)
+	
+	def __init__(self, base: typing.Optional[typing.Mapping]=None):
+		super().__init__()
+		self.base = base if base is not None else {}
+		
+		# Names of base deleted through overlay, created on first delete
+		self.deleted = None
+	
+	def __missing__(self, key):
+		if self.deleted is not None and key in self.deleted:
+			raise KeyError(key)
+		
+		return self.base[key]
+	
+	def __delitem__(self, key):
+		if dict.__contains__(self, key):
+			dict.__delitem__(self, key)
+			if key not in self.base:
+				return
+		elif key not in self.base or (self.deleted is not None and key in self.deleted):
+			raise KeyError(key)
+		
+		if self.deleted is None:
+			self.deleted = set()
+		self.deleted.add(key)
+	
+	def __contains__(self, key):
+		if dict.__contains__(self, key):
+			return True
+		
+		return key in self.base and (self.deleted is None or key not in self.deleted)
+	
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+	
+	def __repr__(self):
+		return f'ScopeOverlay({dict.__repr__(self)}, base={self.base!r})'
+
+
+def wrap_fragment_scope(fragment: 'TemplateFragment', scope: typing.Optional[dict]) -> typing.Optional[dict]:
+	"""
+	Returns scope isolated for the given fragment with `wrap_scope` enabled. 
+	Fragments that do not write scope receive it as is, others receive 
+	ScopeOverlay over it. Fragments accessing scope as a whole receive copy 
+	of it, overlay does not list names of base.
+	"""
+	
+	if not fragment.writes_scope:
+		return scope
+	
+	if isinstance(fragment, ExpressionTemplateFragment) and code_accesses_scope(fragment.evaluable):
+		return dict(scope or {})
+	
+	if isinstance(fragment, BlockTemplateFragment) and code_accesses_scope(fragment.executable):
+		return dict(scope or {})
+	
+	return ScopeOverlay(scope)
+
+
+class SafeString(str):
+	"""
+	String marked as already escaped. Autoescaping inserts it as is. Any other 
+	object defining `__html__()` method is inserted as result of this method.
+	"""
+	
+	__slots__ = ()
+	
+	def __html__(self):
+		return self
+
+
+# Characters replaced by escape_html()
+HTML_SPECIAL_CHARACTERS = '&<>"\''
+
+
+def escape_html(value: typing.Any) -> str:
+	"""
+	Convert value to string and escape HTML special characters `&<>"'`. 
+	Strings without special characters are returned without copying. Objects 
+	defining `__html__()`, such as SafeString, are not escaped.
+	"""
+	
+	if type(value) is not str:
+		html = getattr(value, '__html__', None)
+		if html is not None:
+			return str(html())
+		
+		value = str(value)
+	
+	if '&' in value or '<' in value or '>' in value or '"' in value or "'" in value:
+		return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&#34;').replace("'", '&#39;')
+	
+	return value
+
+
+class SourceBuffer:
+	"""
+	Shared storage of code fragment sources of single template used in 
+	compact mode, see `compact_fragments()`.
+	
+	Sources of all code fragments are joined into single string and fragments 
+	keep only index of their span. Offsets and line ranges of spans are stored 
+	in arrays instead of per-fragment objects.
+	"""
+	
+	__slots__ = (
+		'source',
+		'offsets',
+		'lines'
+	)
+	
+	def __init__(self):
+		self.source  = ''
+		# Start and end offset of each span in source
+		self.offsets = array.array('I')
+		# First and last template line of each span, 0 if unknown
+		self.lines   = array.array('I')
+	
+	def get_source(self, index: int) -> str:
+		"""
+		Returns source of span with given index
+		"""
+		
+		return self.source[self.offsets[2 * index] : self.offsets[2 * index + 1]]
+	
+	def get_line_range(self, index: int) -> typing.Optional[typing.Tuple[int, int]]:
+		"""
+		Returns tuple of first and last template lines of span with given index
+		"""
+		
+		if self.lines[2 * index] == 0:
+			return None
+		
+		return self.lines[2 * index], self.lines[2 * index + 1]
+	
+	def __len__(self):
+		return len(self.offsets) // 2
+	
+	def __sizeof__(self):
+		return object.__sizeof__(self) + sys.getsizeof(self.source) + sys.getsizeof(self.offsets) + sys.getsizeof(self.lines)
+
+
+class TemplateFragment:
+	"""
+	Represnts single fragment of the templste
+	"""
+	
+	__slots__ = ()
+	
+	# True if rendering may modify scope, see wrap_fragment_scope()
+	writes_scope = True
+	
+	# True if rendered value is escaped, see escape_html()
+	escape = False
+	
+	def __init__(self):
+		pass
+	
+	def is_one_time(self) -> bool:
+		"""
+		Returns True if this fragment is one-pass type and executed inside 
+		Template.init()
+		"""
+		
+		return False
+	
+	def is_async(self) -> bool:
+		"""
+		Returns True if result of .evaluate() may require awaiting. Fragments 
+		that are not async can be rendered without event loop.
+		"""
+		
+		return True
+	
+	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
+		"""
+		Renders the given fragment inside given context with passed arguemnts.
+		
+		context is single for entire template and holds all values between 
+		.render() calls.
+		
+		scope is unique dict per each call of .render().
+		
+		Expected result of .render() call is string or coroutine returning 
+		string.
+		"""
+		
+		return None
+	
+	def evaluate(self, context: dict, scope: dict) -> typing.Any:
+		"""
+		Evaluates the given fragment without awaiting. Returns result of the 
+		fragment or coroutine if result requires awaiting. Used by render loops 
+		to skip coroutine creation for synchronous fragments.
+		"""
+		
+		return self.render(context, scope)
+
+
+class StringTemplateFragment(TemplateFragment):
+	"""
+	Represents single template fragment containing plain string value
+	"""
+	
+	__slots__ = (
+		'value',
+	)
+	
+	writes_scope = False
+	
+	def __init__(self, value: str):
+		super().__init__()
+		self.value = value
+	
+	def is_one_time(self) -> bool:
+		return False
+	
+	def is_async(self) -> bool:
+		return False
+	
+	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
+		return self.value
+	
+	def evaluate(self, context: dict, scope: dict) -> typing.Any:
+		return self.value
+	
+	def __str__(self):
+		return self.value
+	
+	def __repr__(self):
+		return self.value
+
+
+class MappedStringTemplateFragment(StringTemplateFragment):
+	"""
+	Represents plain string fragment of memory mapped template file stored as 
+	UTF-8 encoded bytes copied out of the mapping, see 
+	`TemplateParser.parse_file()`. Value is decoded on each access and is not 
+	kept in memory.
+	"""
+	
+	__slots__ = (
+		'buffer',
+	)
+	
+	def __init__(self, buffer: bytes):
+		TemplateFragment.__init__(self)
+		self.buffer = buffer
+	
+	@property
+	def value(self) -> str:
+		return str(self.buffer, 'utf-8')
+
+
+# Whitespace bytes removed by bytes.strip(), all of them are whitespace for str.strip()
+ASCII_WHITESPACE = frozenset(b' \t\n\r\x0b\x0c')
+
+# Minimal size of mapped string slice kept without decoding, smaller slices 
+# take less memory decoded than as memoryview
+MAPPED_STRING_MIN_SIZE = 256
+
+# Size of buffer chunk copied to count newlines, see count_newlines()
+NEWLINE_COUNT_CHUNK = 1024 * 1024
+
+
+def count_newlines(buffer: memoryview, start: int, end: int) -> int:
+	"""
+	Returns amount of newlines in range of the buffer. Range is copied by 
+	chunks, so large ranges are not copied at once.
+	"""
+	
+	count = 0
+	while start < end:
+		chunk_end = min(end, start + NEWLINE_COUNT_CHUNK)
+		count += bytes(buffer[start : chunk_end]).count(b'\n')
+		start = chunk_end
+	
+	return count
+
+
+def make_mapped_string_fragment(buffer: memoryview, strip_string: bool) -> typing.Optional[StringTemplateFragment]:
+	"""
+	Create string fragment for the UTF-8 encoded slice of memory mapped 
+	template. Same as StringTemplateFragment of decoded slice stripped if 
+	`strip_string` is set, but slice is not decoded. Returns None if decoded 
+	slice contains only whitespace.
+	
+	Slice with non-ASCII or control characters on the edges of the stripped 
+	range is decoded, because it may contain unicode whitespace. Slice 
+	shorter than `MAPPED_STRING_MIN_SIZE` is decoded too. Other slices are 
+	copied, so fragment does not reference the mapping.
+	"""
+	
+	start = 0
+	end = len(buffer)
+	while start < end and buffer[start] in ASCII_WHITESPACE:
+		start += 1
+	while end > start and buffer[end - 1] in ASCII_WHITESPACE:
+		end -= 1
+	
+	if start == end:
+		return None
+	
+	if len(buffer) < MAPPED_STRING_MIN_SIZE or buffer[start] >= 0x80 or buffer[end - 1] >= 0x80 or buffer[start] < 0x20 or buffer[end - 1] < 0x20:
+		substring = str(buffer, 'utf-8')
+		stripped = substring.strip()
+		if len(stripped) == 0:
+			return None
+		return StringTemplateFragment(stripped if strip_string else substring)
+	
+	return MappedStringTemplateFragment(bytes(buffer[start : end] if strip_string else buffer))
+
+
+class ExpressionTemplateFragment(TemplateFragment):
+	"""
+	Represents single template fragment containing executable expression that 
+	supports eval(). Can contain both: one pass and multiple pass expressions
+	"""
+	
+	__slots__ = (
+		'evaluable',
+		'one_time',
+		'expression_start_tag',
+		'expression_end_tag',
+		'source_string',
+		'has_await',
+		'offload',
+		'instrumentation',
+		'instrumented',
+		'line_range',
+		'source_buffer',
+		'source_index',
+		'position',
+		'writes_scope',
+		'escape'
+	)
+	
+	def __init__(self, source_string: str, one_time: bool = False,	expression_start_tag: str=None, 
+																	expression_end_tag: str=None,
+																	save_source: bool=True,
+																	offload: bool=False,
+																	line_range: typing.Tuple[int, int]=None,
+																	intern_code: bool=True,
+																	escape: bool=False,
+																	_tag_index: int=None,
+																	_evaluable: types.CodeType=None):
+		"""
+		`intern_code` enables sharing of compiled code with other fragments 
+		with the same source, see `CodeInternTable`.
+		
+		`escape` enables HTML escaping of the rendered value, see 
+		`escape_html()`.
+		"""
+		
+		super().__init__()
+		# Tag index or name of the position, see name
+		self.position = _tag_index
+		file_name = self.name
+		if _evaluable is None:
+			if intern_code:
+				_evaluable = _default_code_intern_table.get_code(source_string, 'eval', '<ExpressionTemplateFragment>')
+			else:
+				_evaluable = compile(autotablete(source_string), file_name, 'eval', flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+		elif intern_code:
+			if source_string is not None:
+				_evaluable = _default_code_intern_table.intern(source_string, 'eval', _evaluable)
+		elif _tag_index is not None and _evaluable.co_filename != file_name:
+			# Code reused from previous parse keeps name of it's new position
+			_evaluable = _evaluable.replace(co_filename=file_name)
+		self.evaluable = _evaluable
+		self.has_await = bool(self.evaluable.co_flags & inspect.CO_COROUTINE)
+		self.writes_scope = code_writes_scope(self.evaluable)
+		self.escape = escape
+		
+		# Evaluated in executor, see FragmentInstrumentation
+		self.offload = offload
+		if self.offload and self.has_await:
+			raise RuntimeError(f'Offloaded fragment {self.name} can not contain await')
+		
+		# Created on first use, see FragmentInstrumentation
+		self.instrumentation = None
+		
+		# True if evaluation requires evaluate_code()
+		self.instrumented = self.offload
+		
+		# First and last line of the fragment in template source
+		self.line_range = line_range
+		
+		# Shared source storage of compact mode, see compact_fragments()
+		self.source_buffer = None
+		self.source_index = None
+		
+		self.one_time = one_time
+		self.expression_start_tag = expression_start_tag or (ONE_TIME_EXPRESSION_START if self.one_time else EXPRESSION_START)
+		self.expression_end_tag = expression_end_tag or (ONE_TIME_EXPRESSION_END if self.one_time else EXPRESSION_START)
+		self.source_string = source_string if save_source else None
+	
+	def is_one_time(self) -> bool:
+		return self.one_time
+	
+	def is_async(self) -> bool:
+		return self.has_await or self.offload
+	
+	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
+		result = self.evaluate(context, scope)
+		
+		if asyncio.iscoroutine(result):
+			return await result
+		
+		return result
+	
+	def get_source(self) -> typing.Optional[str]:
+		"""
+		Returns source of the fragment or None if source was not saved
+		"""
+		
+		if self.source_buffer is not None:
+			return self.source_buffer.get_source(self.source_index)
+		
+		return self.source_string
+	
+	def get_line_range(self) -> typing.Optional[typing.Tuple[int, int]]:
+		"""
+		Returns tuple of first and last template lines of the fragment or None
+		"""
+		
+		if self.source_buffer is not None:
+			return self.source_buffer.get_line_range(self.source_index)
+		
+		return self.line_range
+	
+	def update_instrumented(self):
+		"""
+		Update instrumentation flag after change of offloading, monitoring or 
+		profiling state
+		"""
+		
+		self.instrumented = self.offload or self.slow_threshold is not None or self.profile is not None
+	
+	@property
+	def name(self) -> str:
+		"""
+		Name of the fragment position, interned code is shared between 
+		positions. Generated from tag index unless set explicitly.
+		"""
+		
+		if self.position is None:
+			return '<ExpressionTemplateFragment>'
+		
+		if self.position.__class__ is str:
+			return self.position
+		
+		return f'<ExpressionTemplateFragment_{self.position}>'
+	
+	@name.setter
+	def name(self, name: str):
+		self.position = name
+	
+	@property
+	def executor(self) -> typing.Optional[concurrent.futures.Executor]:
+		return None if self.instrumentation is None else self.instrumentation.executor
+	
+	@executor.setter
+	def executor(self, executor: typing.Optional[concurrent.futures.Executor]):
+		get_instrumentation(self).executor = executor
+	
+	@property
+	def slow_threshold(self) -> typing.Optional[float]:
+		return None if self.instrumentation is None else self.instrumentation.slow_threshold
+	
+	@slow_threshold.setter
+	def slow_threshold(self, slow_threshold: typing.Optional[float]):
+		get_instrumentation(self).slow_threshold = slow_threshold
+	
+	@property
+	def profile(self) -> typing.Optional[FragmentProfile]:
+		return None if self.instrumentation is None else self.instrumentation.profile
+	
+	@profile.setter
+	def profile(self, profile: typing.Optional[FragmentProfile]):
+		get_instrumentation(self).profile = profile
+	
+	def evaluate(self, context: dict, scope: dict) -> typing.Any:
+		try:
+			if self.instrumented:
+				result = evaluate_code(self, self.evaluable, context, scope)
+			else:
+				result = eval(self.evaluable, context, scope)
+		except Exception as error:
+			add_fragment_note(error, self)
+			raise
+		
+		if self.has_await or self.offload:
+			return await_noted(self, result)
+		
+		return result
+	
+	def __str__(self):
+		source_string = self.get_source()
+		if source_string is None:
+			return f'{self.expression_start_tag}\n{dis.dis(self.evaluable)}\n{self.expression_end_tag}'
+		else:
+			return f'{self.expression_start_tag}\n{source_string}\n{self.expression_end_tag}'
+	
+	def __repr__(self):
+		source_string = self.get_source()
+		if source_string is None:
+			return f'{self.expression_start_tag}\n{dis.dis(self.evaluable)}\n{self.expression_end_tag}'
+		else:
+			return f'{self.expression_start_tag}\n{source_string}\n{self.expression_end_tag}'
+
+
+class BlockTemplateFragment(TemplateFragment):
+	"""
+	Represents single template fragment containing executable code block that 
+	supports exec()/eval(). Can contain both: one pass and multiple pass 
+	expressions
+	"""
+	
+	__slots__ = (
+		'executable',
+		'one_time',
+		'block_start_tag',
+		'block_end_tag',
+		'source_string',
+		'has_await',
+		'offload',
+		'instrumentation',
+		'instrumented',
+		'line_range',
+		'source_buffer',
+		'source_index',
+		'position',
+		'writes_scope'
+	)
+	
+	def __init__(self, source_string: str, one_time: bool = False,	block_start_tag: str=None, 
+																	block_end_tag: str=None,
+																	save_source: bool=True,
+																	offload: bool=False,
+																	line_range: typing.Tuple[int, int]=None,
+																	intern_code: bool=True,
+																	_tag_index: int=None,
+																	_executable: types.CodeType=None):
+		"""
+		`intern_code` enables sharing of compiled code with other fragments 
+		with the same source, see `CodeInternTable`.
+		"""
+		
+		super().__init__()
+		# Tag index or name of the position, see name
+		self.position = _tag_index
+		file_name = self.name
+		if _executable is None:
+			if intern_code:
+				_executable = _default_code_intern_table.get_code(source_string, 'exec', '<BlockTemplateFragment>')
+			else:
+				_executable = compile(autotablete(source_string), file_name, 'exec', flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+		elif intern_code:
+			if source_string is not None:
+				_executable = _default_code_intern_table.intern(source_string, 'exec', _executable)
+		elif _tag_index is not None and _executable.co_filename != file_name:
+			# Code reused from previous parse keeps name of it's new position
+			_executable = _executable.replace(co_filename=file_name)
+		self.executable = _executable
+		self.has_await = bool(self.executable.co_flags & inspect.CO_COROUTINE)
+		self.writes_scope = code_writes_scope(self.executable)
+		
+		# Evaluated in executor, see FragmentInstrumentation
+		self.offload = offload
+		if self.offload and self.has_await:
+			raise RuntimeError(f'Offloaded fragment {self.name} can not contain await')
+		
+		# Created on first use, see FragmentInstrumentation
+		self.instrumentation = None
+		
+		# True if evaluation requires evaluate_code()
+		self.instrumented = self.offload
+		
+		# First and last line of the fragment in template source
+		self.line_range = line_range
+		
+		# Shared source storage of compact mode, see compact_fragments()
+		self.source_buffer = None
+		self.source_index = None
+		
+		self.one_time = one_time
+		self.block_start_tag = block_start_tag or (ONE_TIME_BLOCK_START if self.one_time else BLOCK_START)
+		self.block_end_tag = block_end_tag or (ONE_TIME_BLOCK_END if self.one_time else BLOCK_START)
+		self.source_string = source_string if save_source else None
+	
+	def is_one_time(self) -> bool:
+		return self.one_time
+	
+	def is_async(self) -> bool:
+		return self.has_await or self.offload
+	
+	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
+		result = self.evaluate(context, scope)
+		if asyncio.iscoroutine(result):
+			await result
+		return None
+	
+	def get_source(self) -> typing.Optional[str]:
+		"""
+		Returns source of the fragment or None if source was not saved
+		"""
+		
+		if self.source_buffer is not None:
+			return self.source_buffer.get_source(self.source_index)
+		
+		return self.source_string
+	
+	def get_line_range(self) -> typing.Optional[typing.Tuple[int, int]]:
+		"""
+		Returns tuple of first and last template lines of the fragment or None
+		"""
+		
+		if self.source_buffer is not None:
+			return self.source_buffer.get_line_range(self.source_index)
+		
+		return self.line_range
+	
+	def update_instrumented(self):
+		"""
+		Update instrumentation flag after change of offloading, monitoring or 
+		profiling state
+		"""
+		
+		self.instrumented = self.offload or self.slow_threshold is not None or self.profile is not None
+	
+	@property
+	def name(self) -> str:
+		"""
+		Name of the fragment position, interned code is shared between 
+		positions. Generated from tag index unless set explicitly.
+		"""
+		
+		if self.position is None:
+			return '<BlockTemplateFragment>'
+		
+		if self.position.__class__ is str:
+			return self.position
+		
+		return f'<BlockTemplateFragment{self.position}>'
+	
+	@name.setter
+	def name(self, name: str):
+		self.position = name
+	
+	@property
+	def executor(self) -> typing.Optional[concurrent.futures.Executor]:
+		return None if self.instrumentation is None else self.instrumentation.executor
+	
+	@executor.setter
+	def executor(self, executor: typing.Optional[concurrent.futures.Executor]):
+		get_instrumentation(self).executor = executor
+	
+	@property
+	def slow_threshold(self) -> typing.Optional[float]:
+		return None if self.instrumentation is None else self.instrumentation.slow_threshold
+	
+	@slow_threshold.setter
+	def slow_threshold(self, slow_threshold: typing.Optional[float]):
+		get_instrumentation(self).slow_threshold = slow_threshold
+	
+	@property
+	def profile(self) -> typing.Optional[FragmentProfile]:
+		return None if self.instrumentation is None else self.instrumentation.profile
+	
+	@profile.setter
+	def profile(self, profile: typing.Optional[FragmentProfile]):
+		get_instrumentation(self).profile = profile
+	
+	def evaluate(self, context: dict, scope: dict) -> typing.Any:
+		try:
+			if self.instrumented:
+				result = evaluate_code(self, self.executable, context, scope)
+			else:
+				result = eval(self.executable, context, scope)
+		except Exception as error:
+			add_fragment_note(error, self)
+			raise
+		
+		if self.has_await or self.offload:
+			return await_noted(self, result)
+		
+		return result
+	
+	def __str__(self):
+		source_string = self.get_source()
+		if source_string is None:
+			return f'{self.block_start_tag}\n{dis.dis(self.executable)}\n{self.block_end_tag}'
+		else:
+			return f'{self.block_start_tag}\n{source_string}\n{self.block_end_tag}'
+	
+	def __repr__(self):
+		source_string = self.get_source()
+		if source_string is None:
+			return f'{self.block_start_tag}\n{dis.dis(self.executable)}\n{self.block_end_tag}'
+		else:
+			return f'{self.block_start_tag}\n{source_string}\n{self.block_end_tag}'
+
+
+class CachedRegionTemplateFragment(TemplateFragment):
+	"""
+	Represents cached region of the template containing list of fragments. 
+	Rendered output of the region is memoized per key with optional TTL. 
+	Cache is bounded and shared by all renders of the template containing 
+	the region.
+	
+	Region is rendered with it's own `none_ok` and `wrap_scope` options and 
+	strips fragment output, result of the region is handled as result of 
+	expression by the template.
+	"""
+	
+	__slots__ = (
+		'fragments',
+		'ttl',
+		'key',
+		'max_entries',
+		'none_ok',
+		'wrap_scope',
+		'has_async',
+		'cache',
+		'region_start_tag',
+		'region_end_tag',
+		'source_string'
+	)
+	
+	def __init__(self, source_string: str, fragments: typing.List[TemplateFragment], region_start_tag: str=None,
+																						region_end_tag: str=None,
+																						save_source: bool=True,
+																						_tag_index: int=None):
+		"""
+		`source_string` defines region header, see `CACHE_BLOCK_START`.
+		
+		`fragments` defines fragments of the region. One-time fragments are 
+		not allowed.
+		"""
+		
+		super().__init__()
+		
+		for fragment in fragments:
+			if fragment.is_one_time():
+				raise RuntimeError('One-time fragments are not allowed inside cached region')
+		
+		file_name = '<CachedRegionTemplateFragment>' if _tag_index is None else f'<CachedRegionTemplateFragment_{_tag_index}>'
+		arguments = parse_region_header(source_string, file_name)
+		
+		self.fragments        = optimize_fragments(fragments)[0]
+		self.ttl              = arguments.get('ttl')
+		self.key              = arguments.get('key')
+		self.max_entries      = arguments.get('max_entries', 128)
+		self.none_ok          = arguments.get('none_ok', False)
+		self.wrap_scope       = arguments.get('wrap_scope', False)
+		self.has_async        = any(fragment.is_async() for fragment in self.fragments)
+		self.region_start_tag = region_start_tag or CACHE_BLOCK_START
+		self.region_end_tag   = region_end_tag or CACHE_BLOCK_END
+		self.source_string    = source_string if save_source else None
+		
+		# key -> (expiration time, result) in LRU order
+		self.cache = collections.OrderedDict()
+	
+	def is_one_time(self) -> bool:
+		return False
+	
+	def is_async(self) -> bool:
+		return self.has_async
+	
+	def get_key(self, context: dict, scope: dict) -> typing.Hashable:
+		"""
+		Evaluate key expression of the region
+		"""
+		
+		if self.key is None:
+			return None
+		
+		return make_hashable(eval(self.key, context, scope))
+	
+	def get_cached(self, key: typing.Hashable) -> typing.Optional[str]:
+		"""
+		Returns cached result for the key or None
+		"""
+		
+		entry = self.cache.get(key)
+		if entry is None:
+			return None
+		
+		if entry[0] is not None and entry[0] <= time.monotonic():
+			del self.cache[key]
+			return None
+		
+		self.cache.move_to_end(key)
+		return entry[1]
+	
+	def put(self, key: typing.Hashable, result: str):
+		"""
+		Store result and evict least recently used results
+		"""
+		
+		self.cache[key] = (time.monotonic() + self.ttl if self.ttl is not None else None, result)
+		self.cache.move_to_end(key)
+		
+		while len(self.cache) > self.max_entries:
+			self.cache.popitem(last=False)
+	
+	def clear(self):
+		"""
+		Remove all cached results of the region
+		"""
+		
+		self.cache.clear()
+	
+	async def render(self, context: dict, scope: dict) -> typing.Union[str, typing.Awaitable[str]]:
+		result = self.evaluate(context, scope)
+		if asyncio.iscoroutine(result):
+			return await result
+		return result
+	
+	def evaluate(self, context: dict, scope: dict) -> typing.Any:
+		key = self.get_key(context, scope)
+		
+		result = self.get_cached(key)
+		if result is not None:
+			return result
+		
+		if self.has_async:
+			return self.render_fragments(key, context, scope)
+		
+		result = []
+		for fragment in self.fragments:
+			value = fragment.evaluate(context, (scope if not self.wrap_scope else wrap_fragment_scope(fragment, scope)))
+			if asyncio.iscoroutine(value):
+				close_coroutine(value)
+				raise RuntimeError(f'Expression returned coroutine at {get_fragment_name(fragment)}, use async render')
+			
+			value = format_fragment_value(fragment, value, True, self.none_ok)
+			if value is not None:
+				result.append(value)
+		
+		result = ''.join(result)
+		self.put(key, result)
+		return result
+	
+	async def render_fragments(self, key: typing.Hashable, context: dict, scope: dict) -> str:
+		"""
+		Render fragments of the region and store result with given key
+		"""
+		
+		result = []
+		for fragment in self.fragments:
+			value = fragment.evaluate(context, (scope if not self.wrap_scope else wrap_fragment_scope(fragment, scope)))
+			if asyncio.iscoroutine(value):
+				value = await value
+			
+			value = format_fragment_value(fragment, value, True, self.none_ok)
+			if value is not None:
+				result.append(value)
+		
+		result = ''.join(result)
+		self.put(key, result)
+		return result
+	
+	def __str__(self):
+		header = self.source_string if self.source_string is not None else ''
+		inner = '\n'.join([ str(f) for f in self.fragments ])
+		return f'{self.region_start_tag}{header}{self.region_end_tag}\n{inner}\n{self.region_start_tag} {CACHE_BLOCK_CLOSE} {self.region_end_tag}'
+	
+	def __repr__(self):
+		return self.__str__()
+
+
+class SectionTemplateFragment(TemplateFragment):
+	"""
+	Placeholder of named section of the layout used during parsing. Sections 
+	are overridden by templates extending the layout and replaced with their 
+	fragments before parser returns, see `flatten_sections()`.
+	"""
+	
+	__slots__ = (
+		'name',
+		'fragments'
+	)
+	
+	def __init__(self, name: str, fragments: typing.List[TemplateFragment]):
+		super().__init__()
+		self.name      = name
+		self.fragments = fragments
+	
+	def __str__(self):
+		inner = '\n'.join([ str(f) for f in self.fragments ])
+		return f'{SECTION_BLOCK_START} {self.name} {SECTION_BLOCK_END}\n{inner}\n{SECTION_BLOCK_START} {SECTION_BLOCK_CLOSE} {SECTION_BLOCK_END}'
+	
+	def __repr__(self):
+		return self.__str__()
+
+
+def parse_region_header(source_string: str, file_name: str) -> typing.Dict[str, typing.Any]:
+	"""
+	Parse header of cached region. Header has syntax of call arguments:
+	`ttl, key` or `ttl=60, key=expression, max_entries=128, none_ok=False, 
+	wrap_scope=False`. All arguments except `key` should be constants.
+	
+	Returns dict of arguments with `key` compiled into code object.
+	"""
+	
+	header = autotablete(source_string).strip()
+	
+	try:
+		call = ast.parse(f'_({header})', file_name, 'eval').body
+	except SyntaxError as e:
+		raise SyntaxError(f'Invalid cached region header in {file_name}: {header}') from e
+	
+	names = [ 'ttl', 'key' ]
+	if len(call.args) > len(names):
+		raise SyntaxError(f'Too many positional arguments of cached region in {file_name}')
+	
+	nodes = dict(zip(names, call.args))
+	for keyword in call.keywords:
+		if keyword.arg not in ('ttl', 'key', 'max_entries', 'none_ok', 'wrap_scope') or keyword.arg in nodes:
+			raise SyntaxError(f'Unexpected argument {keyword.arg} of cached region in {file_name}')
+		
+		nodes[keyword.arg] = keyword.value
+	
+	arguments = {}
+	for name, node in nodes.items():
+		if name == 'key':
+			arguments[name] = compile(ast.fix_missing_locations(ast.Expression(node)), file_name, 'eval')
+			continue
+		
+		try:
+			arguments[name] = ast.literal_eval(node)
+		except ValueError as e:
+			raise SyntaxError(f'Argument {name} of cached region in {file_name} should be constant') from e
+	
+	return arguments
+
+
+# Version of the parse cache file format, changed on incompatible changes
+CACHE_FORMAT_VERSION = 7
+
+# Parse cache file suffix
+CACHE_FILE_SUFFIX = '.ytc'
+
+# Parse cache file magic
+CACHE_MAGIC = b'YTPLTC'
+
+# Length of serialized dependencies following cache file magic
+CACHE_HEADER = struct.Struct('<I')
+
+
+def file_digest(filename: str) -> typing.Optional[str]:
+	"""
+	Returns sha256 digest of file content or None if file can not be read
+	"""
+	
+	try:
+		with open(filename, 'rb') as file:
+			return hashlib.sha256(file.read()).hexdigest()
+	except OSError:
+		return None
+
+
+def dump_fragments(fragments: typing.List[TemplateFragment]) -> typing.Optional[bytes]:
+	"""
+	Serialize list of parsed fragments with marshal. Code objects are stored 
+	as is, so loading does not require compilation.
+	
+	Returns None if list contains fragment of unsupported type.
+	"""
+	
+	layout = []
+	for fragment in fragments:
+		if type(fragment) is StringTemplateFragment or type(fragment) is MappedStringTemplateFragment:
+			layout.append(('s', fragment.value))
+		elif type(fragment) is ExpressionTemplateFragment:
+			layout.append(('e', fragment.one_time, fragment.expression_start_tag, fragment.expression_end_tag, fragment.get_source(), fragment.evaluable, fragment.offload, fragment.get_line_range(), fragment.position, fragment.escape))
+		elif type(fragment) is BlockTemplateFragment:
+			layout.append(('b', fragment.one_time, fragment.block_start_tag, fragment.block_end_tag, fragment.get_source(), fragment.executable, fragment.offload, fragment.get_line_range(), fragment.position))
+		else:
+			return None
+	
+	return marshal.dumps(tuple(layout))
+
+
+def load_fragments(data: bytes, intern_code: bool=True) -> typing.List[TemplateFragment]:
+	"""
+	Deserialize list of fragments produced by `dump_fragments()`. If 
+	`intern_code` is set, loaded code is interned, see `CodeInternTable`.
+	"""
+	
+	fragments = []
+	for entry in marshal.loads(data):
+		if entry[0] == 's':
+			fragments.append(StringTemplateFragment(entry[1]))
+		elif entry[0] == 'e':
+			fragments.append(ExpressionTemplateFragment(entry[4], one_time=entry[1], expression_start_tag=entry[2], expression_end_tag=entry[3], save_source=entry[4] is not None, offload=entry[6], line_range=entry[7], intern_code=intern_code, escape=entry[9], _tag_index=entry[8], _evaluable=entry[5]))
+		elif entry[0] == 'b':
+			fragments.append(BlockTemplateFragment(entry[4], one_time=entry[1], block_start_tag=entry[2], block_end_tag=entry[3], save_source=entry[4] is not None, offload=entry[6], line_range=entry[7], intern_code=intern_code, _tag_index=entry[8], _executable=entry[5]))
+		else:
+			raise ValueError(f'Unexpected fragment type {entry[0]!r}')
+	
+	return fragments
+
+
+def load_fragments_cache(cache_file: str, intern_code: bool=True, dependencies: typing.Dict[str, str]=None) -> typing.Optional[typing.List[TemplateFragment]]:
+	"""
+	Load fragments from parse cache file. Returns None if file does not exist, 
+	can not be loaded or any of included files changed since it was stored.
+	
+	`dependencies` is updated with included files of the loaded template, see 
+	`TemplateParser.parse()`.
+	"""
+	
+	try:
+		with open(cache_file, 'rb') as file:
+			data = file.read()
+	except OSError:
+		return None
+	
+	if not data.startswith(CACHE_MAGIC):
+		return None
+	
+	try:
+		offset = len(CACHE_MAGIC) + CACHE_HEADER.size
+		size, = CACHE_HEADER.unpack_from(data, len(CACHE_MAGIC))
+		included = marshal.loads(data[offset : offset + size])
+		
+		for filename, digest in included:
+			if file_digest(filename) != digest:
+				return None
+		
+		fragments = load_fragments(data[offset + size:], intern_code)
+	except (ValueError, EOFError, TypeError, IndexError, struct.error):
+		return None
+	
+	if dependencies is not None:
+		dependencies.update(included)
+	
+	return fragments
+
+
+def store_fragments_cache(cache_file: str, fragments: typing.List[TemplateFragment], dependencies: typing.Dict[str, str]=None) -> bool:
+	"""
+	Store fragments into parse cache file. File is written atomically, so 
+	concurrent processes never read partially written file.
+	
+	`dependencies` defines map of included file to digest of it's content, 
+	entry is not loaded after any of them changes.
+	
+	Returns False if fragments can not be stored.
+	"""
+	
+	data = dump_fragments(fragments)
+	if data is None:
+		return False
+	
+	included = marshal.dumps(tuple(sorted((dependencies or {}).items())))
+	
+	cache_dir = os.path.dirname(cache_file)
+	try:
+		os.makedirs(cache_dir, exist_ok=True)
+		
+		fd, temp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as file:
+				file.write(CACHE_MAGIC)
+				file.write(CACHE_HEADER.pack(len(included)))
+				file.write(included)
+				file.write(data)
+			os.replace(temp_file, cache_file)
+		except BaseException:
+			os.unlink(temp_file)
+			raise
+	except OSError:
+		return False
+	
+	return True
+
+
+class TemplateParser:
+	"""
+	Utility class that provides template parsing funtionality.
+	
+	Entire set of parameters for tag start and end literals match their 
+	description for defualt defined values.
+	
+	`strip_string` sets string trim() mode. If set to True, each part of string 
+	not in code blocks is stripped to remove excessive spaces.
+	
+	`save_source_string` enables parser to save source code inside TemplateFragment so 
+	it can be printed later.
+	
+	`cache_block_start` and `cache_block_end` define tags of cached region 
+	header, see `CACHE_BLOCK_START`. Cached regions are disabled by default, 
+	so `{{@` is plain text, set `cache_block_start` to `CACHE_BLOCK_START` to 
+	enable them. None or empty `cache_block_start` disables regions.
+	
+	`include_block_start` and `include_block_end` define tags of include, see 
+	`INCLUDE_BLOCK_START`. Includes are disabled by default, so `{{>` is plain 
+	text, set `include_block_start` to `INCLUDE_BLOCK_START` to enable them. 
+	None or empty `include_block_start` disables includes.
+	
+	`include_path` defines list of directories to search included files in 
+	after directory of the including file.
+	
+	`section_block_start`, `section_block_end`, `layout_block_start` and 
+	`layout_block_end` define tags of template inheritance, see 
+	`SECTION_BLOCK_START` and `LAYOUT_BLOCK_START`. Sections and layouts are 
+	disabled by default, so `{{$` and `{{^` are plain text, set 
+	`section_block_start` and `layout_block_start` to enable them. None or 
+	empty start tag disables sections or layouts.
+	
+	`offload_prefix` defines prefix of code blocks and expressions offloaded 
+	into thread pool, see `OFFLOAD_PREFIX`. Set to None to disable.
+	
+	`autoescape` enables HTML escaping of expression results, see 
+	`escape_html()`. `raw_prefix` defines prefix of expressions excluded from 
+	escaping, see `RAW_PREFIX`. Static text is never escaped.
+	
+	`compact` enables compact memory mode: sources of code fragments are 
+	stored in single buffer shared by fragments of the template instead of 
+	separate strings, see `compact_fragments()`.
+	
+	`intern_code` enables process-wide sharing of compiled code of fragments 
+	with the same source, see `CodeInternTable`.
+	
+	`cache_dir` enables persistent cache of parsed templates, similar to 
+	`__pycache__`. Parsed fragment layout and compiled code objects are stored 
+	in this directory keyed by source hash, parser configuration and python 
+	version, so next parse of the same source skips compilation.
+	"""
+	
+	__slots__ = (
+		'one_time_block_start',
+		'one_time_block_end',
+		'one_time_expression_start',
+		'one_time_expression_end',
+		'comment_block_start',
+		'comment_block_end',
+		'block_start',
+		'block_end',
+		'expression_start',
+		'expression_end',
+		'cache_block_start',
+		'cache_block_end',
+		'include_block_start',
+		'include_block_end',
+		'include_path',
+		'section_block_start',
+		'section_block_end',
+		'layout_block_start',
+		'layout_block_end',
+		'offload_prefix',
+		'autoescape',
+		'raw_prefix',
+		'save_source_string',
+		'strip_string',
+		'compact',
+		'intern_code',
+		'cache_dir'
+	)
+	
+	def __init__(self, one_time_block_start: str=ONE_TIME_BLOCK_START, 
+						one_time_block_end: str=ONE_TIME_BLOCK_END,
+						one_time_expression_start: str=ONE_TIME_EXPRESSION_START,
+						one_time_expression_end: str=ONE_TIME_EXPRESSION_END,
+						comment_block_start: str=COMMENT_BLOCK_START,
+						comment_block_end: str=COMMENT_BLOCK_END,
+						block_start: str=BLOCK_START,
+						block_end: str=BLOCK_END,
+						expression_start: str=EXPRESSION_START,
+						expression_end: str=EXPRESSION_END,
+						cache_block_start: str=None,
+						cache_block_end: str=CACHE_BLOCK_END,
+						include_block_start: str=None,
+						include_block_end: str=INCLUDE_BLOCK_END,
+						include_path: typing.List[str]=None,
+						section_block_start: str=None,
+						section_block_end: str=SECTION_BLOCK_END,
+						layout_block_start: str=None,
+						layout_block_end: str=LAYOUT_BLOCK_END,
+						offload_prefix: str=OFFLOAD_PREFIX,
+						autoescape: bool=False,
+						raw_prefix: str=RAW_PREFIX,
+						strip_string: bool=True,
+						save_source_string: bool=True,
+						compact: bool=False,
+						intern_code: bool=True,
+						cache_dir: str=None):
+		
+		self.one_time_block_start      = one_time_block_start     
+		self.one_time_block_end        = one_time_block_end       
+		self.one_time_expression_start = one_time_expression_start
+		self.one_time_expression_end   = one_time_expression_end  
+		self.comment_block_start       = comment_block_start      
+		self.comment_block_end         = comment_block_end        
+		self.block_start               = block_start              
+		self.block_end                 = block_end                
+		self.expression_start          = expression_start         
+		self.expression_end            = expression_end           
+		self.cache_block_start         = cache_block_start or None
+		self.cache_block_end           = cache_block_end
+		self.include_block_start       = include_block_start or None
+		self.include_block_end         = include_block_end
+		self.include_path              = list(include_path or [])
+		self.section_block_start       = section_block_start or None
+		self.section_block_end         = section_block_end
+		self.layout_block_start        = layout_block_start or None
+		self.layout_block_end          = layout_block_end
+		self.offload_prefix            = offload_prefix
+		self.autoescape                = autoescape
+		self.raw_prefix                = raw_prefix
+		
+		self.save_source_string      = save_source_string
+		self.strip_string            = strip_string
+		self.compact                 = compact
+		self.intern_code             = intern_code
+		self.cache_dir               = cache_dir
+	
+	def get_cache_key(self, source: str, filename: str=None) -> str:
+		"""
+		Returns key of the given source in parse cache. Key depends on source, 
+		parser configuration and python version. Key of source containing 
+		includes or layout also depends on directory of `filename`, because 
+		included files are resolved relative to it.
+		
+		`source` can be either str or UTF-8 encoded mmap.
+		"""
+		
+		# Disabled tags are None
+		tags = [ tag for tag in (self.include_block_start, self.layout_block_start) if tag ]
+		
+		if isinstance(source, str):
+			has_includes = any(tag in source for tag in tags)
+			source = source.encode('utf-8', 'surrogatepass')
+		else:
+			has_includes = any(source.find(tag.encode('utf-8')) != -1 for tag in tags)
+		
+		directory = None
+		if filename is not None and has_includes:
+			directory = os.path.dirname(os.path.abspath(filename))
+		
+		config = (
+			CACHE_FORMAT_VERSION,
+			sys.implementation.cache_tag,
+			marshal.version,
+			self.one_time_block_start,
+			self.one_time_block_end,
+			self.one_time_expression_start,
+			self.one_time_expression_end,
+			self.comment_block_start,
+			self.comment_block_end,
+			self.block_start,
+			self.block_end,
+			self.expression_start,
+			self.expression_end,
+			self.cache_block_start,
+			self.cache_block_end,
+			self.include_block_start,
+			self.include_block_end,
+			tuple(os.path.abspath(directory) for directory in self.include_path),
+			self.section_block_start,
+			self.section_block_end,
+			self.layout_block_start,
+			self.layout_block_end,
+			directory,
+			self.offload_prefix,
+			self.autoescape,
+			self.raw_prefix,
+			self.strip_string,
+			self.save_source_string
+		)
+		
+		digest = hashlib.sha256(repr(config).encode('utf-8'))
+		digest.update(source)
+		return digest.hexdigest()
+	
+	def parse(self, source: str, reuse: typing.Dict[typing.Tuple[int, str, bool], types.CodeType]=None, filename: str=None, dependencies: typing.Dict[str, str]=None):
+		"""
+		Perform parsing of the given source and returns list of pseudo-tokens.
+		
+		`reuse` defines map of code objects of previously parsed fragments, 
+		fragments with the same source are not compiled again, see 
+		`collect_fragment_code()`.
+		
+		`filename` defines file the source was read from, includes are 
+		resolved relative to it's directory.
+		
+		`dependencies` is updated with map of absolute path of each included 
+		file, including nested includes, to sha256 digest of it's content.
+		
+		Layout files are tracked in `dependencies` the same way as included 
+		files. Sections are flattened, see `flatten_sections()`.
+		
+		If `cache_dir` is set, result is loaded from cache or stored in it.
+		
+		If `compact` is set, sources of fragments are moved into shared buffer.
+		
+		`source` can also be UTF-8 encoded mmap, see `parse_file()`.
+		"""
+		
+		if self.cache_dir is None:
+			template_fragments = flatten_sections(self.parse_source(source, reuse, filename, dependencies))
+		else:
+			cache_file = os.path.join(self.cache_dir, self.get_cache_key(source, filename) + CACHE_FILE_SUFFIX)
+		
+			template_fragments = load_fragments_cache(cache_file, self.intern_code, dependencies)
+			if template_fragments is None:
+				included = {}
+				template_fragments = flatten_sections(self.parse_source(source, reuse, filename, included))
+				store_fragments_cache(cache_file, template_fragments, included)
+				
+				if dependencies is not None:
+					dependencies.update(included)
+		
+		if self.compact:
+			compact_fragments(template_fragments)
+		
+		return template_fragments
+	
+	def parse_file(self, filename: str, reuse: typing.Dict[typing.Tuple[int, str, bool], types.CodeType]=None, dependencies: typing.Dict[str, str]=None):
+		"""
+		Parse UTF-8 encoded template file without reading it into memory at 
+		once. File is memory mapped and scanned as bytes, only code fragments 
+		are decoded. Static strings are copied out of the mapping as UTF-8 
+		encoded bytes and decoded during render, see 
+		`MappedStringTemplateFragment`, so they take single byte per ASCII 
+		character and are never held decoded.
+		
+		Mapping is closed before return, returned fragments do not depend on 
+		the file.
+		
+		`reuse` and `dependencies` match `parse()`.
+		"""
+		
+		with open(filename, 'rb') as file_obj:
+			# Empty file can not be mapped
+			if os.fstat(file_obj.fileno()).st_size == 0:
+				return self.parse('', reuse, filename, dependencies)
+			
+			source = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+		
+		fragments = self.parse(source, reuse, filename, dependencies)
+		
+		# Access to the mapping of truncated file crashes the process
+		source.close()
+		return fragments
+	
+	def parse_source(self, source: str, reuse: typing.Dict[typing.Tuple[int, str, bool], types.CodeType]=None, filename: str=None, dependencies: typing.Dict[str, str]=None, _includes: typing.Tuple[str, ...]=None):
+		"""
+		Perform parsing of the given source and returns list of pseudo-tokens.
+		
+		Source is scanned once with single precompiled alternation of all tags 
+		for this parser configuration. Comments are skipped during the scan, so 
+		source is never copied to remove them.
+		
+		Included files are parsed recursively and their fragments are inserted 
+		in place of include. If source declares layout, it is parsed and 
+		sections of source override it's sections. Returned fragments contain 
+		section placeholders, see `SectionTemplateFragment`.
+		
+		`reuse`, `filename` and `dependencies` match `parse()`. Mapped source 
+		is scanned as bytes, see `parse_file()`.
+		"""
+		
+		# Mapped source is scanned without decoding
+		mapped = not isinstance(source, str)
+		if mapped:
+			source = memoryview(source)
+		
+		# Files being parsed, from the outermost one, for cycle detection
+		if _includes is None:
+			_includes = (os.path.abspath(filename),) if filename is not None else ()
+		
+		tag_by_id = (
+			self.one_time_block_start,
+			self.one_time_block_end,
+			self.one_time_expression_start,
+			self.one_time_expression_end,
+			self.block_start,
+			self.block_end,
+			self.expression_start,
+			self.expression_end,
+			self.comment_block_start,
+			self.comment_block_end,
+			self.cache_block_start,
+			self.cache_block_end if self.cache_block_start else None,
+			self.include_block_start,
+			self.include_block_end if self.include_block_start else None,
+			self.section_block_start,
+			self.section_block_end if self.section_block_start else None,
+			self.layout_block_start,
+			self.layout_block_end if self.layout_block_start else None
+		)
+		
+		pattern, roles = compile_tag_pattern(tag_by_id if not mapped else tuple(tag.encode('utf-8') if tag is not None else None for tag in tag_by_id))
+		
+		template_fragments = []
+		# Count acurrencies of each tag type
+		fragment_types_count = [ 0 ] * 9
+		
+		# Stack of (tag id, outer fragments, header, tag index) of open cached regions and sections
+		regions = []
+		
+		# Layout extended by this source
+		layout = None
+		
+		# Pieces of the current string or code block, split by comments
+		parts = []
+		
+		# Id of the currently opened tag or -1 if cursor is in plain string
+		open_tag_id = -1
+		in_comment = False
+		has_tags = False
+		
+		# Start of the current piece
+		last_source_index = 0
+		
+		# Line number at line_index, counted incrementally for fragment line ranges
+		line = 1
+		line_index = 0
+		open_line = 1
+		
+		for match in pattern.finditer(source):
+			tag_ids = roles[match.group()]
+			
+			# Everything inside comment is ignored except comment end
+			if in_comment:
+				if COMMENT_END_ID in tag_ids:
+					in_comment = False
+					last_source_index = match.end()
+				continue
+			
+			# Comment can appear both in string and in code block
+			if COMMENT_START_ID in tag_ids:
+				parts.append(source[last_source_index : match.start()])
+				in_comment = True
+				continue
+			
+			if open_tag_id == -1:
+				for tag_id in tag_ids:
+					if tag_id % 2 == 0:
+						break
+				else:
+					raise RuntimeError(f'Unmatched {tag_by_id[tag_ids[0]]} tag')
+				
+				# Append missing string as text node
+				parts.append(source[last_source_index : match.start()])
+				self._append_string(template_fragments, parts)
+				
+				parts = []
+				open_tag_id = tag_id
+				has_tags = True
+				last_source_index = match.end()
+				
+				line += source.count('\n', line_index, match.start()) if not mapped else count_newlines(source, line_index, match.start())
+				line_index = match.start()
+				open_line = line
+				continue
+			
+			if open_tag_id + 1 not in tag_ids:
+				raise RuntimeError(f'Unmatched {tag_by_id[open_tag_id]} tag')
+			
+			parts.append(source[last_source_index : match.start()])
+			if mapped:
+				substring = ''.join(str(part, 'utf-8') for part in parts)
+			else:
+				substring = parts[0] if len(parts) == 1 else ''.join(parts)
+			
+			parts = []
+			last_source_index = match.end()
+			
+			line += source.count('\n', line_index, match.start()) if not mapped else count_newlines(source, line_index, match.start())
+			line_index = match.start()
+			line_range = (open_line, line)
+			
+			fragment_types_count[open_tag_id // 2] += 1
+			tag_index = fragment_types_count[open_tag_id // 2]
+			
+			# Skip empty blocks
+			if len(substring.strip()) == 0:
+				open_tag_id = -1
+				continue
+			
+			offload = False
+			if self.offload_prefix and open_tag_id < COMMENT_START_ID and substring.startswith(self.offload_prefix):
+				substring = substring[len(self.offload_prefix):]
+				offload = True
+			
+			escape = self.autoescape
+			if self.raw_prefix and open_tag_id in (2, 6) and substring.startswith(self.raw_prefix):
+				substring = substring[len(self.raw_prefix):]
+				escape = False
+			
+			code = reuse.get((open_tag_id, substring, offload)) if reuse is not None else None
+			
+			if open_tag_id == 0:
+				template_fragments.append(BlockTemplateFragment(substring, one_time=True, block_start_tag=self.one_time_block_start, block_end_tag=self.one_time_block_end, save_source=self.save_source_string, offload=offload, line_range=line_range, intern_code=self.intern_code, _tag_index=tag_index, _executable=code))
+			
+			elif open_tag_id == 2:
+				template_fragments.append(ExpressionTemplateFragment(substring, one_time=True, expression_start_tag=self.one_time_expression_start, expression_end_tag=self.one_time_expression_end, save_source=self.save_source_string, offload=offload, line_range=line_range, intern_code=self.intern_code, escape=escape, _tag_index=tag_index, _evaluable=code))
+			
+			elif open_tag_id == 4:
+				template_fragments.append(BlockTemplateFragment(substring, one_time=False, block_start_tag=self.block_start, block_end_tag=self.block_end, save_source=self.save_source_string, offload=offload, line_range=line_range, intern_code=self.intern_code, _tag_index=tag_index, _executable=code))
+			
+			elif open_tag_id == 6:
+				template_fragments.append(ExpressionTemplateFragment(substring, one_time=False, expression_start_tag=self.expression_start, expression_end_tag=self.expression_end, save_source=self.save_source_string, offload=offload, line_range=line_range, intern_code=self.intern_code, escape=escape, _tag_index=tag_index, _evaluable=code))
+			
+			elif open_tag_id == CACHE_START_ID:
+				if substring.strip() != CACHE_BLOCK_CLOSE:
+					regions.append((open_tag_id, template_fragments, substring, tag_index))
+					template_fragments = []
+				
+				elif len(regions) == 0 or regions[-1][0] != CACHE_START_ID:
+					raise RuntimeError(f'Unmatched {self.cache_block_start} {CACHE_BLOCK_CLOSE} {self.cache_block_end} tag')
+				
+				else:
+					_, outer_fragments, header, header_index = regions.pop()
+					outer_fragments.append(CachedRegionTemplateFragment(header, template_fragments, region_start_tag=self.cache_block_start, region_end_tag=self.cache_block_end, save_source=self.save_source_string, _tag_index=header_index))
+					template_fragments = outer_fragments
+			
+			elif open_tag_id == INCLUDE_START_ID:
+				template_fragments.extend(self.parse_include(substring, filename, reuse, dependencies, _includes))
+			
+			elif open_tag_id == SECTION_START_ID:
+				name = substring.strip()
+				if name != SECTION_BLOCK_CLOSE:
+					for region in regions:
+						if region[0] == CACHE_START_ID:
+							raise RuntimeError(f'Section {name} is not allowed inside cached region')
+					
+					regions.append((open_tag_id, template_fragments, name, tag_index))
+					template_fragments = []
+				
+				elif len(regions) == 0 or regions[-1][0] != SECTION_START_ID:
+					raise RuntimeError(f'Unmatched {self.section_block_start} {SECTION_BLOCK_CLOSE} {self.section_block_end} tag')
+				
+				else:
+					_, outer_fragments, name, _ = regions.pop()
+					outer_fragments.append(SectionTemplateFragment(name, template_fragments))
+					template_fragments = outer_fragments
+			
+			elif open_tag_id == LAYOUT_START_ID:
+				if layout is not None:
+					raise RuntimeError(f'Multiple {self.layout_block_start} tags')
+				
+				if len(regions):
+					raise RuntimeError(f'{self.layout_block_start} tag is not allowed inside cached region or section')
+				
+				layout = substring
+			
+			open_tag_id = -1
+		
+		if in_comment:
+			raise RuntimeError(f'Unmatched {self.comment_block_start} tag')
+		
+		if len(regions):
+			raise RuntimeError(f'Unmatched {tag_by_id[regions[-1][0]]} tag')
+		
+		if open_tag_id != -1:
+			raise RuntimeError(f'Unmatched {tag_by_id[open_tag_id]} tag')
+		
+		# Append the rest
+		parts.append(source[last_source_index:])
+		
+		# Source without tags is kept as is
+		if not has_tags:
+			if mapped and len(parts) == 1 and len(parts[0]) >= MAPPED_STRING_MIN_SIZE:
+				return [ MappedStringTemplateFragment(bytes(parts[0])) ]
+			if mapped:
+				parts = [ str(part, 'utf-8') for part in parts ]
+			return [ StringTemplateFragment(parts[0] if len(parts) == 1 else ''.join(parts)) ]
+		
+		self._append_string(template_fragments, parts)
+		
+		if layout is not None:
+			return self.parse_layout(layout, template_fragments, filename, reuse, dependencies, _includes)
+		
+		return template_fragments
+	
+	def resolve_include(self, name: str, filename: str=None) -> str:
+		"""
+		Returns absolute path of included file with given name. Name is 
+		resolved relative to directory of the including `filename`, then in 
+		each directory of `include_path`.
+		
+		Raises FileNotFoundError if file can not be found.
+		"""
+		
+		directories = list(self.include_path)
+		if filename is not None:
+			directories.insert(0, os.path.dirname(os.path.abspath(filename)))
+		elif not directories:
+			directories.append(os.getcwd())
+		
+		for directory in directories:
+			path = os.path.normpath(os.path.join(os.path.abspath(directory), name))
+			if os.path.isfile(path):
+				return path
+		
+		raise FileNotFoundError(f'Included template {name} not found in {directories}')
+	
+	def parse_include(self, source_string: str, filename: str, reuse: typing.Dict[typing.Tuple[int, str, bool], types.CodeType], dependencies: typing.Optional[typing.Dict[str, str]], includes: typing.Tuple[str, ...]) -> typing.List[TemplateFragment]:
+		"""
+		Parse file included from `filename` with include or layout block 
+		content `source_string` and return it's fragments. Names of code 
+		fragments are suffixed with name of included file.
+		
+		Raises RuntimeError on include cycle.
+		"""
+		
+		name = source_string.strip()
+		if len(name) == 0:
+			raise RuntimeError(f'Empty template path in {filename or "template"}')
+		
+		path = self.resolve_include(name, filename)
+		if path in includes:
+			raise RuntimeError(f'Include cycle: {" -> ".join(includes + (path,))}')
+		
+		with open(path, 'rb') as file:
+			data = file.read()
+		
+		if dependencies is not None:
+			dependencies[path] = hashlib.sha256(data).hexdigest()
+		
+		fragments = self.parse_source(data.decode('utf-8'), reuse, path, dependencies, includes + (path,))
+		
+		for fragment in iterate_fragments(fragments):
+			if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)):
+				fragment.name = f'{fragment.name[:-1]} {name}>'
+		
+		return fragments
+	
+	def parse_layout(self, source_string: str, fragments: typing.List[TemplateFragment], filename: str, reuse: typing.Dict[typing.Tuple[int, str, bool], types.CodeType], dependencies: typing.Optional[typing.Dict[str, str]], includes: typing.Tuple[str, ...]) -> typing.List[TemplateFragment]:
+		"""
+		Parse layout extended by `fragments` of template from `filename` with 
+		layout block content `source_string`. Returns fragments of the layout 
+		with sections overridden by sections of the template. Code blocks of 
+		the template outside of sections are placed before the layout.
+		"""
+		
+		overrides = collect_sections(fragments)
+		layout_fragments = self.parse_include(source_string, filename, reuse, dependencies, includes)
+		
+		prefix = [ fragment for fragment in fragments if isinstance(fragment, BlockTemplateFragment) ]
+		return prefix + override_sections(layout_fragments, overrides)
+	
+	def _append_string(self, template_fragments: list, parts: typing.List[str]):
+		"""
+		Join string pieces separated by comments and append them as single 
+		StringTemplateFragment. Single mapped piece is kept as slice of the 
+		mapping, see `make_mapped_string_fragment()`.
+		"""
+		
+		if not isinstance(parts[0], str):
+			if len(parts) == 1:
+				fragment = make_mapped_string_fragment(parts[0], self.strip_string)
+				if fragment is not None:
+					template_fragments.append(fragment)
+				return
+			
+			parts = [ str(part, 'utf-8') for part in parts ]
+		
+		substring = parts[0] if len(parts) == 1 else ''.join(parts)
+				
+		# Ignore empty strings for optimization
+		stripped = substring.strip()
+		if len(stripped):
+			template_fragments.append(StringTemplateFragment(stripped if self.strip_string else substring))
+
+
+# Opcodes allowed in expression code object that evaluates to constant
+CONSTANT_OPNAMES = frozenset([ 'RESUME', 'NOP', 'CACHE', 'LOAD_CONST', 'RETURN_VALUE', 'RETURN_CONST' ])
+
+
+def fold_constant_fragment(fragment: TemplateFragment) -> typing.Tuple[bool, typing.Any]:
+	"""
+	Check if given fragment is render-time expression that always evaluates to 
+	the same constant value.
+	
+	Expression is constant if it's compiled code only loads single constant 
+	(compiler already folds expressions like `'a' * 3`) or if it's source is a 
+	literal accepted by `ast.literal_eval()`.
+	
+	Returns tuple of (is_constant, value).
+	"""
+	
+	if not isinstance(fragment, ExpressionTemplateFragment) or fragment.is_one_time():
+		return False, None
+	
+	code = fragment.evaluable
+	if not code.co_names and not code.co_varnames:
+		instructions = list(dis.get_instructions(code))
+		if all(i.opname in CONSTANT_OPNAMES for i in instructions):
+			if sum(1 for i in instructions if i.opname in ('LOAD_CONST', 'RETURN_CONST')) == 1:
+				return True, eval(code, {}, {})
+	
+	# Literals never load names
+	source_string = fragment.get_source()
+	if source_string is not None and not code.co_names:
+		try:
+			return True, ast.literal_eval(autotablete(source_string))
+		except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+			pass
+	
+	return False, None
+
+
+def optimize_fragments(fragments: typing.List[TemplateFragment]) -> typing.Tuple[typing.List[TemplateFragment], int]:
+	"""
+	Optimize list of fragments of initialized template without changing it's 
+	render result:
+	* Render-time expressions evaluating to constant are replaced with 
+	  StringTemplateFragment. Constant None is kept because it's handling 
+	  depends on `none_ok` render option
+	* Empty string fragments are removed
+	* Adjacent string fragments are merged if left one does not end with 
+	  whitespace and right one does not start with whitespace. Otherwise 
+	  merging would change result of render with `strip_string=True`, because 
+	  each fragment is stripped separately
+	
+	Returns new list of fragments and amount of fragments removed.
+	"""
+	
+	result = []
+	
+	# Pending string pieces to merge
+	pieces = []
+	
+	def flush():
+		if len(pieces) == 1:
+			result.append(pieces[0])
+		elif len(pieces) > 1:
+			result.append(StringTemplateFragment(''.join(str(p.value) for p in pieces)))
+		pieces.clear()
+	
+	for fragment in fragments:
+		is_constant, value = fold_constant_fragment(fragment)
+		if is_constant and value is not None:
+			fragment = StringTemplateFragment(escape_html(value) if fragment.escape else str(value))
+		
+		if not isinstance(fragment, StringTemplateFragment):
+			flush()
+			result.append(fragment)
+			continue
+		
+		# Mapped strings are never empty and are decoded only to be merged
+		if type(fragment) is not MappedStringTemplateFragment and len(str(fragment.value)) == 0:
+			continue
+		
+		if len(pieces) and (str(pieces[-1].value)[-1].isspace() or str(fragment.value)[0].isspace()):
+			flush()
+		
+		pieces.append(fragment)
+	
+	flush()
+	
+	return result, len(fragments) - len(result)
+
+
+def compile_fragment_function(fragment: TemplateFragment, context: dict, scope_keys: typing.Optional[typing.FrozenSet[str]]=None) -> typing.Optional[typing.Tuple[types.FunctionType, typing.Tuple[str, ...], typing.Tuple[str, ...]]]:
+	"""
+	Compile render-time expression into function receiving it's scope 
+	variables as arguments, so they are read as fast locals instead of 
+	`LOAD_NAME` lookups over scope, context and builtins. Function uses 
+	`context` as globals.
+	
+	Names of the expression are split into scope names passed as arguments 
+	and global names read from context or builtins. If `scope_keys` is set, 
+	scope names are the declared ones, expression reading name which is 
+	neither declared nor defined in context or builtins is not compiled. 
+	Otherwise names not defined in context or builtins are scope names.
+	
+	Returns tuple of (function, scope names, global names) or None if 
+	expression can not be compiled. Function gives the same result as eval() 
+	only if scope contains all scope names and none of global names, caller 
+	should fall back to eval() otherwise.
+	"""
+	
+	if not isinstance(fragment, ExpressionTemplateFragment) or fragment.one_time or fragment.instrumented or fragment.writes_scope:
+		return None
+	
+	# Function locals differ from the scope mapping seen by eval()
+	if not SCOPE_ACCESS_NAMES.isdisjoint(fragment.evaluable.co_names):
+		return None
+	
+	source_string = fragment.get_source()
+	if source_string is None:
+		return None
+	
+	names = []
+	for instruction in dis.get_instructions(fragment.evaluable):
+		if instruction.opname == 'LOAD_NAME' and instruction.argval not in names:
+			names.append(instruction.argval)
+	
+	scope_names = []
+	global_names = []
+	for name in names:
+		if scope_keys is not None and name in scope_keys:
+			scope_names.append(name)
+		elif name in context or name in builtins.__dict__:
+			global_names.append(name)
+		elif scope_keys is None:
+			scope_names.append(name)
+		else:
+			return None
+	
+	function_source = f'{"async " if fragment.has_await else ""}def __yatplt_fragment__({", ".join(scope_names)}):\n\treturn (\n{autotablete(source_string)}\n\t)'
+	try:
+		code = compile(function_source, fragment.name, 'exec')
+	except SyntaxError:
+		return None
+	
+	code = next(const for const in code.co_consts if isinstance(const, types.CodeType))
+	return types.FunctionType(code, context, fragment.name), tuple(scope_names), tuple(global_names)
+
+
+# Opcodes storing or deleting names in template context or scope
+STORE_NAME_OPNAMES = frozenset([ 'STORE_NAME', 'DELETE_NAME', 'STORE_GLOBAL', 'DELETE_GLOBAL' ])
+
+
+def get_code_names(code: types.CodeType) -> typing.Tuple[typing.FrozenSet[str], typing.FrozenSet[str]]:
+	"""
+	Returns tuple of (read, written) names of the code object including 
+	nested code objects. Read names are conservative and include attribute 
+	names.
+	"""
+	
+	read = set()
+	written = set()
+	
+	stack = [ code ]
+	while len(stack):
+		code = stack.pop()
+		read.update(code.co_names)
+		
+		for instruction in dis.get_instructions(code):
+			if instruction.opname in STORE_NAME_OPNAMES:
+				written.add(instruction.argval)
+		
+		stack.extend(const for const in code.co_consts if isinstance(const, types.CodeType))
+	
+	return frozenset(read), frozenset(written)
+
+
+def plan_concurrent_fragments(fragments: typing.List[TemplateFragment]) -> typing.List[typing.Tuple[typing.List[TemplateFragment], bool]]:
+	"""
+	Split list of fragments into groups for concurrent render. Returns list of 
+	(fragments, concurrent) tuples.
+	
+	Fragments of concurrent group are independent: none of them reads or 
+	writes name written by another fragment of the group. Their coroutines 
+	can be awaited concurrently while output order is kept.
+	
+	Blocks and fragments of unknown type may have any side effects and form 
+	non-concurrent groups of single fragment, acting as barriers.
+	"""
+	
+	plan = []
+	
+	group = []
+	group_read = set()
+	group_written = set()
+	
+	def flush():
+		if len(group):
+			plan.append((list(group), True))
+		group.clear()
+		group_read.clear()
+		group_written.clear()
+	
+	for fragment in fragments:
+		if isinstance(fragment, StringTemplateFragment):
+			group.append(fragment)
+			continue
+		
+		if not isinstance(fragment, ExpressionTemplateFragment):
+			flush()
+			plan.append(([ fragment ], False))
+			continue
+		
+		read, written = get_code_names(fragment.evaluable)
+		
+		# Depends on previous fragment of the group
+		if not group_written.isdisjoint(read) or not group_written.isdisjoint(written) or not group_read.isdisjoint(written):
+			flush()
+		
+		group.append(fragment)
+		group_read.update(read)
+		group_written.update(written)
+	
+	flush()
+	
+	return plan
+
+
+def format_fragment_value(fragment: TemplateFragment, value: typing.Any, strip_string: bool, none_ok: bool) -> typing.Optional[str]:
+	"""
+	Convert rendered value of the fragment into string. Returns None if value 
+	should not be inserted into render result.
+	"""
+	
+	if isinstance(fragment, BlockTemplateFragment):
+		return None
+	
+	if value is None:
+		if not none_ok:
+			raise RuntimeError(f'Expression returned None at {get_fragment_name(fragment)}')
+		return None
+	
+	value = escape_html(value) if fragment.escape else str(value)
+	
+	if strip_string:
+		value = value.strip()
+		if len(value) == 0:
+			return None
+	
+	return value
+
+
+def iterate_fragments(fragments: typing.List[TemplateFragment]) -> typing.Generator[TemplateFragment, None, None]:
+	"""
+	Iterate over the given fragments and fragments nested into cached regions 
+	and sections
+	"""
+	
+	for fragment in fragments:
+		yield fragment
+		
+		if isinstance(fragment, (CachedRegionTemplateFragment, SectionTemplateFragment)):
+			yield from iterate_fragments(fragment.fragments)
+
+
+def collect_sections(fragments: typing.List[TemplateFragment]) -> typing.Dict[str, SectionTemplateFragment]:
+	"""
+	Returns map of name to section for all sections of the given fragments 
+	including nested sections. Raises RuntimeError on duplicate section name.
+	"""
+	
+	sections = {}
+	for fragment in iterate_fragments(fragments):
+		if isinstance(fragment, SectionTemplateFragment):
+			if fragment.name in sections:
+				raise RuntimeError(f'Duplicate section {fragment.name}')
+			
+			sections[fragment.name] = fragment
+	
+	return sections
+
+
+def override_sections(fragments: typing.List[TemplateFragment], overrides: typing.Dict[str, SectionTemplateFragment]) -> typing.List[TemplateFragment]:
+	"""
+	Returns copy of the given layout fragments where sections are replaced 
+	with sections of `overrides` with the same name. Replaced sections are 
+	kept as placeholders, so they can be overridden by the next level of 
+	inheritance.
+	"""
+	
+	result = []
+	for fragment in fragments:
+		if isinstance(fragment, SectionTemplateFragment):
+			if fragment.name in overrides:
+				fragment = overrides[fragment.name]
+			else:
+				fragment = SectionTemplateFragment(fragment.name, override_sections(fragment.fragments, overrides))
+		
+		result.append(fragment)
+	
+	return result
+
+
+def flatten_sections(fragments: typing.List[TemplateFragment]) -> typing.List[TemplateFragment]:
+	"""
+	Replace section placeholders with their fragments
+	"""
+	
+	result = []
+	for fragment in fragments:
+		if isinstance(fragment, SectionTemplateFragment):
+			result.extend(flatten_sections(fragment.fragments))
+		else:
+			result.append(fragment)
+	
+	return result
+
+
+def get_fragment_kind(fragment: TemplateFragment) -> int:
+	"""
+	Returns id of the opening tag of expression or block fragment, see 
+	`compile_tag_pattern()`
+	"""
+	
+	if isinstance(fragment, BlockTemplateFragment):
+		return 0 if fragment.one_time else 4
+	
+	return 2 if fragment.one_time else 6
+
+
+def collect_fragment_code(fragments: typing.List[TemplateFragment]) -> typing.Dict[typing.Tuple[int, str, bool], types.CodeType]:
+	"""
+	Returns map of `(kind, source, offload)` to code object of each expression 
+	and block fragment with saved source. Passed to `TemplateParser.parse()` 
+	to reuse code of fragments with unchanged source.
+	"""
+	
+	reuse = {}
+	for fragment in iterate_fragments(fragments):
+		if isinstance(fragment, ExpressionTemplateFragment):
+			code = fragment.evaluable
+		elif isinstance(fragment, BlockTemplateFragment):
+			code = fragment.executable
+		else:
+			continue
+		
+		source_string = fragment.get_source()
+		if source_string is not None:
+			reuse[(get_fragment_kind(fragment), source_string, fragment.offload)] = code
+	
+	return reuse
+
+
+def get_one_time_key(fragment: TemplateFragment) -> typing.Hashable:
+	"""
+	Returns key of the one-time fragment, fragments with equal keys evaluate 
+	the same code
+	"""
+	
+	source_string = fragment.get_source()
+	if source_string is None:
+		source_string = fragment.evaluable if isinstance(fragment, ExpressionTemplateFragment) else fragment.executable
+	
+	return (type(fragment), fragment.offload, fragment.escape, source_string)
+
+
+def compact_fragments(fragments: typing.List[TemplateFragment]) -> SourceBuffer:
+	"""
+	Move sources and line ranges of code fragments into single SourceBuffer 
+	shared by these fragments, so each fragment does not keep it's own copy 
+	of source string and line range tuple. Sources remain available with 
+	`get_source()`.
+	
+	Returns created buffer.
+	"""
+	
+	buffer = SourceBuffer()
+	parts = []
+	size = 0
+	
+	for fragment in iterate_fragments(fragments):
+		if not isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)):
+			continue
+		
+		source_string = fragment.get_source()
+		if source_string is None:
+			continue
+		
+		line_range = fragment.get_line_range() or (0, 0)
+		
+		buffer.offsets.append(size)
+		size += len(source_string)
+		buffer.offsets.append(size)
+		buffer.lines.extend(line_range)
+		parts.append(source_string)
+		
+		fragment.source_string = None
+		fragment.line_range = None
+		fragment.source_buffer = buffer
+		fragment.source_index = len(buffer) - 1
+	
+	buffer.source = ''.join(parts)
+	return buffer
+
+
+def get_fragment_name(fragment: TemplateFragment) -> str:
+	"""
+	Returns name of the fragment used in error messages: name of it's 
+	position in template or type name
+	"""
+	
+	if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)):
+		return fragment.name
+	
+	return type(fragment).__name__
+
+
+def compile_render_function(fragments: typing.List[TemplateFragment], generator: bool, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, synchronous: bool=False, context: dict=None, fast_locals: bool=False, scope_keys: typing.FrozenSet[str]=None) -> typing.Callable:
+	"""
+	Generate python source of single async function rendering the given list 
+	of fragments and compile it once.
+	
+	Static strings become constants of the generated function and fragment 
+	evaluation is inlined into it's body, so render is a single call without 
+	per-fragment dispatch. Render options are constant for generated function.
+	
+	If `generator` is True, returns async generator function yielding rendered 
+	fragments, else returns coroutine function returning rendered string.
+	
+	If `synchronous` is True, generated function is a regular function or 
+	generator. Fragments must not be async, coroutine returned by expression 
+	raises RuntimeError.
+	
+	Generated function accepts `(context, scope)` arguments.
+	
+	If `fast_locals` is True, render-time expressions are compiled into 
+	functions receiving scope variables as arguments, see 
+	`compile_fragment_function()`. `context` should be the context generated 
+	function is called with. Expression is evaluated with eval() if scope 
+	misses any of it's scope names or defines any of it's global names.
+	"""
+	
+	# Values passed into generated function as closure variables
+	closure = {
+		'__eval': eval,
+		'__LookupErrors': (KeyError, TypeError),
+		'__iscoroutine': asyncio.iscoroutine,
+		'__str': str,
+		'__escape': escape_html,
+		'__ScopeOverlay': ScopeOverlay,
+		'__dict': dict,
+		'__RuntimeError': RuntimeError,
+		'__note': add_fragment_note,
+		'__close': close_coroutine
+	}
+	
+	def bind(value) -> str:
+		name = f'__v{len(closure)}'
+		closure[name] = value
+		return name
+	
+	emit_prefix = 'yield ' if generator else '__append('
+	emit_suffix = '' if generator else ')'
+	
+	body = []
+	has_emit = False
+	
+	for fragment in fragments:
+		if isinstance(fragment, StringTemplateFragment):
+			value = str(fragment.value)
+			if strip_string:
+				value = value.strip()
+			
+			# Empty strings are never emitted
+			if len(value) == 0:
+				continue
+			
+			body.append(f'{emit_prefix}{value!r}{emit_suffix}')
+			has_emit = True
+			continue
+		
+		if isinstance(fragment, BlockTemplateFragment):
+			code = fragment.executable
+		elif isinstance(fragment, ExpressionTemplateFragment):
+			code = fragment.evaluable
+		else:
+			code = None
+		
+		# Fragments writing scope receive copy-on-write overlay, fragments 
+		# accessing scope as a whole receive copy
+		if not wrap_scope or not fragment.writes_scope:
+			scope_arg = '__scope'
+		elif code is not None and code_accesses_scope(code):
+			scope_arg = '__dict(__scope or {})'
+		else:
+			scope_arg = '__ScopeOverlay(__scope)'
+		
+		# Offloaded, monitored and profiled fragments are evaluated with their evaluate()
+		if code is not None and fragment.instrumented:
+			code = None
+		
+		if code is None:
+			# Other fragment types are evaluated with their evaluate()
+			call = f'{bind(fragment)}.evaluate(__context, {scope_arg})'
+		else:
+			call = f'__eval({bind(code)}, __context, {scope_arg})'
+		
+		# Evaluation is wrapped to note fragment position in exception
+		fragment_body = body
+		body = []
+		
+		compiled = compile_fragment_function(fragment, context, scope_keys) if fast_locals and code is not None else None
+		if compiled is None:
+			body.append(f'__value = {call}')
+		else:
+			function, scope_names, global_names = compiled
+			
+			fast_call = [ f'__value = {bind(function)}({", ".join(f"__a{i}" for i in range(len(scope_names)))})' ]
+			if len(global_names):
+				# Scope variable shadowing global name requires eval()
+				shadowed = ' or '.join(f'{name!r} in __scope' for name in global_names)
+				fast_call = [ f'if {shadowed if len(scope_names) else f"__scope is not None and ({shadowed})"}:', f'\t__value = {call}', 'else:' ] + [ '\t' + line for line in fast_call ]
+			
+			if len(scope_names):
+				# Missing scope variable or None scope requires eval()
+				body.append('try:')
+				body.extend(f'\t__a{i} = __scope[{name!r}]' for i, name in enumerate(scope_names))
+				body.append('except __LookupErrors:')
+				body.append(f'\t__value = {call}')
+				body.append('else:')
+				body.extend('\t' + line for line in fast_call)
+			else:
+				body.extend(fast_call)
+		
+		if not synchronous:
+			if code is not None and code.co_flags & inspect.CO_COROUTINE:
+				# Code with top-level await always returns coroutine
+				body.append(f'__value = await __value')
+			else:
+				body.append(f'if __iscoroutine(__value):')
+				body.append(f'\t__value = await __value')
+		
+		fragment_body.append('try:')
+		fragment_body.extend('\t' + line for line in body)
+		fragment_body.append('except Exception as __error:')
+		fragment_body.append(f'\t__note(__error, {bind(fragment)})')
+		fragment_body.append('\traise')
+		body = fragment_body
+		
+		if synchronous:
+			if fragment.is_async():
+				raise RuntimeError(f'Fragment {get_fragment_name(fragment)} requires async render')
+			
+			body.append(f'if __iscoroutine(__value):')
+			body.append(f'\t__close(__value)')
+			body.append(f'\traise __RuntimeError({"Expression returned coroutine at " + get_fragment_name(fragment) + ", use async render"!r})')
+		
+		if isinstance(fragment, BlockTemplateFragment):
+			continue
+		
+		if not none_ok:
+			body.append(f'if __value is None:')
+			body.append(f'\traise __RuntimeError({"Expression returned None at " + get_fragment_name(fragment)!r})')
+		
+		body.append(f'if __value is not None:')
+		if fragment.escape:
+			# Strings without special characters skip escape_html() call
+			body.append(f'\tif __value.__class__ is not __str or {" or ".join(f"{c!r} in __value" for c in HTML_SPECIAL_CHARACTERS)}:')
+			body.append(f'\t\t__value = __escape(__value)')
+			value = '__value'
+		else:
+			value = '__str(__value)'
+		
+		if strip_string:
+			body.append(f'\t__value = {value}.strip()')
+			body.append(f'\tif len(__value):')
+			body.append(f'\t\t{emit_prefix}__value{emit_suffix}')
+		else:
+			body.append(f'\t{emit_prefix}{value}{emit_suffix}')
+		has_emit = True
+	
+	lines = [ f'def __yatplt_factory__({", ".join(closure)}):' ]
+	lines.append(f'\t{"" if synchronous else "async "}def __yatplt_render__(__context, __scope):')
+	
+	if not generator:
+		lines.append('\t\t__out = []')
+		lines.append('\t\t__append = __out.append')
+	
+	lines.extend('\t\t' + line for line in body)
+	
+	if generator:
+		# Function without yield is not a generator
+		if not has_emit:
+			lines.append('\t\treturn')
+			lines.append('\t\tyield')
+	else:
+		lines.append("\t\treturn ''.join(__out)")
+	
+	lines.append('\treturn __yatplt_render__')
+	
+	namespace = {}
+	exec(compile('\n'.join(lines), '<CompiledTemplate>', 'exec'), namespace)
+	return namespace['__yatplt_factory__'](**closure)
+
+
+# Default size in bytes of chunk written by Template.render_stream()
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+
+class ChunkWriter:
+	"""
+	Accumulates rendered strings and writes them into output in chunks.
+	
+	Output is either writer object with `write(data: bytes)` method and 
+	optional `drain()` coroutine, like asyncio.StreamWriter, or ASGI `send` 
+	callable receiving `http.response.body` messages.
+	
+	Buffer is written when it reaches `chunk_size` bytes or when 
+	`flush_interval` seconds passed since first buffered string. Strings are 
+	encoded when buffered, so size is counted in encoded bytes, and joined 
+	once per chunk.
+	"""
+	
+	__slots__ = (
+		'writer',
+		'send',
+		'chunk_size',
+		'flush_interval',
+		'encoding',
+		'parts',
+		'size',
+		'deadline',
+		'written'
+	)
+	
+	def __init__(self, writer: typing.Any, chunk_size: int=DEFAULT_CHUNK_SIZE, flush_interval: float=None, encoding: str='utf-8'):
+		if hasattr(writer, 'write'):
+			self.writer = writer
+			self.send = None
+		elif callable(writer):
+			self.writer = None
+			self.send = writer
+		else:
+			raise TypeError(f'Expected writer or ASGI send callable, got {type(writer)}')
+		
+		self.chunk_size     = chunk_size
+		self.flush_interval = flush_interval
+		self.encoding       = encoding
+		
+		self.parts = []
+		self.size  = 0
+		
+		# Loop time when buffer should be flushed
+		self.deadline = None
+		
+		# Amount of bytes written
+		self.written = 0
+	
+	async def write(self, value: str):
+		"""
+		Encode string, append it to buffer and flush buffer if it is full or 
+		expired
+		"""
+		
+		if len(self.parts) == 0 and self.flush_interval is not None:
+			self.deadline = asyncio.get_running_loop().time() + self.flush_interval
+		
+		encoded = value.encode(self.encoding)
+		self.parts.append(encoded)
+		self.size += len(encoded)
+		
+		if self.size >= self.chunk_size or (self.deadline is not None and asyncio.get_running_loop().time() >= self.deadline):
+			await self.flush()
+	
+	async def wait(self, awaitable: typing.Awaitable) -> typing.Any:
+		"""
+		Await the given awaitable and flush buffer if flush deadline expires 
+		before it completes, so slow expressions do not delay already rendered 
+		output.
+		"""
+		
+		if len(self.parts) == 0 or self.deadline is None:
+			return await awaitable
+		
+		remaining = self.deadline - asyncio.get_running_loop().time()
+		if remaining <= 0:
+			await self.flush()
+			return await awaitable
+		
+		task = asyncio.ensure_future(awaitable)
+		try:
+			done, _ = await asyncio.wait([ task ], timeout=remaining)
+			if not done:
+				await self.flush()
+			return await task
+		except BaseException:
+			task.cancel()
+			raise
+	
+	async def flush(self, more_body: bool=True):
+		"""
+		Write buffered strings as single chunk. Waits for writer drain to 
+		respect backpressure.
+		"""
+		
+		data = b''.join(self.parts)
+		self.parts.clear()
+		self.size = 0
+		self.deadline = None
+		
+		if self.send is not None:
+			await self.send({ 'type': 'http.response.body', 'body': data, 'more_body': more_body })
+			self.written += len(data)
+			return
+		
+		if len(data) == 0:
+			return
+		
+		self.writer.write(data)
+		self.written += len(data)
+		
+		drain = getattr(self.writer, 'drain', None)
+		if drain is not None:
+			await drain()
+	
+	async def close(self):
+		"""
+		Flush the rest of buffer. For ASGI send, final message has 
+		`more_body=False`.
+		"""
+		
+		await self.flush(more_body=False)
+
+
+def make_hashable(value: typing.Any) -> typing.Hashable:
+	"""
+	Convert value into hashable form stable for equal values: dicts, lists 
+	and sets are converted into tuples, unhashable values are replaced with 
+	their repr().
+	"""
+	
+	if isinstance(value, dict):
+		return ('dict', tuple(sorted((repr(k), make_hashable(v)) for k, v in value.items())))
+	
+	if isinstance(value, (list, tuple)):
+		return (type(value).__name__, tuple(make_hashable(v) for v in value))
+	
+	if isinstance(value, (set, frozenset)):
+		return ('set', tuple(sorted(repr(v) for v in value)))
+	
+	try:
+		hash(value)
+	except TypeError:
+		return ('repr', repr(value))
+	
+	return value
+
+
+# Result of shared in-flight operation cancelled in it's owner task, waiting 
+# tasks retry the operation instead of receiving CancelledError
+RETRY_SHARED = object()
+
+
+class RenderCache:
+	"""
+	Cache of whole template render results with LRU eviction policy bounded 
+	by amount of entries and optional TTL.
+	
+	Render result is keyed by caller-supplied key or by selected scope 
+	entries, see `make_key()`. Concurrent misses of the same key share single 
+	in-flight render.
+	
+	Example:
+	```
+	template.set_render_cache(RenderCache(max_entries=256, ttl=60, scope_keys=[ 'locale' ]))
+	
+	await template.render_string(scope={ 'locale': 'en' })
+	```
 	"""
 	
 	__slots__ = (
-		'one_time_block_start',
-		'one_time_block_end',
-		'one_time_expression_start',
-		'one_time_expression_end',
-		'comment_block_start',
-		'comment_block_end',
-		'block_start',
-		'block_end',
-		'expression_start',
-		'expression_end',
-		'save_source_string',
-		'strip_string'
+		'max_entries',
+		'ttl',
+		'scope_keys',
+		'entries',
+		'pending',
+		'generation',
+		'hits',
+		'misses',
+		'evictions'
 	)
 	
-	def __init__(self, one_time_block_start: str=ONE_TIME_BLOCK_START, 
-						one_time_block_end: str=ONE_TIME_BLOCK_END,
-						one_time_expression_start: str=ONE_TIME_EXPRESSION_START,
-						one_time_expression_end: str=ONE_TIME_EXPRESSION_END,
-						comment_block_start: str=COMMENT_BLOCK_START,
-						comment_block_end: str=COMMENT_BLOCK_END,
-						block_start: str=BLOCK_START,
-						block_end: str=BLOCK_END,
-						expression_start: str=EXPRESSION_START,
-						expression_end: str=EXPRESSION_END,
-						strip_string: bool=True,
-						save_source_string: bool=True):
+	def __init__(self, max_entries: int=1024, ttl: float=None, scope_keys: typing.Iterable[str]=None):
+		"""
+		`max_entries` defines maximal amount of cached render results.
 		
-		self.one_time_block_start      = one_time_block_start     
-		self.one_time_block_end        = one_time_block_end       
-		self.one_time_expression_start = one_time_expression_start
-		self.one_time_expression_end   = one_time_expression_end  
-		self.comment_block_start       = comment_block_start      
-		self.comment_block_end         = comment_block_end        
-		self.block_start               = block_start              
-		self.block_end                 = block_end                
-		self.expression_start          = expression_start         
-		self.expression_end            = expression_end           
+		`ttl` defines lifetime of the render result in seconds. Set to None to 
+		keep results until eviction.
 		
-		self.save_source_string      = save_source_string
-		self.strip_string            = strip_string
-	
-	def parse(self, source: str):
-		"""
-		Perform parsing of the given source and returns list of pseudo-tokens
+		`scope_keys` defines scope entries used to build cache key when caller 
+		does not supply it. If not set, only renders with explicit key are 
+		cached.
 		"""
 		
+		self.max_entries = max_entries
+		self.ttl         = ttl
+		self.scope_keys  = tuple(scope_keys) if scope_keys is not None else None
 		
-		# ---> First pass: remove comments
+		# key -> (expiration time, result) in LRU order
+		self.entries = collections.OrderedDict()
 		
+		# key -> future of in-flight render
+		self.pending = {}
 		
-		comment_start = classenum(list(findall(source, self.comment_block_start)), 0)
-		comment_end = classenum(list(findall(source, self.comment_block_end)), 1)
+		# Incremented on clear(), renders started before are not stored
+		self.generation = 0
 		
-		if len(comment_start) < len(comment_end):
-			raise RuntimeError(f'{self.comment_block_start} and {self.comment_block_end} tags count mismatch: {len(comment_start)} != {len(comment_end)}')
+		self.hits      = 0
+		self.misses    = 0
+		self.evictions = 0
+	
+	def make_key(self, scope: dict, cache_key: typing.Hashable=None, options: tuple=()) -> typing.Optional[typing.Hashable]:
+		"""
+		Returns cache key for the render. Key is built from caller-supplied 
+		`cache_key` or from values of `scope_keys` entries of scope, and render 
+		options. Returns None if render should not be cached.
+		"""
 		
-		ordered_comment_tags = sorted(comment_start + comment_end, key=lambda x: x[0])
+		if cache_key is not None:
+			return ('key', cache_key, options)
 		
-		# Operate on copy
-		offset = 0
+		if self.scope_keys is None:
+			return None
+		
+		scope = scope or {}
+		return ('scope', tuple((key, make_hashable(scope.get(key))) for key in self.scope_keys), options)
+	
+	async def get(self, key: typing.Hashable, render: typing.Callable[[], typing.Awaitable[str]]) -> str:
+		"""
+		Returns cached render result for the key or calls `render()` and 
+		caches it's result. Concurrent calls for missing key share single 
+		`render()` call. If the call sharing render is cancelled, one of the 
+		waiting calls renders instead.
+		"""
 		
-		# Iterate over all comment open/close tags and remove these intervals from input data
-		if len(ordered_comment_tags):
+		missed = False
+		while True:
+			entry = self.entries.get(key)
+			if entry is not None:
+				if entry[0] is None or entry[0] > time.monotonic():
+					self.entries.move_to_end(key)
+					if not missed:
+						self.hits += 1
+					return entry[1]
+				
+				del self.entries[key]
 			
-			cursor = 0
+			if not missed:
+				self.misses += 1
+				missed = True
 			
-			while cursor < len(ordered_comment_tags):
-				
-				# Cound closing tag before opening tag
-				if ordered_comment_tags[cursor][1] == 1:
-					raise RuntimeError(f'Unmatched {self.comment_block_end} tag')
-				
-				comment_start_index = ordered_comment_tags[cursor][0]
-				
-				# Find closest closing tag
-				while True:
-					if cursor >= len(ordered_comment_tags):
-						raise RuntimeError(f'Unmatched {self.comment_block_start} tag')
-					
-					if ordered_comment_tags[cursor][1] == 1:
-						break
-					
-					cursor += 1
-				
-				source = source[:comment_start_index - offset] + source[ordered_comment_tags[cursor][0] + len(COMMENT_BLOCK_END) - offset:]
-				offset += (ordered_comment_tags[cursor][0] + len(COMMENT_BLOCK_END)) - comment_start_index
-				cursor += 1
+			future = self.pending.get(key)
+			if future is None:
+				break
+			
+			result = await asyncio.shield(future)
+			if result is not RETRY_SHARED:
+				return result
 		
-		# ---> Second pass: parse all tags and sort list
+		generation = self.generation
+		future = asyncio.get_running_loop().create_future()
+		self.pending[key] = future
 		
+		try:
+			result = await render()
+		except asyncio.CancelledError:
+			# Waiters are not cancelled, they retry
+			future.set_result(RETRY_SHARED)
+			raise
+		except BaseException as e:
+			future.set_exception(e)
+			# Exception is delivered to waiters, if any
+			future.exception()
+			raise
+		finally:
+			if self.pending.get(key) is future:
+				del self.pending[key]
 		
-		tag_by_id = [
-			self.one_time_block_start,
-			self.one_time_block_end,
-			self.one_time_expression_start,
-			self.one_time_expression_end,
-			self.block_start,
-			self.block_end,
-			self.expression_start,
-			self.expression_end
-		]
-		
-		one_time_block_start      = classenum(list(findall(source, self.one_time_block_start)), 0)
-		one_time_block_end        = classenum(list(findall(source, self.one_time_block_end)), 1)
-		one_time_expression_start = classenum(list(findall(source, self.one_time_expression_start)), 2)
-		one_time_expression_end   = classenum(list(findall(source, self.one_time_expression_end)), 3)
-		block_start               = classenum(list(findall(source, self.block_start)), 4)
-		block_end                 = classenum(list(findall(source, self.block_end)), 5)
-		expression_start          = classenum(list(findall(source, self.expression_start)), 6)
-		expression_end            = classenum(list(findall(source, self.expression_end)), 7)
-		
-		# Complimentary check
-		if len(one_time_block_start) != len(one_time_block_end):
-			raise RuntimeError(f'{self.one_time_block_start} and {self.one_time_block_end} tags count mismatch: {len(one_time_block_start)} != {len(one_time_block_end)}')
-			
-		if len(one_time_expression_start) != len(one_time_expression_end):
-			raise RuntimeError(f'{self.one_time_expression_start} and {self.one_time_expression_end} tags count mismatch: {len(one_time_expression_start)} != {len(one_time_expression_end)}')
-			
-		if len(block_start) != len(block_end):
-			raise RuntimeError(f'{self.block_start} and {self.block_end} tags count mismatch: {len(block_start)} != {len(block_end)}')
-			
-		if len(expression_start) != len(expression_end):
-			raise RuntimeError(f'{self.expression_start} and {self.expression_end} tags count mismatch: {len(expression_start)} != {len(expression_end)}')
-	
-		# Sort
-		ordered_tags  = one_time_block_start + one_time_block_end
-		ordered_tags += one_time_expression_start + one_time_expression_end
-		ordered_tags += block_start + block_end
-		ordered_tags += expression_start + expression_end
-		ordered_tags = sorted(ordered_tags, key=lambda x: x[0])
-		
-		# Validate order
-		if len(ordered_tags):
-			cursor = 0
-			
-			last_open_tag_id = -1
-			while cursor < len(ordered_tags):
-				if last_open_tag_id != -1:
-					if ordered_tags[cursor][1] - 1 != last_open_tag_id:
-						raise RuntimeError(f'Unmatched {tag_by_id[last_open_tag_id]} tag')
-					# else
-					last_open_tag_id = -1
-				else:
-					if ordered_tags[cursor][1] % 2 == 1:
-						raise RuntimeError(f'Unmatched {tag_by_id[ordered_tags[cursor][1]]} tag')
-					# else
-					last_open_tag_id = ordered_tags[cursor][1]
-				
-				cursor += 1
-			
-			if last_open_tag_id != -1:
-				if ordered_tags[cursor][1] - 1 != last_open_tag_id:
-					raise RuntimeError(f'Unmatched {tag_by_id[last_open_tag_id]} tag')
+		future.set_result(result)
 		
+		if generation == self.generation:
+			self.put(key, result)
 		
-		# ---> Third pass: split source into separate aprts depending on the type
+		return result
+	
+	def put(self, key: typing.Hashable, result: str):
+		"""
+		Store render result and evict least recently used results
+		"""
 		
-		if len(ordered_tags) == 0:
-			return [ StringTemplateFragment(source) ]
+		self.entries[key] = (time.monotonic() + self.ttl if self.ttl is not None else None, result)
+		self.entries.move_to_end(key)
 		
-		template_fragments = []
-		# Count acurrencies of each tag type
-		fragment_types_count = [ 0 ] * 4
+		while len(self.entries) > self.max_entries:
+			self.entries.popitem(last=False)
+			self.evictions += 1
+	
+	def clear(self):
+		"""
+		Remove all cached results. Renders in flight are not cached.
+		"""
 		
-		last_source_index = 0
-		for cursor in range(0, len(ordered_tags), 2):
-			# Append missing string as text node
-			if last_source_index < ordered_tags[cursor][0]:
-				substring = source[last_source_index : ordered_tags[cursor][0]]
-				
-				# Ignore empty strings for optimization
-				stripped = substring.strip()
-				if len(stripped):
-					template_fragments.append(StringTemplateFragment(stripped if self.strip_string else substring))
-			
-			substring = source[ordered_tags[cursor][0] + len(tag_by_id[ordered_tags[cursor][1]]) : ordered_tags[cursor + 1][0]]
-			fragment_types_count[ordered_tags[cursor][1] // 2] += 1
-			
-			# Skip empty blocks
-			if len(substring.strip()) == 0:
-				last_source_index = ordered_tags[cursor + 1][0] + len(tag_by_id[ordered_tags[cursor + 1][1]])
-				continue
-			
-			if ordered_tags[cursor][1] == 0:
-				template_fragments.append(BlockTemplateFragment(substring, one_time=True, block_start_tag=self.one_time_block_start, block_end_tag=self.one_time_block_end, save_source=self.save_source_string, _tag_index=fragment_types_count[ordered_tags[cursor][1] // 2]))
-			
-			elif ordered_tags[cursor][1] == 2:
-				template_fragments.append(ExpressionTemplateFragment(substring, one_time=True, expression_start_tag=self.one_time_expression_start, expression_end_tag=self.one_time_expression_end, save_source=self.save_source_string, _tag_index=fragment_types_count[ordered_tags[cursor][1] // 2]))
-			
-			elif ordered_tags[cursor][1] == 4:
-				template_fragments.append(BlockTemplateFragment(substring, one_time=False, block_start_tag=self.one_time_block_start, block_end_tag=self.block_start, save_source=self.block_end, _tag_index=fragment_types_count[ordered_tags[cursor][1] // 2]))
-			
-			elif ordered_tags[cursor][1] == 6:
-				template_fragments.append(ExpressionTemplateFragment(substring, one_time=False, expression_start_tag=self.expression_start, expression_end_tag=self.expression_end, save_source=self.save_source_string, _tag_index=fragment_types_count[ordered_tags[cursor][1] // 2]))
-			
-			last_source_index = ordered_tags[cursor + 1][0] + len(tag_by_id[ordered_tags[cursor + 1][1]])
-			
-		# Append the rest
-		if last_source_index < len(source):
-			substring = source[last_source_index : len(source)]
+		self.entries.clear()
+		self.pending.clear()
+		self.generation += 1
+	
+	def get_stats(self) -> typing.Dict[str, int]:
+		"""
+		Returns dict with cache statistics: amount of cached results and hit, 
+		miss and eviction counters.
+		"""
+		
+		return {
+			'entries': len(self.entries),
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions
+		}
+
+
+# Value of the key deleted by one-time fragment
+MISSING_KEY = object()
+
+
+def get_dict_changes(before: dict, after: dict) -> dict:
+	"""
+	Returns new values of keys of `after` changed since `before` copy was 
+	made, MISSING_KEY for deleted keys. Values are compared by identity.
+	"""
+	
+	changes = { key: after.get(key, MISSING_KEY) for key, value in before.items() if after.get(key, MISSING_KEY) is not value }
+	for key in after.keys() - before.keys():
+		changes[key] = after[key]
+	return changes
+
+
+def rebind_function(function: types.FunctionType, globals_dict: dict) -> types.FunctionType:
+	"""
+	Returns copy of the function using the given dict as globals
+	"""
+	
+	rebound = types.FunctionType(function.__code__, globals_dict, function.__name__, function.__defaults__, function.__closure__)
+	rebound.__kwdefaults__ = function.__kwdefaults__
+	rebound.__qualname__   = function.__qualname__
+	rebound.__doc__        = function.__doc__
+	rebound.__module__     = function.__module__
+	rebound.__dict__.update(function.__dict__)
+	return rebound
+
+
+def apply_dict_changes(target: dict, changes: dict, previous_globals: dict=None):
+	"""
+	Apply changes returned by `get_dict_changes()` to `target`, other keys 
+	are not touched. Functions defined with `previous_globals` as globals 
+	are rebound to `target`, rebound functions replace them in `changes`.
+	"""
+	
+	for key, value in changes.items():
+		if value is MISSING_KEY:
+			target.pop(key, None)
+			continue
+		
+		if previous_globals is not None and previous_globals is not target and value.__class__ is types.FunctionType and value.__globals__ is previous_globals:
+			value = rebind_function(value, target)
+			changes[key] = value
+		
+		target[key] = value
+
+
+class InitState:
+	"""
+	Results of one-time fragments of the previous template initialization 
+	used for incremental initialization of the changed template, see 
+	`Template.init()`.
+	
+	For each one-time fragment new values of context and init scope keys it 
+	changed are stored. Changes of reused fragments are applied to context 
+	of the new template, so evaluation continues from the first changed 
+	fragment. Functions defined by reused fragments are rebound to the new 
+	context, other objects are shared with the previous template.
+	"""
+	
+	__slots__ = (
+		'keys',
+		'results',
+		'changes',
+		'options',
+		'context'
+	)
+	
+	def __init__(self):
+		# Key of each one-time fragment, see get_one_time_key()
+		self.keys = []
+		# Fragment replacing each one-time fragment or None if it was removed
+		self.results = []
+		# (context, scope) changes of each one-time fragment, see get_dict_changes()
+		self.changes = []
+		# Init options results were produced with
+		self.options = None
+		# Context results were produced in
+		self.context = None
+	
+	def restore(self, keys: typing.List[typing.Hashable], options: tuple, context: dict, scope: typing.Optional[dict]) -> int:
+		"""
+		Compare keys of one-time fragments of new template with the previous 
+		ones. Returns amount of leading fragments which results can be reused. 
+		Changes of context and scope made by reused fragments are applied to 
+		the given context and scope.
+		"""
+		
+		reused = 0
+		if options == self.options:
+			while reused < len(keys) and reused < len(self.keys) and keys[reused] == self.keys[reused]:
+				reused += 1
+		
+		for context_changes, scope_changes in self.changes[:reused]:
+			apply_dict_changes(context, context_changes, self.context)
 			
-			# Ignore empty strings for optimization
-			stripped = substring.strip()
-			if len(stripped):
-				template_fragments.append(StringTemplateFragment(stripped if self.strip_string else substring))
+			if scope is not None and scope_changes is not None:
+				apply_dict_changes(scope, scope_changes, self.context)
 		
-		return template_fragments
+		return reused
 
 
 class Template:
@@ -688,6 +3691,8 @@ class Template:
 	BLOCK_END is '!}}'
 	EXPRESSION_START is '{{%'
 	EXPRESSION_END is '%}}'
+	CACHE_BLOCK_START is '{{@'
+	CACHE_BLOCK_END is '@}}'
 	```
 	
 	By default identation may vary from 0 to infinity because parser 
@@ -723,76 +3728,393 @@ class Template:
 	%}1}
 	```
 	
-	Syntax of render-time blocks and expressions:
-	```
-	{{!
-		# Following function will return unique value per each .render() because it closures the value of timetamp variable
-		timestamp = time.time()
-		global myfunc
-		def myfunc():
-			return timestamp
-	!}}
-	```
+	Syntax of render-time blocks and expressions:
+	```
+	{{!
+		# Following function will return unique value per each .render() because it closures the value of timetamp variable
+		timestamp = time.time()
+		global myfunc
+		def myfunc():
+			return timestamp
+	!}}
+	```
+	
+	```
+	{{%
+		f\"""
+		<span>timestamp not is: {myfunc()}</span>
+		\"""
+	%}}
+	```
+	
+	Syntax of cached regions:
+	```
+	{{@ ttl=60, key=locale @}}
+		<aside>{{% expensive_sidebar(locale) %}}</aside>
+	{{@ end @}}
+	```
+	
+	Syntax of comment blocks:
+	```
+	{{#
+		The following block is comment block and it's contents are removed from the resulting render
+		
+		{{%
+			'this value is never used'
+		%}}
+	#}}
+	```
+	"""
+	
+	__slots__ = (
+		'fragments',
+		'context',
+		'initialized',
+		'compiled',
+		'fast_locals',
+		'scope_keys',
+		'concurrent',
+		'concurrent_plan',
+		'render_cache'
+	)
+	
+	def __init__(self, source: str, template_parser: TemplateParser=None, context: dict=None, filename: str=None):
+		"""
+		Initialize template from the given source and parse it.
+		
+		If given template contains one-time-init code blocks or segments, they 
+		are evaluted with .init() call.
+		
+		`template_parser` defines default aprsed to use for this Template. In 
+		case oof None, default configuration is used.
+		
+		`context` defines global context to use in this template. If it is not 
+		set, new context is created for the template.
+		
+		`filename` defines file the source was read from, included files are 
+		resolved relative to it, see `INCLUDE_BLOCK_START`.
+		"""
+		
+		template_parser = template_parser or TemplateParser()
+		self.fragments = template_parser.parse(source, filename=filename) if source is not None else []
+		self.context = context or {}
+		
+		# Compiled render functions by render options, None if compiled mode is disabled
+		self.compiled = None
+		
+		# Fast locals options of compiled mode, see compile()
+		self.fast_locals = False
+		self.scope_keys = None
+		
+		# Concurrent render mode and it's cached plan
+		self.concurrent = False
+		self.concurrent_plan = None
+		
+		# Cache of render_string() results
+		self.render_cache = None
+		
+		# Template should be initialized before use
+		self.initialized = True
+		for fragment in self.fragments:
+			if fragment.is_one_time():
+				self.initialized = False
+				break
+	
+		if self.initialized:
+			self.optimize()
+	
+	def is_initialized(self) -> bool:
+		"""
+		Returns Triue if template was initialized. Template is initialized by 
+		default if it does not contain any one-time init blocks.
+		"""
+		return self.initialized
+	
+	def is_synchronous(self) -> bool:
+		"""
+		Returns True if none of template fragments contains await, so template 
+		can be rendered with .render_string_sync() without event loop.
+		"""
+		
+		for fragment in self.fragments:
+			if fragment.is_async():
+				return False
+		
+		return True
+	
+	def optimize(self) -> int:
+		"""
+		Optimize fragments of initialized template: merge adjacent string 
+		fragments and replace constant render-time expressions with strings. 
+		Render result is not changed. See `optimize_fragments()` for details.
+		
+		Called automatically when template becomes initialized.
+		
+		Returns amount of fragments removed.
+		"""
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		self.fragments, removed = optimize_fragments(self.fragments)
+		
+		if removed:
+			self.fragments_changed()
+		
+		return removed
+	
+	def fragments_changed(self):
+		"""
+		Drop all state derived from the list of fragments: compiled functions 
+		and concurrent render plan. Should be called after modification of 
+		fragments.
+		"""
+		
+		if self.compiled is not None:
+			self.compiled = {}
+		
+		self.concurrent_plan = None
+	
+		if self.render_cache is not None:
+			self.render_cache.clear()
+	
+	def compile(self, fast_locals: bool=False, scope_keys: typing.Iterable[str]=None) -> 'Template':
+		"""
+		Enable compiled render mode for this Template.
+		
+		In compiled mode entire template is generated into single async 
+		function per each combination of render options. Functions are 
+		compiled lazily on first render with given options and reused later. 
+		Compiled functions are dropped after .init() call, because it changes 
+		the list of fragments.
+		
+		`fast_locals` enables compilation of render-time expressions into 
+		functions reading scope variables as fast locals. Names not defined in 
+		context or builtins at compile time are treated as scope variables, 
+		unless `scope_keys` declares expected scope keys. Setting `scope_keys` 
+		enables `fast_locals`. See `compile_fragment_function()`.
+		
+		Returns this template, so call to compile() supports inline execution:
+		```
+		(await Template.from_file('template.thtml').init(init_ok=True)).compile()
+		```
+		"""
+		
+		self.compiled = {}
+		self.fast_locals = fast_locals or scope_keys is not None
+		self.scope_keys = frozenset(scope_keys) if scope_keys is not None else None
+		return self
+	
+	def set_render_cache(self, render_cache: RenderCache=None) -> 'Template':
+		"""
+		Set cache of `render_string()` results. Set to None to disable cache.
+		
+		Render is cached if `cache_key` is passed to `render_string()` or if 
+		cache defines `scope_keys`. Render options are part of the cache key.
+		
+		Returns this template.
+		"""
+		
+		self.render_cache = render_cache
+		return self
+	
+	def set_offload_executor(self, executor: concurrent.futures.Executor=None) -> 'Template':
+		"""
+		Set executor of fragments marked for offloading, see `OFFLOAD_PREFIX`. 
+		Set to None to use default executor of the event loop, which can be 
+		configured with `loop.set_default_executor()`.
+		
+		Returns this template.
+		"""
+		
+		for fragment in iterate_fragments(self.fragments):
+			if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)):
+				fragment.executor = executor
+		
+		return self
+	
+	def set_slow_fragment_threshold(self, threshold: float=0.1) -> 'Template':
+		"""
+		Enable warning about fragments running on event loop longer than 
+		`threshold` seconds per render. Time of awaiting inside of fragment is 
+		not counted. Warning is emitted as SlowFragmentWarning with `warnings` 
+		module. Set to None to disable.
+		
+		Monitored fragments are not inlined in compiled mode.
+		
+		Returns this template.
+		"""
+		
+		for fragment in iterate_fragments(self.fragments):
+			if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)) and not fragment.offload:
+				fragment.slow_threshold = threshold
+				fragment.update_instrumented()
+		
+		self.fragments_changed()
+		return self
 	
-	```
-	{{%
-		f\"""
-		<span>timestamp not is: {myfunc()}</span>
-		\"""
-	%}}
-	```
+	def set_profiling(self, enabled: bool=True, callback: typing.Callable[[FragmentProfile, float, int], None]=None) -> 'Template':
+		"""
+		Enable or disable profiling mode. In profiling mode each expression and 
+		block fragment records call count, cumulative and max wall time and 
+		output size into it's FragmentProfile, see `get_profile_report()`.
+		
+		`callback` is called with `(profile, elapsed, output_size)` after each 
+		evaluation of the fragment, for example to export slow fragments into 
+		metrics.
+		
+		Profiled fragments are not inlined in compiled mode. Enabling profiling 
+		again resets collected statistics.
+		
+		Returns this template.
+		"""
+		
+		for fragment in iterate_fragments(self.fragments):
+			if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)):
+				fragment.profile = FragmentProfile(get_fragment_name(fragment), fragment.get_line_range(), callback) if enabled else None
+				fragment.update_instrumented()
+		
+		self.fragments_changed()
+		return self
 	
-	Syntax of comment blocks:
-	```
-	{{#
-		The following block is comment block and it's contents are removed from the resulting render
+	def get_profile_report(self) -> typing.List[typing.Dict[str, typing.Any]]:
+		"""
+		Returns list of profile statistics of fragments as dicts sorted by 
+		cumulative time, hottest fragments first. See `FragmentProfile.to_dict()`.
+		"""
 		
-		{{%
-			'this value is never used'
-		%}}
-	#}}
-	```
-	"""
+		report = []
+		for fragment in iterate_fragments(self.fragments):
+			if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)) and fragment.profile is not None:
+				report.append(fragment.profile.to_dict())
+		
+		report.sort(key=lambda entry: entry['total_time'], reverse=True)
+		return report
 	
-	__slots__ = (
-		'fragments',
-		'context',
-		'initialized'
-	)
+	def reset_profile(self):
+		"""
+		Reset statistics collected in profiling mode
+		"""
+		
+		for fragment in iterate_fragments(self.fragments):
+			if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)) and fragment.profile is not None:
+				fragment.profile.reset()
 	
-	def __init__(self, source: str, template_parser: TemplateParser=None, context: dict=None):
+	def set_concurrent(self, concurrent: bool=True) -> 'Template':
 		"""
-		Initialize template from the given source and parse it.
+		Enable or disable concurrent render mode for this Template.
 		
-		If given template contains one-time-init code blocks or segments, they 
-		are evaluted with .init() call.
+		In concurrent mode independent expressions are evaluated together and 
+		their coroutines are awaited concurrently with asyncio.gather(), so 
+		render of expressions awaiting separate backends takes the maximum of 
+		their latencies instead of the sum. Output order is not changed. 
+		Expressions are independent if they do not read or write names written 
+		by each other, blocks act as barriers. See `plan_concurrent_fragments()`.
 		
-		`template_parser` defines default aprsed to use for this Template. In 
-		case oof None, default configuration is used.
+		Expressions are expected to have no side effects visible to other 
+		expressions except names they assign. Concurrent mode has priority over 
+		compiled mode.
 		
-		`context` defines global context to use in this template. If it is not 
-		set, new context is created for the template.
+		Returns this template.
 		"""
 		
-		template_parser = template_parser or TemplateParser()
-		self.fragments = template_parser.parse(source) if source is not None else []
-		self.context = context or {}
+		self.concurrent = concurrent
+		self.concurrent_plan = None
+		return self
+	
+	def get_concurrent_plan(self) -> typing.List[typing.Tuple[typing.List[TemplateFragment], bool]]:
+		"""
+		Returns cached concurrent render plan of the template
+		"""
 		
-		# Template should be initialized before use
-		self.initialized = True
-		for fragment in self.fragments:
-			if fragment.is_one_time():
-				self.initialized = False
-				break
+		if self.concurrent_plan is None:
+			self.concurrent_plan = plan_concurrent_fragments(self.fragments)
+		
+		return self.concurrent_plan
 	
-	def is_initialized(self) -> bool:
+	async def render_concurrent(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> typing.AsyncGenerator[str, None]:
 		"""
-		Returns Triue if template was initialized. Template is initialized by 
-		default if it does not contain any one-time init blocks.
+		Render given template in concurrent mode using generator over 
+		fragments. Output of each group of independent fragments is yielded 
+		after all of them are complete.
+		
+		Arguments match `render_generator()`.
+		
+		Requires call to .init() if template was not initialized.
 		"""
-		return self.initialized
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		context = self.context
+		
+		for fragments, concurrent in self.get_concurrent_plan():
+			if not concurrent:
+				fragment = fragments[0]
+				value = fragment.evaluate(context, (scope if not wrap_scope else wrap_fragment_scope(fragment, scope)))
+				if asyncio.iscoroutine(value):
+					value = await value
+				
+				value = format_fragment_value(fragment, value, strip_string, none_ok)
+				if value is not None:
+					yield value
+				continue
+			
+			values = []
+			try:
+				for fragment in fragments:
+					values.append(fragment.evaluate(context, (scope if not wrap_scope else wrap_fragment_scope(fragment, scope))))
+			except BaseException:
+				# Coroutines were never started
+				for value in values:
+					if asyncio.iscoroutine(value):
+						close_coroutine(value)
+				raise
+			
+			pending = [ i for i, value in enumerate(values) if asyncio.iscoroutine(value) ]
+			if len(pending) == 1:
+				values[pending[0]] = await values[pending[0]]
+			elif len(pending) > 1:
+				tasks = [ asyncio.ensure_future(values[i]) for i in pending ]
+				try:
+					results = await asyncio.gather(*tasks)
+				except BaseException:
+					for task in tasks:
+						task.cancel()
+					raise
+				
+				for i, result in zip(pending, results):
+					values[i] = result
+			
+			for fragment, value in zip(fragments, values):
+				value = format_fragment_value(fragment, value, strip_string, none_ok)
+				if value is not None:
+					yield value
 	
-	async def init(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, init_ok: bool=False, wrap_scope: bool=False) -> 'Template':
+	def get_compiled(self, generator: bool, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, synchronous: bool=False) -> typing.Callable:
+		"""
+		Returns compiled render function for the given render options. See 
+		`compile_render_function()` for details.
+		
+		Requires call to .compile() and .init() if template was not 
+		initialized.
+		"""
+		
+		if self.compiled is None:
+			raise RuntimeError('Template compiled mode is disabled')
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		key = (generator, bool(strip_string), bool(none_ok), bool(wrap_scope), bool(synchronous))
+		function = self.compiled.get(key)
+		if function is None:
+			function = compile_render_function(self.fragments, *key, context=self.context, fast_locals=self.fast_locals, scope_keys=self.scope_keys)
+			self.compiled[key] = function
+		
+		return function
+	
+	async def init(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, init_ok: bool=False, wrap_scope: bool=False, init_state: InitState=None) -> 'Template':
 		"""
 		Performs initialization of the Template and evaluates all one-time-init 
 		blocks.
@@ -816,7 +4138,17 @@ class Template:
 		nothing if template is already initialized.
 		
 		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
-		fragment render.
+		fragment render. Fragments that may write scope receive copy-on-write 
+		ScopeOverlay, others receive scope as is.
+		
+		`init_state` enables incremental initialization. Results of one-time 
+		fragments stored in `init_state` by initialization of the previous 
+		version of this template are reused for leading one-time fragments 
+		with unchanged source, only the first changed fragment and fragments 
+		after it are evaluated. Context and scope changes of reused fragments 
+		are applied to context of this template, which should be fresh or the 
+		one previous version was initialized with. `init_state` is updated 
+		with new results.
 		
 		After calling .init(), string representation of template will change and 
 		all one-time init fragments will be replaced with string fragments or 
@@ -824,48 +4156,107 @@ class Template:
 		"""
 		
 		if self.initialized:
-			if init_ok:
+			if not init_ok:
+				raise RuntimeError('Template already initialized')
+		
+			# Template without one-time fragments still drops previous results
+			if init_state is None:
 				return self
-			raise RuntimeError('Template already initialized')
+		
+		reused = 0
+		if init_state is not None:
+			keys = [ get_one_time_key(fragment) for fragment in self.fragments if fragment.is_one_time() ]
+			options = (strip_string, none_ok, wrap_scope)
+			reused = init_state.restore(keys, options, self.context, None if wrap_scope else scope)
+			
+			results = []
+			changes = []
 		
 		to_remove = []
+		one_time_index = -1
 		for i, fragment in enumerate(self.fragments):
 			if fragment.is_one_time():
+				one_time_index += 1
+				
+				if init_state is not None:
+					if one_time_index < reused:
+						result = init_state.results[one_time_index]
+						results.append(result)
+						changes.append(init_state.changes[one_time_index])
+						
+						if result is None:
+							to_remove.append(i)
+						else:
+							self.fragments[i] = result
+						continue
+					
+					# Copies are kept only until changes are collected
+					before_context = dict(self.context)
+					before_scope = dict(scope) if scope is not None and not wrap_scope else None
+				
 				if isinstance(fragment, BlockTemplateFragment):
 					
 					to_remove.append(i)
-					await fragment.render(context=self.context, scope=(scope if not wrap_scope else dict(scope or {})))
+					await fragment.render(context=self.context, scope=(scope if not wrap_scope else wrap_fragment_scope(fragment, scope)))
+					
+					if init_state is not None:
+						changes.append((get_dict_changes(before_context, self.context), get_dict_changes(before_scope, scope) if before_scope is not None else None))
+						results.append(None)
 					
 				elif isinstance(fragment, ExpressionTemplateFragment):
 					
-					value = await fragment.render(context=self.context, scope=(scope if not wrap_scope else dict(scope or {})))
+					value = await fragment.render(context=self.context, scope=(scope if not wrap_scope else wrap_fragment_scope(fragment, scope)))
+					
+					if init_state is not None:
+						changes.append((get_dict_changes(before_context, self.context), get_dict_changes(before_scope, scope) if before_scope is not None else None))
 					if not none_ok and value is None:
-						raise RuntimeError(f'Expression returned None at {fragment.evaluable.co_filename}')
+						raise RuntimeError(f'Expression returned None at {get_fragment_name(fragment)}')
 					
 					# Remove self if None
 					if value is None:
 						to_remove.append(i)
+						if init_state is not None:
+							results.append(None)
 						continue
 					
 					# To string
-					value = str(value)
+					value = escape_html(value) if fragment.escape else str(value)
 					
 					# Remove empty
 					if strip_string:
 						value = value.strip()
 						if len(value) == 0:
 							to_remove.append(i)
+							if init_state is not None:
+								results.append(None)
 							continue
 					
 					# Insert string instead
 					self.fragments[i] = StringTemplateFragment(value)
+					if init_state is not None:
+						results.append(self.fragments[i])
 					
 				else:
 					raise RuntimeError(f'Unexpected type of one-time init fragment {type(fragment)}')
 		
 		to_remove = set(to_remove)
 		self.fragments[:] = [ f for i, f in enumerate(self.fragments) if i not in to_remove ]
+		
+		if init_state is not None:
+			init_state.keys = keys
+			init_state.results = results
+			init_state.changes = changes
+			init_state.options = options
+			init_state.context = self.context
+		
+		if self.initialized:
+			return self
+		
 		self.initialized = True
+		
+		self.fragments_changed()
+		self.optimize()
+		
 		return self
 	
 	async def render_generator(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> typing.AsyncGenerator[str, None]:
@@ -877,70 +4268,309 @@ class Template:
 		to each one-time block or expression wrapped into dict(), as locals. Set 
 		to None to run code without locals().
 		
-		`strip_string` sets enable strip result of ExpressionTemplateFragment 
-		evaluation.
+		`strip_string` sets enable strip result of ExpressionTemplateFragment 
+		evaluation.
+		
+		`none_ok` sets ignore mode for None result of the expression. If set to 
+		True, None result is not used in future template rendering.
+		
+		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
+		fragment render. Fragments that may write scope receive copy-on-write 
+		ScopeOverlay, others receive scope as is.
+		
+		Requires call to .init() if template was not initialized.
+		"""
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		if self.concurrent:
+			async for value in self.render_concurrent(scope, strip_string, none_ok, wrap_scope):
+				yield value
+			return
+		
+		if self.compiled is not None:
+			async for value in self.get_compiled(True, strip_string, none_ok, wrap_scope)(self.context, scope):
+				yield value
+			return
+		
+		context = self.context
+		
+		for fragment in self.fragments:
+			# Coroutine is created only for fragments returning it
+			value = fragment.evaluate(context, (scope if not wrap_scope else wrap_fragment_scope(fragment, scope)))
+			if asyncio.iscoroutine(value):
+				value = await value
+			
+			if isinstance(fragment, BlockTemplateFragment):
+				continue
+				
+			if not none_ok and value is None:
+				raise RuntimeError(f'Expression returned None at {get_fragment_name(fragment)}')
+				
+			# Remove self if None
+			if value is None:
+				continue
+				
+			# To string
+			value = escape_html(value) if fragment.escape else str(value)
+				
+			# Remove empty
+			if strip_string:
+				value = value.strip()
+				if len(value) == 0:
+					continue
+				
+			# Insert string instead
+			yield value
+	
+	async def render_string(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, cache_key: typing.Hashable=None) -> str:
+		"""
+		Render given template into string from fragments. Returns string 
+		representation of entire template rendered.
+		
+		`scope` defines the arguments dict with arguemtns that are uniquly passed 
+		to each one-time block or expression wrapped into dict(), as locals. Set 
+		to None to run code without locals().
+		
+		`strip_string` sets enable strip result of ExpressionTemplateFragment 
+		evaluation.
+		
+		`none_ok` sets ignore mode for None result of the expression. If set to 
+		True, None result is not used in future template rendering.
+		
+		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
+		fragment render. Fragments that may write scope receive copy-on-write 
+		ScopeOverlay, others receive scope as is.
+		
+		`cache_key` defines key of the result in render cache, see 
+		`set_render_cache()`. Ignored if render cache is not set.
+		
+		Requires call to .init() if template was not initialized.
+		"""
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		if self.render_cache is not None:
+			key = self.render_cache.make_key(scope, cache_key, (strip_string, none_ok, wrap_scope))
+			if key is not None:
+				return await self.render_cache.get(key, lambda: self.render_string_uncached(scope, strip_string, none_ok, wrap_scope))
+		
+		return await self.render_string_uncached(scope, strip_string, none_ok, wrap_scope)
+	
+	async def render_string_uncached(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> str:
+		"""
+		Render given template into string bypassing render cache. Arguments 
+		match `render_string()`.
+		
+		Requires call to .init() if template was not initialized.
+		"""
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		if self.concurrent:
+			return ''.join([ value async for value in self.render_concurrent(scope, strip_string, none_ok, wrap_scope) ])
+		
+		if self.compiled is not None:
+			return await self.get_compiled(False, strip_string, none_ok, wrap_scope)(self.context, scope)
+		
+		context = self.context
+		result = []
+		
+		# Same as render_generator() without async generator overhead
+		for fragment in self.fragments:
+			value = fragment.evaluate(context, (scope if not wrap_scope else wrap_fragment_scope(fragment, scope)))
+			if asyncio.iscoroutine(value):
+				value = await value
+			
+			if isinstance(fragment, BlockTemplateFragment):
+				continue
+			
+			if not none_ok and value is None:
+				raise RuntimeError(f'Expression returned None at {get_fragment_name(fragment)}')
+			
+			if value is None:
+				continue
+			
+			value = escape_html(value) if fragment.escape else str(value)
+			
+			if strip_string:
+				value = value.strip()
+				if len(value) == 0:
+					continue
+			
+			result.append(value)
+		
+		return ''.join(result)
+	
+	def render_generator_sync(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> typing.Generator[str, None, None]:
+		"""
+		Render given template using generator over fragments without event loop. 
+		Returns string representation of each fragment rendered.
+		
+		Arguments match `render_generator()`.
+		
+		Requires template to be synchronous, see `is_synchronous()`. If 
+		expression returns coroutine, raises RuntimeError.
+		
+		Requires call to .init() if template was not initialized.
+		"""
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		if not self.is_synchronous():
+			raise RuntimeError('Template contains async fragments, use async render')
+		
+		if self.compiled is not None:
+			yield from self.get_compiled(True, strip_string, none_ok, wrap_scope, True)(self.context, scope)
+			return
+		
+		context = self.context
+		
+		for fragment in self.fragments:
+			value = fragment.evaluate(context, (scope if not wrap_scope else wrap_fragment_scope(fragment, scope)))
+			if asyncio.iscoroutine(value):
+				close_coroutine(value)
+				raise RuntimeError(f'Expression returned coroutine at {get_fragment_name(fragment)}, use async render')
+			
+			if isinstance(fragment, BlockTemplateFragment):
+				continue
+			
+			if not none_ok and value is None:
+				raise RuntimeError(f'Expression returned None at {get_fragment_name(fragment)}')
+			
+			if value is None:
+				continue
+			
+			value = escape_html(value) if fragment.escape else str(value)
+			
+			if strip_string:
+				value = value.strip()
+				if len(value) == 0:
+					continue
+			
+			yield value
+	
+	def render_string_sync(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> str:
+		"""
+		Render given template into string from fragments without event loop. 
+		Returns string representation of entire template rendered.
+		
+		Arguments match `render_string()`.
+		
+		Requires template to be synchronous, see `is_synchronous()`. If 
+		expression returns coroutine, raises RuntimeError.
+		
+		Requires call to .init() if template was not initialized.
+		"""
+		
+		if self.compiled is not None:
+			if not self.initialized:
+				raise RuntimeError('Template not initialized')
+			
+			if not self.is_synchronous():
+				raise RuntimeError('Template contains async fragments, use async render')
+			
+			return self.get_compiled(False, strip_string, none_ok, wrap_scope, True)(self.context, scope)
+		
+		return ''.join(self.render_generator_sync(scope, strip_string, none_ok, wrap_scope))
+	
+	def get_batch_renderer(self, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, synchronous: bool=False) -> typing.Callable:
+		"""
+		Returns function rendering this template into string for the given 
+		render options, accepting `(context, scope)` arguments. Used by 
+		batch render to resolve per-template work once per batch.
+		
+		Compiled function is used even if compiled mode is not enabled, 
+		because it's generation cost is amortized by the batch. In concurrent 
+		mode, concurrent render is used.
+		"""
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		if synchronous and not self.is_synchronous():
+			raise RuntimeError('Template contains async fragments, use async render')
+		
+		if self.concurrent and not synchronous:
+			return lambda context, scope: self.render_string_uncached(scope, strip_string, none_ok, wrap_scope)
+		
+		if self.compiled is not None:
+			return self.get_compiled(False, strip_string, none_ok, wrap_scope, synchronous)
+		
+		return compile_render_function(self.fragments, False, strip_string, none_ok, wrap_scope, synchronous)
+	
+	async def render_many(self, scopes: typing.Union[typing.Iterable[dict], typing.AsyncIterable[dict]], strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, concurrency: int=1) -> typing.AsyncGenerator[str, None]:
+		"""
+		Render given template into string for each scope of `scopes`. Returns 
+		async generator of results in order of scopes.
+		
+		Per-template work is done once per batch, see `get_batch_renderer()`. 
+		Render cache is not used.
+		
+		`scopes` defines iterable or async iterable of scopes. Scopes are 
+		consumed lazily, so results are not held in memory.
 		
-		`none_ok` sets ignore mode for None result of the expression. If set to 
-		True, None result is not used in future template rendering.
+		`concurrency` defines maximal amount of renders awaited concurrently. 
+		Only up to `concurrency` results are held in memory.
 		
-		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
-		fragment render.
+		Other arguments match `render_string()`.
 		
 		Requires call to .init() if template was not initialized.
 		"""
 		
-		if not self.initialized:
-			raise RuntimeError('Template not initialized')
+		render = self.get_batch_renderer(strip_string, none_ok, wrap_scope)
+		context = self.context
 		
-		for fragment in self.fragments:
-			if isinstance(fragment, BlockTemplateFragment):
-				
-				await fragment.render(context=self.context, scope=(scope if not wrap_scope else dict(scope or {})))
-				
+		if concurrency <= 1:
+			if hasattr(scopes, '__aiter__'):
+				async for scope in scopes:
+					yield await render(context, scope)
 			else:
-				
-				value = await fragment.render(context=self.context, scope=(scope if not wrap_scope else dict(scope or {})))
-				if not none_ok and value is None:
-					raise RuntimeError(f'Expression returned None at {fragment.evaluable.co_filename}')
-				
-				# Remove self if None
-				if value is None:
-					continue
-				
-				# To string
-				value = str(value)
-				
-				# Remove empty
-				if strip_string:
-					value = value.strip()
-					if len(value) == 0:
-						continue
-				
-				# Insert string instead
-				yield value
+				for scope in scopes:
+					yield await render(context, scope)
+			return
+		
+		tasks = collections.deque()
+		try:
+			if hasattr(scopes, '__aiter__'):
+				async for scope in scopes:
+					tasks.append(asyncio.ensure_future(render(context, scope)))
+					if len(tasks) >= concurrency:
+						yield await tasks.popleft()
+			else:
+				for scope in scopes:
+					tasks.append(asyncio.ensure_future(render(context, scope)))
+					if len(tasks) >= concurrency:
+						yield await tasks.popleft()
+			
+			while len(tasks):
+				yield await tasks.popleft()
+		finally:
+			# Generator closed or render failed
+			for task in tasks:
+				task.cancel()
 	
-	async def render_string(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> str:
+	def render_many_sync(self, scopes: typing.Iterable[dict], strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> typing.Generator[str, None, None]:
 		"""
-		Render given template into string from fragments. Returns string 
-		representation of entire template rendered.
-		
-		`scope` defines the arguments dict with arguemtns that are uniquly passed 
-		to each one-time block or expression wrapped into dict(), as locals. Set 
-		to None to run code without locals().
-		
-		`strip_string` sets enable strip result of ExpressionTemplateFragment 
-		evaluation.
+		Render given template into string for each scope of `scopes` without 
+		event loop. Returns generator of results in order of scopes.
 		
-		`none_ok` sets ignore mode for None result of the expression. If set to 
-		True, None result is not used in future template rendering.
+		Arguments match `render_many()`.
 		
-		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
-		fragment render.
+		Requires template to be synchronous, see `is_synchronous()`.
 		
 		Requires call to .init() if template was not initialized.
 		"""
 		
-		return ''.join([ f async for f in self.render_generator(scope, strip_string, none_ok, wrap_scope) ])
+		render = self.get_batch_renderer(strip_string, none_ok, wrap_scope, True)
+		context = self.context
+		
+		for scope in scopes:
+			yield render(context, scope)
 	
 	async def render_file(self, filename: str, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> None:
 		"""
@@ -957,7 +4587,8 @@ class Template:
 		True, None result is not used in future template rendering.
 		
 		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
-		fragment render.
+		fragment render. Fragments that may write scope receive copy-on-write 
+		ScopeOverlay, others receive scope as is.
 		
 		Requires call to .init() if template was not initialized.
 		"""
@@ -966,11 +4597,80 @@ class Template:
 			async for f in self.render_generator(scope, strip_string, none_ok, wrap_scope):
 				file.write(f)
 	
-	def from_file(file: typing.Union[str, typing.TextIO], template_parser: TemplateParser=None, context: dict=None) -> 'Template':
+	async def render_stream(self, writer: typing.Any, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, chunk_size: int=DEFAULT_CHUNK_SIZE, flush_interval: float=None, encoding: str='utf-8') -> int:
+		"""
+		Render given template into stream writer or ASGI send callable, 
+		coalescing rendered fragments into chunks. See `ChunkWriter`.
+		
+		`writer` defines output: object with `write(data: bytes)` and optional 
+		`drain()` coroutine, like asyncio.StreamWriter, or ASGI `send` callable. 
+		For ASGI, response start message should be sent before the call, last 
+		body message is sent with `more_body=False`.
+		
+		`chunk_size` defines amount of encoded bytes buffered before write.
+		
+		`flush_interval` defines maximal time in seconds rendered output is 
+		buffered. Buffer is also flushed if awaiting expression takes longer 
+		than remaining time. Set to None to flush by size only.
+		
+		`encoding` defines encoding of written bytes.
+		
+		Other arguments match `render_generator()`.
+		
+		Returns amount of bytes written.
+		
+		Requires call to .init() if template was not initialized.
+		"""
+		
+		if not self.initialized:
+			raise RuntimeError('Template not initialized')
+		
+		stream = ChunkWriter(writer, chunk_size, flush_interval, encoding)
+		
+		if self.concurrent or self.compiled is not None:
+			async for value in self.render_generator(scope, strip_string, none_ok, wrap_scope):
+				await stream.write(value)
+			
+			await stream.close()
+			return stream.written
+		
+		context = self.context
+		
+		for fragment in self.fragments:
+			value = fragment.evaluate(context, (scope if not wrap_scope else wrap_fragment_scope(fragment, scope)))
+			if asyncio.iscoroutine(value):
+				value = await stream.wait(value)
+			
+			if isinstance(fragment, BlockTemplateFragment):
+				continue
+			
+			if not none_ok and value is None:
+				raise RuntimeError(f'Expression returned None at {get_fragment_name(fragment)}')
+			
+			if value is None:
+				continue
+			
+			value = escape_html(value) if fragment.escape else str(value)
+			
+			if strip_string:
+				value = value.strip()
+				if len(value) == 0:
+					continue
+			
+			await stream.write(value)
+		
+		await stream.close()
+		return stream.written
+	
+	def from_file(file: typing.Union[str, typing.TextIO], template_parser: TemplateParser=None, context: dict=None, memory_map: bool=False) -> 'Template':
 		"""
 		Load and parse template from given `file`. File can be either fileIO 
 		wrapper or string file path.
 		
+		`memory_map` enables loading of large files without reading them into 
+		memory, see `TemplateParser.parse_file()`. File object should be 
+		opened by path.
+		
 		Example:
 		```
 		# Load from file object
@@ -981,11 +4681,17 @@ class Template:
 		```
 		"""
 		
+		if memory_map:
+			filename = file if isinstance(file, str) else file.name
+			return Template.from_fragments((template_parser or TemplateParser()).parse_file(filename), context)
+		
 		if isinstance(file, str):
 			with open(file, 'r', encoding='utf-8') as file_obj:
-				return Template(file_obj.read(), template_parser, context)
+				return Template(file_obj.read(), template_parser, context, file)
 		
-		return Template(file.read(), template_parser, context)
+		# File objects opened by path know it, includes are resolved relative to it
+		filename = getattr(file, 'name', None)
+		return Template(file.read(), template_parser, context, filename if isinstance(filename, str) else None)
 	
 	def from_string(source: str, template_parser: TemplateParser=None, context: dict=None) -> 'Template':
 		"""
@@ -1001,7 +4707,7 @@ class Template:
 		"""
 		
 		template = Template(None, None, context)
-		template.fragments = fragments
+		template.fragments = list(fragments)
 		
 		template.initialized = True
 		for fragment in template.fragments:
@@ -1009,6 +4715,9 @@ class Template:
 				template.initialized = False
 				break
 		
+		if template.initialized:
+			template.optimize()
+		
 		return template
 	
 	def __str__(self):
@@ -1018,6 +4727,449 @@ class Template:
 		return ('\n' if self.template_parser.strip_string else '').join([ str(f) for f in self.fragments ])
 
 
+# inotify event masks, see inotify(7)
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+
+# Events of watched directory that may change template file
+INOTIFY_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+# struct inotify_event header: wd, mask, cookie, len
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+	"""
+	Minimal ctypes wrapper over linux inotify API watching directories
+	"""
+	
+	__slots__ = (
+		'libc',
+		'fd',
+		'directories'
+	)
+	
+	def __init__(self):
+		"""
+		Create inotify instance. Raises OSError if inotify is not available.
+		"""
+		
+		if not sys.platform.startswith('linux'):
+			raise OSError('inotify is not available on this platform')
+		
+		self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+		self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self.fd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno))
+		
+		# Watch descriptor -> directory
+		self.directories = {}
+	
+	def add_directory(self, directory: str) -> int:
+		"""
+		Start watching the given directory. Returns watch descriptor or raises 
+		OSError.
+		"""
+		
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), INOTIFY_MASK)
+		if wd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno), directory)
+		
+		self.directories[wd] = directory
+		return wd
+	
+	def remove_directory(self, wd: int):
+		"""
+		Stop watching directory with the given watch descriptor
+		"""
+		
+		if self.directories.pop(wd, None) is not None:
+			self.libc.inotify_rm_watch(self.fd, wd)
+	
+	def read(self, timeout: float) -> typing.Optional[typing.List[typing.Tuple[str, int]]]:
+		"""
+		Wait up to `timeout` seconds for events and return list of (path, mask) 
+		for each event. Returns None if event queue overflowed and any file may 
+		be changed.
+		"""
+		
+		readable, _, _ = select.select([ self.fd ], [], [], timeout)
+		if not readable:
+			return []
+		
+		try:
+			data = os.read(self.fd, 64 * 1024)
+		except BlockingIOError:
+			return []
+		
+		events = []
+		offset = 0
+		while offset + INOTIFY_EVENT.size <= len(data):
+			wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+			offset += INOTIFY_EVENT.size
+			name = data[offset : offset + length].rstrip(b'\0')
+			offset += length
+			
+			if mask & IN_Q_OVERFLOW:
+				return None
+			
+			directory = self.directories.get(wd)
+			if directory is None:
+				continue
+			
+			if mask & IN_IGNORED:
+				# Directory removed, watch is gone
+				del self.directories[wd]
+			
+			events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+		
+		return events
+	
+	def close(self):
+		"""
+		Close inotify file descriptor
+		"""
+		
+		if self.fd >= 0:
+			os.close(self.fd)
+			self.fd = -1
+
+
+class FileWatcher:
+	"""
+	Service that watches many files from single background thread and 
+	notifies registered callbacks when watched file changes.
+	
+	Uses inotify when it is available and falls back to polling file 
+	modification time, size and inode every `interval` seconds. Bursts of 
+	changes are debounced, callback is called once after file stays unchanged 
+	for `debounce` seconds.
+	
+	Callbacks are called from watcher thread with single argument, changed 
+	file name. Bound methods are referenced weakly, so watching does not keep 
+	their objects alive.
+	
+	Example:
+	```
+	watcher = FileWatcher()
+	
+	tmpl = FileWatcherTemplate('mytemplate.txt', watcher=watcher)
+	```
+	"""
+	
+	__slots__ = (
+		'interval',
+		'debounce',
+		'use_inotify',
+		'callbacks',
+		'stats',
+		'pending',
+		'lock',
+		'thread',
+		'stopped',
+		'inotify',
+		'watch_descriptors',
+		'polled'
+	)
+	
+	def __init__(self, interval: float=1.0, debounce: float=0.1, use_inotify: bool=True):
+		"""
+		Create watcher. Background thread is started on first registered 
+		file.
+		
+		`interval` defines period of polling in seconds.
+		
+		`debounce` defines time in seconds file should stay unchanged before 
+		callbacks are called.
+		
+		`use_inotify` enables inotify on linux. If inotify can not be used, 
+		watcher falls back to polling.
+		"""
+		
+		self.interval    = interval
+		self.debounce    = debounce
+		self.use_inotify = use_inotify
+		
+		# filename -> list of callbacks or weak methods
+		self.callbacks = {}
+		
+		# filename -> last seen (mtime, size, inode) or None if file is missing
+		self.stats = {}
+		
+		# filename -> time when callbacks should be called
+		self.pending = {}
+		
+		self.lock    = threading.Lock()
+		self.thread  = None
+		self.stopped = threading.Event()
+		
+		self.inotify = None
+		
+		# directory -> inotify watch descriptor
+		self.watch_descriptors = {}
+		
+		# Files that are not covered with inotify and should be polled
+		self.polled = set()
+	
+	def add(self, filename: str, callback: typing.Callable[[str], None]):
+		"""
+		Register `callback` to be called when file changes
+		"""
+		
+		filename = os.path.abspath(filename)
+		reference = weakref.WeakMethod(callback) if inspect.ismethod(callback) else callback
+		
+		with self.lock:
+			self.callbacks.setdefault(filename, []).append(reference)
+			
+			if filename not in self.stats:
+				self.stats[filename] = stat_file(filename)
+				
+				if not self.watch_directory(os.path.dirname(filename)):
+					self.polled.add(filename)
+		
+		self.start()
+	
+	def remove(self, filename: str, callback: typing.Callable[[str], None]=None):
+		"""
+		Unregister `callback` or all callbacks of the file if `callback` is 
+		None
+		"""
+		
+		filename = os.path.abspath(filename)
+		
+		with self.lock:
+			callbacks = self.callbacks.get(filename)
+			if callbacks is None:
+				return
+			
+			if callback is not None:
+				for i, c in enumerate(callbacks):
+					if dereference_callback(c) == callback:
+						del callbacks[i]
+						break
+			
+			if callback is None or len(callbacks) == 0:
+				self.forget(filename)
+	
+	def forget(self, filename: str):
+		"""
+		Remove all state of the watched file. Requires lock to be held.
+		"""
+		
+		self.callbacks.pop(filename, None)
+		self.stats.pop(filename, None)
+		self.pending.pop(filename, None)
+		self.polled.discard(filename)
+	
+	def watch_directory(self, directory: str) -> bool:
+		"""
+		Start watching directory with inotify. Returns False if inotify can 
+		not be used. Requires lock to be held.
+		"""
+		
+		if not self.use_inotify:
+			return False
+		
+		if directory in self.watch_descriptors:
+			return True
+		
+		try:
+			if self.inotify is None:
+				self.inotify = Inotify()
+			
+			self.watch_descriptors[directory] = self.inotify.add_directory(directory)
+		except (OSError, AttributeError):
+			return False
+		
+		return True
+	
+	def start(self):
+		"""
+		Start background thread if it is not running
+		"""
+		
+		with self.lock:
+			if self.thread is not None and self.thread.is_alive():
+				return
+			
+			self.stopped.clear()
+			self.thread = threading.Thread(target=self.run, name='yatplt-file-watcher', daemon=True)
+			self.thread.start()
+	
+	def stop(self):
+		"""
+		Stop background thread and release inotify
+		"""
+		
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+		
+		with self.lock:
+			if self.inotify is not None:
+				self.inotify.close()
+				self.inotify = None
+			self.watch_descriptors.clear()
+			self.polled.update(self.stats)
+	
+	def run(self):
+		"""
+		Background thread body
+		"""
+		
+		next_poll = time.monotonic()
+		
+		while not self.stopped.is_set():
+			now = time.monotonic()
+			
+			with self.lock:
+				timeout = next_poll - now
+				if len(self.pending):
+					timeout = min(timeout, min(self.pending.values()) - now)
+				
+				inotify = self.inotify
+			
+			timeout = max(0.0, min(timeout, self.interval))
+			
+			if inotify is not None:
+				try:
+					events = inotify.read(timeout)
+				except (OSError, ValueError):
+					# Closed by stop()
+					events = []
+				
+				with self.lock:
+					if events is None:
+						self.schedule(self.stats)
+					else:
+						self.schedule(path for path, _ in events if path in self.stats)
+						
+						# Directory removed, fall back to polling it's files
+						for path, mask in events:
+							if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and path in self.watch_descriptors:
+								inotify.remove_directory(self.watch_descriptors.pop(path))
+								self.polled.update(f for f in self.stats if os.path.dirname(f) == path)
+			else:
+				self.stopped.wait(timeout)
+			
+			now = time.monotonic()
+			if now >= next_poll:
+				self.poll()
+				next_poll = now + self.interval
+			
+			self.flush(now)
+	
+	def schedule(self, filenames: typing.Iterable[str]):
+		"""
+		Delay notification of the given files by `debounce`. Requires lock to 
+		be held.
+		"""
+		
+		deadline = time.monotonic() + self.debounce
+		for filename in filenames:
+			self.pending[filename] = deadline
+	
+	def poll(self):
+		"""
+		Check stat of polled files and schedule notification for changed
+		"""
+		
+		with self.lock:
+			polled = list(self.polled)
+		
+		stats = [ (filename, stat_file(filename)) for filename in polled ]
+		
+		with self.lock:
+			changed = []
+			for filename, stat in stats:
+				# File may be removed while stat was running
+				if filename in self.stats and self.stats[filename] != stat:
+					self.stats[filename] = stat
+					changed.append(filename)
+			
+			self.schedule(changed)
+	
+	def flush(self, now: float):
+		"""
+		Call callbacks of files with expired debounce deadline
+		"""
+		
+		with self.lock:
+			ready = [ filename for filename, deadline in self.pending.items() if deadline <= now ]
+			
+			calls = []
+			for filename in ready:
+				del self.pending[filename]
+				
+				callbacks = self.callbacks.get(filename)
+				if callbacks is None:
+					continue
+				
+				# Drop dead weak methods
+				alive = [ (c, dereference_callback(c)) for c in callbacks ]
+				callbacks[:] = [ c for c, f in alive if f is not None ]
+				calls.extend((filename, f) for _, f in alive if f is not None)
+				
+				if len(callbacks) == 0:
+					self.forget(filename)
+		
+		for filename, callback in calls:
+			callback(filename)
+
+
+def stat_file(filename: str) -> typing.Optional[typing.Tuple[int, int, int]]:
+	"""
+	Returns (mtime, size, inode) of the file or None if it does not exist
+	"""
+	
+	try:
+		stat = os.stat(filename)
+	except OSError:
+		return None
+	
+	return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def dereference_callback(reference) -> typing.Optional[typing.Callable]:
+	"""
+	Returns callback from weak method reference or callback itself
+	"""
+	
+	if isinstance(reference, weakref.WeakMethod):
+		return reference()
+	
+	return reference
+
+
+# Shared instance returned by default_file_watcher()
+_default_file_watcher = None
+
+
+def default_file_watcher() -> FileWatcher:
+	"""
+	Returns process-wide FileWatcher instance with default settings
+	"""
+	
+	global _default_file_watcher
+	if _default_file_watcher is None:
+		_default_file_watcher = FileWatcher()
+	
+	return _default_file_watcher
+
+
 class FileWatcherTemplate:
 	"""
 	Class that defines cached Template wrapper based on filesystem template 
@@ -1026,19 +5178,38 @@ class FileWatcherTemplate:
 	
 	Interfaces all render methods from base template class and supports 
 	additional up_to_date flag.
+	
+	If `watcher` is set, file changes are tracked by shared FileWatcher and 
+	render only checks in-memory stale flag instead of calling stat on file.
+	
+	Changed file is reloaded incrementally: code objects of fragments with 
+	unchanged source are reused and one-time fragments are evaluated again 
+	only starting from the first changed one, see `Template.init()`.
+	
+	Files included by the template are tracked too, change of any of them 
+	reloads the template.
 	"""
 	
 	__slots__ = (
 		'filename',
 		'timestamp',
+		'dependencies',
 		'template',
+		'fragment_code',
+		'init_state',
 		'template_lock',
 		'template_parser',
 		'context',
 		'init_scope',
 		'init_strip_string',
 		'init_none_ok',
-		'init_wrap_scope'
+		'init_wrap_scope',
+		'compiled',
+		'concurrent',
+		'render_cache',
+		'watcher',
+		'stale',
+		'__weakref__'
 	)
 	
 	def __init__(
@@ -1049,18 +5220,40 @@ class FileWatcherTemplate:
 			init_scope: dict=None, 
 			init_strip_string: bool=True,
 			init_none_ok: bool=False,
-			init_wrap_scope: bool=False
+			init_wrap_scope: bool=False,
+			compiled: bool=False,
+			concurrent: bool=False,
+			render_cache: RenderCache=None,
+			watcher: FileWatcher=None
 		):
 		"""
 		Create shadow template without loading. Loading is performed with 
 		manual call to `update()` or on `.render()` call.
 		
 		`init_` parameters are used to define arguments for late `.init()` call.
+		
+		`compiled` enables compiled render mode for each loaded template, see 
+		`Template.compile()`.
+		
+		`concurrent` enables concurrent render mode for each loaded template, 
+		see `Template.set_concurrent()`.
+		
+		`render_cache` defines cache of `render_string()` results, see 
+		`Template.set_render_cache()`. Cache is cleared when template is 
+		reloaded.
+		
+		`watcher` defines FileWatcher used to track file changes. If it is not 
+		set, file modification time is checked on each render.
 		"""
 		
 		self.filename        = filename
 		self.timestamp       = None
+		# Included file -> it's (mtime, size, inode) when template was loaded
+		self.dependencies    = {}
 		self.template        = None
+		# Code of fragments and one-time results of the loaded template for incremental reload, see collect_fragment_code()
+		self.fragment_code   = None
+		self.init_state      = None
 		# Lock required to update template from disk
 		self.template_lock   = asyncio.Lock()
 		self.template_parser = template_parser or TemplateParser()
@@ -1069,15 +5262,64 @@ class FileWatcherTemplate:
 		self.init_strip_string = init_strip_string
 		self.init_none_ok      = init_none_ok
 		self.init_wrap_scope   = init_wrap_scope
+		self.compiled          = compiled
+		self.concurrent        = concurrent
+		self.render_cache      = render_cache
+		self.watcher           = watcher
+		self.stale             = False
+		
+		if self.watcher is not None:
+			self.watcher.add(self.filename, self.mark_stale)
+	
+	def mark_stale(self, filename: str=None):
+		"""
+		Mark template as outdated, so it is reloaded on next `update()`. Called 
+		by FileWatcher from it's thread.
+		"""
+		
+		self.stale = True
 	
 	def is_up_to_date(self):
 		"""
 		Returns True if Template is up to date. Template us up to date if it was 
 		loaded and it's file still exists and have modification date less than 
 		it was when template has been loaded.
+		
+		If watcher is set, only checks that template was loaded and was not 
+		marked stale.
+		
+		Included files should not be changed since template was loaded.
+		"""
+		
+		if self.watcher is not None:
+			return not (self.timestamp is None or self.stale)
+		
+		if self.timestamp is None or not os.path.exists(self.filename) or os.path.getmtime(self.filename) > self.timestamp:
+			return False
+		
+		for filename, stat in self.dependencies.items():
+			if stat_file(filename) != stat:
+				return False
+		
+		return True
+	
+	def set_dependencies(self, dependencies: typing.Iterable[str]):
+		"""
+		Start tracking the given included files of the loaded template and 
+		stop tracking files that are no longer included.
 		"""
 		
-		return not (self.timestamp is None or not os.path.exists(self.filename) or os.path.getmtime(self.filename) > self.timestamp)
+		previous = self.dependencies
+		self.dependencies = { filename: stat_file(filename) for filename in dependencies }
+		
+		if self.watcher is not None:
+			for filename in previous:
+				if filename not in self.dependencies:
+					self.watcher.remove(filename, self.mark_stale)
+			
+			for filename in self.dependencies:
+				if filename not in previous:
+					self.watcher.add(filename, self.mark_stale)
 	
 	def get_template(self):
 		"""
@@ -1115,18 +5357,54 @@ class FileWatcherTemplate:
 				return
 			
 			# Prevent keep in memory
+			previous       = self.template
 			self.template  = None
 			self.timestamp = None
 			
+			# Changes made after this point mark template stale again
+			self.stale = False
+			
+			with open(self.filename, 'r', encoding='utf-8') as file:
+				source = file.read()
+			
+			# One-time results of the previous template can be reused
+			incremental = previous is not None and self.fragment_code is not None
+			
 			# Load
-			self.template = Template.from_file(self.filename, self.template_parser, self.context)
+			dependencies = {}
+			fragments = self.template_parser.parse(source, self.fragment_code if incremental else None, self.filename, dependencies)
+			self.set_dependencies(dependencies)
+			fragment_code = collect_fragment_code(fragments)
+			init_state = self.init_state if incremental else InitState()
+			
+			self.fragment_code = None
+			self.init_state = None
+			
+			# Each version gets fresh context, globals written by render of the previous one are not kept
+			self.template = Template.from_fragments(fragments, self.context)
 			await self.template.init(
 				scope=self.init_scope, 
 				strip_string=self.init_strip_string, 
 				none_ok=self.init_none_ok, 
 				init_ok=True, 
-				wrap_scope=self.init_wrap_scope
+				wrap_scope=self.init_wrap_scope,
+				init_state=init_state
 			)
+			
+			self.fragment_code = fragment_code
+			self.init_state = init_state
+			
+			if self.compiled:
+				self.template.compile()
+			
+			if self.concurrent:
+				self.template.set_concurrent()
+			
+			# Results of the previous template are outdated
+			if self.render_cache is not None:
+				self.render_cache.clear()
+				self.template.set_render_cache(self.render_cache)
+			
 			self.timestamp = os.path.getmtime(self.filename)
 	
 	async def render_generator(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, auto_reload: bool=True) -> typing.AsyncGenerator[str, None]:
@@ -1145,7 +5423,8 @@ class FileWatcherTemplate:
 		True, None result is not used in future template rendering.
 		
 		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
-		fragment render.
+		fragment render. Fragments that may write scope receive copy-on-write 
+		ScopeOverlay, others receive scope as is.
 		
 		Automatically reloads template on file change if `auto_reload=True`.
 		"""
@@ -1153,9 +5432,10 @@ class FileWatcherTemplate:
 		if auto_reload:
 			await self.update()
 		
-		return await self.template.render_generator(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope)
+		async for value in self.template.render_generator(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope):
+			yield value
 	
-	async def render_string(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, auto_reload: bool=True) -> str:
+	async def render_string(self, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, auto_reload: bool=True, cache_key: typing.Hashable=None) -> str:
 		"""
 		Render given template into string from fragments. Returns string 
 		representation of entire template rendered.
@@ -1171,15 +5451,19 @@ class FileWatcherTemplate:
 		True, None result is not used in future template rendering.
 		
 		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
-		fragment render.
+		fragment render. Fragments that may write scope receive copy-on-write 
+		ScopeOverlay, others receive scope as is.
 		
 		Automatically reloads template on file change if `auto_reload=True`.
+		
+		`cache_key` defines key of the result in render cache, see 
+		`Template.set_render_cache()`.
 		"""
 		
 		if auto_reload:
 			await self.update()
 		
-		return await self.template.render_string(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope)
+		return await self.template.render_string(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope, cache_key=cache_key)
 	
 	async def render_file(self, filename: str, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, auto_reload: bool=True) -> str:
 		"""
@@ -1196,7 +5480,8 @@ class FileWatcherTemplate:
 		True, None result is not used in future template rendering.
 		
 		`wrap_scope` enables scope wrapping. Scope is getting wrapped for each 
-		fragment render.
+		fragment render. Fragments that may write scope receive copy-on-write 
+		ScopeOverlay, others receive scope as is.
 		
 		Requires call to .init() if template was not initialized.
 		"""
@@ -1206,6 +5491,19 @@ class FileWatcherTemplate:
 		
 		return await self.template.render_file(filename=filename, scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope)
 
+	async def render_stream(self, writer: typing.Any, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, chunk_size: int=DEFAULT_CHUNK_SIZE, flush_interval: float=None, encoding: str='utf-8', auto_reload: bool=True) -> int:
+		"""
+		Render given template into stream writer or ASGI send callable. See 
+		`Template.render_stream()`.
+		
+		Automatically reloads template on file change if `auto_reload=True`.
+		"""
+		
+		if auto_reload:
+			await self.update()
+		
+		return await self.template.render_stream(writer, scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope, chunk_size=chunk_size, flush_interval=flush_interval, encoding=encoding)
+	
 	def __str__(self):
 		if self.timestamp is None:
 			return None
@@ -1217,3 +5515,647 @@ class FileWatcherTemplate:
 			return None
 		
 		return self.template.__repr__()
+
+
+
+def estimate_code_size(code: types.CodeType) -> int:
+	"""
+	Returns approximate memory size of the code object including nested code 
+	objects and constants
+	"""
+	
+	size = sys.getsizeof(code) + sys.getsizeof(code.co_code)
+	for const in code.co_consts:
+		if isinstance(const, types.CodeType):
+			size += estimate_code_size(const)
+		else:
+			size += sys.getsizeof(const)
+	
+	return size
+
+
+def estimate_template_size(template: Template) -> int:
+	"""
+	Returns approximate memory size of the template fragments: strings, saved 
+	sources and code objects
+	"""
+	
+	size = sys.getsizeof(template.fragments)
+	buffers = set()
+	for fragment in template.fragments:
+		size += sys.getsizeof(fragment)
+		
+		# Mapped strings are stored encoded
+		if isinstance(fragment, MappedStringTemplateFragment):
+			size += sys.getsizeof(fragment.buffer)
+		elif isinstance(fragment, StringTemplateFragment):
+			size += sys.getsizeof(fragment.value)
+		elif isinstance(fragment, ExpressionTemplateFragment):
+			size += estimate_code_size(fragment.evaluable) + sys.getsizeof(fragment.source_string)
+		elif isinstance(fragment, BlockTemplateFragment):
+			size += estimate_code_size(fragment.executable) + sys.getsizeof(fragment.source_string)
+		
+		# Shared buffer of compact mode is counted once
+		if isinstance(fragment, (ExpressionTemplateFragment, BlockTemplateFragment)) and fragment.source_buffer is not None and id(fragment.source_buffer) not in buffers:
+			buffers.add(id(fragment.source_buffer))
+			size += sys.getsizeof(fragment.source_buffer)
+	
+	return size
+
+
+class TemplateLoader:
+	"""
+	Registry of templates loaded by name from one or more search directories.
+	
+	Parsed and initialized templates are cached with LRU eviction policy 
+	bounded by amount of templates and by their approximate memory size. 
+	Cache usage is reported with hit, miss and eviction counters.
+	
+	Example:
+	```
+	loader = TemplateLoader([ 'templates/tenant', 'templates/default' ], max_entries=1000)
+	
+	await loader.render_string('index.thtml', scope={ 'user': user })
+	```
+	"""
+	
+	__slots__ = (
+		'search_path',
+		'template_parser',
+		'context',
+		'init_scope',
+		'init_strip_string',
+		'init_none_ok',
+		'init_wrap_scope',
+		'compiled',
+		'concurrent',
+		'auto_reload',
+		'watcher',
+		'changes',
+		'max_entries',
+		'max_size',
+		'templates',
+		'size',
+		'loading',
+		'hits',
+		'misses',
+		'evictions',
+		'__weakref__'
+	)
+	
+	def __init__(
+			self, 
+			search_path: typing.Union[str, typing.List[str]], 
+			template_parser: TemplateParser=None, 
+			context: dict=None, 
+			init_scope: dict=None, 
+			init_strip_string: bool=True,
+			init_none_ok: bool=False,
+			init_wrap_scope: bool=False,
+			compiled: bool=False,
+			concurrent: bool=False,
+			auto_reload: bool=False,
+			watcher: FileWatcher=None,
+			max_entries: int=1024,
+			max_size: int=None
+		):
+		"""
+		Create loader without loading any templates.
+		
+		`search_path` defines directory or list of directories to search 
+		templates in. Directories are checked in the given order.
+		
+		`context` defines global context copied into each loaded template, so 
+		one-time blocks of different templates do not share globals.
+		
+		`init_` parameters are used to define arguments for `.init()` call of 
+		each loaded template.
+		
+		`compiled` enables compiled render mode for each loaded template, see 
+		`Template.compile()`.
+		
+		`concurrent` enables concurrent render mode for each loaded template, 
+		see `Template.set_concurrent()`.
+		
+		`auto_reload` enables checking of template file modification time on 
+		each access and reloading of changed templates. Files included by the 
+		template and it's layouts are checked too.
+		
+		`watcher` defines FileWatcher used by `auto_reload` to track file 
+		changes instead of checking modification time on each access.
+		
+		`max_entries` defines maximal amount of cached templates.
+		
+		`max_size` defines maximal approximate memory size of cached templates 
+		in bytes, see `estimate_template_size()`. Set to None to disable.
+		"""
+		
+		self.search_path       = [ search_path ] if isinstance(search_path, str) else list(search_path)
+		self.template_parser   = template_parser or TemplateParser()
+		self.context           = context
+		self.init_scope        = init_scope
+		self.init_strip_string = init_strip_string
+		self.init_none_ok      = init_none_ok
+		self.init_wrap_scope   = init_wrap_scope
+		self.compiled          = compiled
+		self.concurrent        = concurrent
+		self.auto_reload       = auto_reload
+		self.watcher           = watcher
+		self.max_entries       = max_entries
+		self.max_size          = max_size
+		
+		# name -> (template, filename, timestamp, size, dependencies) in LRU order
+		self.templates = collections.OrderedDict()
+		self.size      = 0
+		
+		# name -> future of template being loaded, shared by concurrent misses
+		self.loading = {}
+		
+		# filename -> amount of changes reported by watcher
+		self.changes = {}
+		
+		self.hits      = 0
+		self.misses    = 0
+		self.evictions = 0
+	
+	def resolve(self, name: str) -> str:
+		"""
+		Returns path of the template file with given name from the first search 
+		directory containing it. Names pointing outside of search directory are 
+		not resolved.
+		
+		Raises FileNotFoundError if template can not be found.
+		"""
+		
+		for directory in self.search_path:
+			directory = os.path.abspath(directory)
+			filename = os.path.normpath(os.path.join(directory, name))
+			
+			if os.path.commonpath([ directory, filename ]) != directory:
+				continue
+			
+			if os.path.isfile(filename):
+				return filename
+		
+		raise FileNotFoundError(f'Template {name} not found in {self.search_path}')
+	
+	async def load(self, name: str) -> typing.Tuple[Template, str, float, typing.Dict[str, typing.Any]]:
+		"""
+		Load, initialize and optionally compile template with given name 
+		bypassing cache.
+		
+		Returns tuple of template, template file name, file modification time 
+		and map of template file and each of it's included and layout files 
+		to their state, see `get_file_state()`.
+		"""
+		
+		filename = self.resolve(name)
+		timestamp = os.path.getmtime(filename)
+		state = self.get_file_state(filename)
+		
+		with open(filename, 'r', encoding='utf-8') as file:
+			source = file.read()
+		
+		included = {}
+		template = Template.from_fragments(self.template_parser.parse(source, filename=filename, dependencies=included), dict(self.context or {}))
+		
+		dependencies = { filename: state }
+		for dependency in included:
+			dependencies[dependency] = self.get_file_state(dependency)
+		
+		await template.init(
+			scope=self.init_scope, 
+			strip_string=self.init_strip_string, 
+			none_ok=self.init_none_ok, 
+			init_ok=True, 
+			wrap_scope=self.init_wrap_scope
+		)
+		
+		if self.compiled:
+			template.compile()
+		
+		if self.concurrent:
+			template.set_concurrent()
+		
+		return template, filename, timestamp, dependencies
+	
+	async def get_template(self, name: str) -> Template:
+		"""
+		Returns cached template with given name or loads it. Concurrent calls 
+		for missing template share single load. If the call sharing load is 
+		cancelled, one of the waiting calls loads instead.
+		"""
+		
+		missed = False
+		while True:
+			entry = self.templates.get(name)
+			if entry is not None:
+				if not self.auto_reload or self.is_up_to_date(entry):
+					self.templates.move_to_end(name)
+					if not missed:
+						self.hits += 1
+					return entry[0]
+				
+				self.remove(name)
+			
+			if not missed:
+				self.misses += 1
+				missed = True
+			
+			future = self.loading.get(name)
+			if future is None:
+				break
+			
+			template = await asyncio.shield(future)
+			if template is not RETRY_SHARED:
+				return template
+		
+		future = asyncio.get_running_loop().create_future()
+		self.loading[name] = future
+		
+		try:
+			template, filename, timestamp, dependencies = await self.load(name)
+		except asyncio.CancelledError:
+			# Waiters are not cancelled, they retry
+			future.set_result(RETRY_SHARED)
+			raise
+		except BaseException as e:
+			future.set_exception(e)
+			# Exception is delivered to waiters, if any
+			future.exception()
+			raise
+		finally:
+			del self.loading[name]
+		
+		future.set_result(template)
+		self.insert(name, template, filename, timestamp, dependencies)
+		return template
+	
+	def get_file_state(self, filename: str) -> typing.Any:
+		"""
+		Returns state of the file compared to detect it's change. With watcher 
+		it is amount of changes reported by watcher, otherwise it is 
+		`(mtime, size, inode)` of the file.
+		"""
+		
+		if self.watcher is not None:
+			return self.changes.get(filename, 0)
+		
+		return stat_file(filename)
+	
+	def is_up_to_date(self, entry: tuple) -> bool:
+		"""
+		Returns True if file of the cached entry and files it includes still 
+		exist and were not modified since load
+		"""
+		
+		for filename, state in entry[4].items():
+			if self.get_file_state(filename) != state:
+				return False
+		
+		return True
+	
+	def insert(self, name: str, template: Template, filename: str, timestamp: float, dependencies: typing.Dict[str, typing.Any]=None):
+		"""
+		Insert template into cache and evict least recently used templates 
+		exceeding cache bounds. `dependencies` defines state of tracked files 
+		returned by `load()`, by default only template file is tracked.
+		"""
+		
+		if name in self.templates:
+			self.remove(name)
+		
+		if dependencies is None:
+			dependencies = { filename: self.get_file_state(filename) }
+		
+		size = estimate_template_size(template)
+		self.templates[name] = (template, filename, timestamp, size, dependencies)
+		self.size += size
+		
+		if self.auto_reload and self.watcher is not None:
+			for dependency in dependencies:
+				self.watcher.add(dependency, self.mark_stale)
+		
+		while len(self.templates) and (len(self.templates) > self.max_entries or (self.max_size is not None and self.size > self.max_size)):
+			_, evicted = self.templates.popitem(last=False)
+			self.release(evicted)
+			self.evictions += 1
+	
+	def mark_stale(self, filename: str):
+		"""
+		Mark cached templates loaded from or including the given file as 
+		outdated. Called by FileWatcher from it's thread.
+		"""
+		
+		self.changes[filename] = self.changes.get(filename, 0) + 1
+	
+	def release(self, entry: tuple):
+		"""
+		Account removal of the cache entry
+		"""
+		
+		self.size -= entry[3]
+		
+		if self.auto_reload and self.watcher is not None:
+			for dependency in entry[4]:
+				self.watcher.remove(dependency, self.mark_stale)
+	
+	def remove(self, name: str) -> bool:
+		"""
+		Remove template from cache. Returns False if template was not cached.
+		"""
+		
+		entry = self.templates.pop(name, None)
+		if entry is None:
+			return False
+		
+		self.release(entry)
+		return True
+	
+	def clear(self):
+		"""
+		Remove all templates from cache
+		"""
+		
+		while len(self.templates):
+			_, entry = self.templates.popitem()
+			self.release(entry)
+	
+	def get_stats(self) -> typing.Dict[str, int]:
+		"""
+		Returns dict with cache statistics: amount of cached templates, their 
+		approximate size and hit, miss and eviction counters.
+		"""
+		
+		return {
+			'entries': len(self.templates),
+			'size': self.size,
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions
+		}
+	
+	async def render_generator(self, name: str, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> typing.AsyncGenerator[str, None]:
+		"""
+		Render template with given name using generator over fragments. See 
+		`Template.render_generator()`.
+		"""
+		
+		template = await self.get_template(name)
+		async for value in template.render_generator(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope):
+			yield value
+	
+	async def render_string(self, name: str, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> str:
+		"""
+		Render template with given name into string. See 
+		`Template.render_string()`.
+		"""
+		
+		template = await self.get_template(name)
+		return await template.render_string(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope)
+	
+	async def render_file(self, name: str, filename: str, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> None:
+		"""
+		Render template with given name into file. See `Template.render_file()`.
+		"""
+		
+		template = await self.get_template(name)
+		await template.render_file(filename=filename, scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope)
+	
+	async def render_stream(self, name: str, writer: typing.Any, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False, chunk_size: int=DEFAULT_CHUNK_SIZE, flush_interval: float=None, encoding: str='utf-8') -> int:
+		"""
+		Render template with given name into stream writer or ASGI send 
+		callable. See `Template.render_stream()`.
+		"""
+		
+		template = await self.get_template(name)
+		return await template.render_stream(writer, scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope, chunk_size=chunk_size, flush_interval=flush_interval, encoding=encoding)
+
+# Templates loaded in worker process of ProcessPoolRenderer by key
+PROCESS_POOL_TEMPLATES = {}
+
+# Event loop of worker process used to render async templates
+PROCESS_POOL_LOOP = None
+
+def process_pool_load(spec: tuple) -> typing.Union[Template, FileWatcherTemplate]:
+	"""
+	Load template in worker process of ProcessPoolRenderer from the given 
+	template specification.
+	"""
+	
+	source, filename, template_parser, context, init_scope, init_strip_string, init_none_ok, init_wrap_scope, compiled = spec
+	
+	if filename is not None:
+		# Reloaded on file change
+		return FileWatcherTemplate(
+			filename, 
+			template_parser=template_parser, 
+			context=context, 
+			init_scope=init_scope, 
+			init_strip_string=init_strip_string, 
+			init_none_ok=init_none_ok, 
+			init_wrap_scope=init_wrap_scope, 
+			compiled=compiled
+		)
+	
+	template = Template.from_string(source, template_parser, context)
+	PROCESS_POOL_LOOP.run_until_complete(template.init(
+		scope=init_scope, 
+		strip_string=init_strip_string, 
+		none_ok=init_none_ok, 
+		init_ok=True, 
+		wrap_scope=init_wrap_scope
+	))
+	
+	if compiled:
+		template.compile()
+	
+	return template
+
+def process_pool_render(key: typing.Hashable, spec: typing.Optional[tuple], scope: dict, strip_string: bool, none_ok: bool, wrap_scope: bool) -> typing.Tuple[bool, typing.Optional[str], int]:
+	"""
+	Render template with given key in worker process of ProcessPoolRenderer. 
+	Returns tuple of `(loaded, result, pid)`, `loaded` is False if template is 
+	not loaded in this worker and `spec` is not given, so caller should retry 
+	with template specification. `spec` is ignored if template is already 
+	loaded. `pid` is id of the worker process.
+	"""
+	
+	global PROCESS_POOL_LOOP
+	
+	if PROCESS_POOL_LOOP is None:
+		PROCESS_POOL_LOOP = asyncio.new_event_loop()
+	
+	template = PROCESS_POOL_TEMPLATES.get(key)
+	if template is None:
+		if spec is None:
+			return False, None, os.getpid()
+		
+		template = process_pool_load(spec)
+		PROCESS_POOL_TEMPLATES[key] = template
+	
+	# Fast path without event loop
+	if isinstance(template, Template) and template.is_synchronous() and not template.concurrent:
+		return True, template.render_string_sync(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope), os.getpid()
+	
+	return True, PROCESS_POOL_LOOP.run_until_complete(template.render_string(scope=scope, strip_string=strip_string, none_ok=none_ok, wrap_scope=wrap_scope)), os.getpid()
+
+
+class ProcessPoolRenderer:
+	"""
+	Renders templates in pool of worker processes, so CPU-bound templates use 
+	all cores and do not block event loop of the caller.
+	
+	Templates are registered by name with their source or file path and parser 
+	configuration. Worker parses, initializes and caches the template 
+	locally. Template specification is sent with render only while some 
+	known worker has not loaded the template. Worker started on demand 
+	reports missing template and render is retried with specification. 
+	Otherwise render sends only template key and scope, so scope, `context` 
+	and `init_scope` must be picklable. Modules should be imported 
+	inside one-time blocks instead of being passed with context.
+	
+	Example:
+	```
+	renderer = ProcessPoolRenderer(max_workers=4)
+	renderer.add_template('report', filename='report.thtml')
+	
+	await renderer.render_string('report', scope={ 'rows': rows })
+	```
+	"""
+	
+	__slots__ = (
+		'executor',
+		'workers',
+		'templates',
+		'loaded',
+		'serial'
+	)
+	
+	def __init__(self, max_workers: int=None, mp_context: typing.Any=None):
+		"""
+		Create renderer with it's own process pool.
+		
+		`max_workers` and `mp_context` are passed to 
+		`concurrent.futures.ProcessPoolExecutor`.
+		"""
+		
+		self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+		# Pids of workers that replied to any render
+		self.workers = set()
+		
+		# name -> (key, spec)
+		self.templates = {}
+		# key -> pids of workers that loaded the template
+		self.loaded    = {}
+		self.serial    = 0
+	
+	def add_template(
+			self, 
+			name: str, 
+			source: str=None, 
+			filename: str=None, 
+			template_parser: TemplateParser=None, 
+			context: dict=None, 
+			init_scope: dict=None, 
+			init_strip_string: bool=True,
+			init_none_ok: bool=False,
+			init_wrap_scope: bool=False,
+			compiled: bool=True
+		) -> 'ProcessPoolRenderer':
+		"""
+		Register template with given name. Exactly one of `source` or `filename` 
+		should be set. Templates given by `filename` are reloaded by workers 
+		when file changes, see `FileWatcherTemplate`.
+		
+		`init_` parameters are used to define arguments for `.init()` call in 
+		each worker.
+		
+		`compiled` enables compiled render mode in workers, see 
+		`Template.compile()`.
+		
+		Registering template with the same name replaces it. Workers keep 
+		previous version in memory until pool is shut down.
+		"""
+		
+		if (source is None) == (filename is None):
+			raise RuntimeError('Exactly one of source or filename should be set')
+		
+		if filename is not None:
+			filename = os.path.abspath(filename)
+		
+		spec = (
+			source,
+			filename,
+			template_parser or TemplateParser(),
+			context,
+			init_scope,
+			init_strip_string,
+			init_none_ok,
+			init_wrap_scope,
+			compiled
+		)
+		
+		previous = self.templates.get(name)
+		if previous is not None:
+			self.loaded.pop(previous[0], None)
+		
+		self.serial += 1
+		self.templates[name] = (self.serial, spec)
+		self.loaded[self.serial] = set()
+		
+		return self
+	
+	def remove_template(self, name: str) -> bool:
+		"""
+		Unregister template with given name. Returns True if template was 
+		registered.
+		"""
+		
+		entry = self.templates.pop(name, None)
+		if entry is None:
+			return False
+		
+		self.loaded.pop(entry[0], None)
+		return True
+	
+	async def render_string(self, name: str, scope: dict=None, strip_string: bool=True, none_ok: bool=False, wrap_scope: bool=False) -> str:
+		"""
+		Render template with given name into string in worker process. See 
+		`Template.render_string()`.
+		"""
+		
+		entry = self.templates.get(name)
+		if entry is None:
+			raise RuntimeError(f'Template {name} is not registered')
+		
+		key, spec = entry
+		loop = asyncio.get_running_loop()
+		
+		# Send specification along while some known worker have not loaded it
+		pids = self.loaded[key]
+		cold = len(pids) < len(self.workers)
+		
+		loaded, result, pid = await loop.run_in_executor(self.executor, process_pool_render, key, spec if cold else None, scope, strip_string, none_ok, wrap_scope)
+		self.workers.add(pid)
+		
+		if not loaded:
+			# New worker have not seen this template yet
+			loaded, result, pid = await loop.run_in_executor(self.executor, process_pool_render, key, spec, scope, strip_string, none_ok, wrap_scope)
+			self.workers.add(pid)
+		
+		pids.add(pid)
+		return result
+	
+	def shutdown(self, wait: bool=True):
+		"""
+		Shut down worker processes.
+		"""
+		
+		self.executor.shutdown(wait=wait)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.shutdown()
\ No newline at end of file